@@ -0,0 +1,284 @@
+#!/usr/bin/python3
+"""Columnar, memory-mappable vote snapshots for analytics.
+
+Each poll is exported to ``SNAPSHOT_DIR/poll-<id>.col``, which analytics
+processes map read-only and use as NumPy arrays without copying or
+touching the API database. All values are little-endian.
+
+The file starts with a 64 byte header, zero padded::
+
+    offset  size  type     field
+    0       8     bytes    magic, b"POLLCOL1"
+    8       4     uint32   layout version, 1
+    12      4     uint32   number of choices, k
+    16      8     int64    poll id
+    24      8     int64    export time, microseconds since the epoch
+    32      8     uint64   number of votes, n
+
+It is followed by four columns, each starting at the next multiple of
+64 bytes:
+
+    choice_ids  int64[k]   choice id of each choice ordinal, ascending
+    voted_at    int64[n]   vote time, microseconds since the epoch, UTC
+    choice      uint16[n]  choice ordinal of each vote
+    cohort      int32[n]   voter signup month, months since 1970-01,
+                           or -1 when the voter is gone
+
+Votes are sorted by voted_at, so a time range is a searchsorted slice.
+Archived votes of finalized polls are included. Ballots are exported as
+they are counted: an approval ballot as one vote per approved choice and
+a ranked ballot as a vote for its first preference, all at the time the
+ballot was cast. Snapshots are written to
+a temporary file and renamed into place, so readers never see a partial
+file.
+
+Run as ``python -m api.v1.analytics.columnar export [poll_id ...]`` to
+export polls, every poll by default, and
+``python -m api.v1.analytics.columnar crosstab PATH`` to print a
+snapshot's results by voter signup month.
+"""
+import argparse
+import mmap
+import os
+import struct
+from datetime import datetime, timezone
+import numpy as np
+from sqlalchemy import select, union_all
+from sqlalchemy.orm import Session
+from api.v1.database_config import session_local
+from api.v1.models import ArchivedVote, Ballot, Choice, Poll, User, Vote
+from api.v1.sharding import each_shard, shard_session
+from api.v1.settings import settings
+from api.v1.votes.tally import unpack
+
+MAGIC = b"POLLCOL1"
+VERSION = 1
+HEADER = struct.Struct("<8sIIqqQ")
+HEADER_SIZE = 64
+ALIGNMENT = 64
+COLUMNS = (
+    ("choice_ids", np.dtype("<i8")),
+    ("voted_at", np.dtype("<i8")),
+    ("choice", np.dtype("<u2")),
+    ("cohort", np.dtype("<i4")),
+)
+
+
+def column_offsets(choices: int, votes: int) -> dict:
+    """Return the byte offset of each column, and the file size."""
+    offsets = {}
+    offset = HEADER_SIZE
+    for name, dtype in COLUMNS:
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        offsets[name] = offset
+        offset += dtype.itemsize * (choices if name == "choice_ids" else votes)
+    offsets["size"] = offset
+    return offsets
+
+
+def snapshot_path(poll_id: int) -> str:
+    """Return the path of a poll's snapshot."""
+    return os.path.join(settings.SNAPSHOT_DIR, f"poll-{poll_id}.col")
+
+
+def utc_micros(moments: list) -> np.ndarray:
+    """Convert datetimes to microseconds since the epoch."""
+    return np.array([
+        moment.astimezone(timezone.utc).replace(tzinfo=None)
+        if moment.tzinfo else moment
+        for moment in moments
+    ], dtype="datetime64[us]").astype("<i8")
+
+
+def signup_months(user_ids: list) -> dict:
+    """Return the signup month index of each existing user."""
+    months = {}
+    session = session_local()
+    try:
+        for start in range(0, len(user_ids), settings.EXPORT_CHUNK_SIZE):
+            rows = session.execute(
+                select(User.uuid_pk, User.created_at).where(
+                    User.uuid_pk.in_(
+                        user_ids[start:start + settings.EXPORT_CHUNK_SIZE]
+                    )
+                ).execution_options(include_deleted=True)
+            ).all()
+            if rows:
+                cohorts = utc_micros([row[1] for row in rows]).astype(
+                    "datetime64[us]"
+                ).astype("datetime64[M]").astype("<i4")
+                months.update(zip((row[0] for row in rows), cohorts))
+    finally:
+        session.close()
+    return months
+
+
+def vote_chunks(session: Session, poll_id: int):
+    """Yield chunks of a poll's (voted_at, choice_id, user) rows."""
+    method = session.execute(
+        select(Poll.voting_method).where(Poll.id == poll_id)
+    ).scalar()
+    if method in ("approval", "ranked"):
+        ballots = select(Ballot.created_at, Ballot.choices, Ballot.user).where(
+            Ballot.poll_id == poll_id
+        )
+        for rows in session.execute(ballots.execution_options(
+            yield_per=settings.EXPORT_CHUNK_SIZE
+        )).partitions():
+            yield [
+                (cast_at, choice_id, user)
+                for cast_at, choices, user in rows
+                for choice_id in (
+                    unpack(choices) if method == "approval"
+                    else unpack(choices)[:1]
+                )
+            ]
+        return
+    votes = union_all(
+        select(Vote.created_at, Vote.choice_id, Vote.user).join(
+            Choice, Choice.id == Vote.choice_id
+        ).where(Choice.poll_id == poll_id),
+        select(
+            ArchivedVote.created_at, ArchivedVote.choice_id, ArchivedVote.user
+        ).where(ArchivedVote.poll_id == poll_id)
+    )
+    yield from session.execute(votes.execution_options(
+        yield_per=settings.EXPORT_CHUNK_SIZE
+    )).partitions()
+
+
+def load_columns(session: Session, poll_id: int) -> dict:
+    """Read a poll's votes, live and archived, or its ballots into columns."""
+    choice_ids = np.array(session.execute(
+        select(Choice.id).where(Choice.poll_id == poll_id).order_by(Choice.id)
+    ).scalars().all(), dtype="<i8")
+    if len(choice_ids) > np.iinfo(np.uint16).max:
+        raise ValueError(f"poll {poll_id} has too many choices")
+    voted_at, choice, users = [], [], []
+    for rows in vote_chunks(session, poll_id):
+        voted_at.append(utc_micros([row[0] for row in rows]))
+        choice.append(np.array([row[1] for row in rows], dtype="<i8"))
+        users.extend(row[2] for row in rows)
+    voted_at = np.concatenate(voted_at or [np.empty(0, "<i8")])
+    choice = np.concatenate(choice or [np.empty(0, "<i8")])
+    ordinals = np.searchsorted(choice_ids, choice)
+    known = ordinals < len(choice_ids)
+    known[known] = choice_ids[ordinals[known]] == choice[known]
+    months = signup_months(sorted(set(users)))
+    cohort = np.fromiter(
+        (months.get(user, -1) for user in users), dtype="<i4",
+        count=len(users)
+    )
+    order = np.argsort(voted_at[known], kind="stable")
+    return {
+        "choice_ids": choice_ids,
+        "voted_at": voted_at[known][order],
+        "choice": ordinals[known][order].astype("<u2"),
+        "cohort": cohort[known][order]
+    }
+
+
+def write_snapshot(path: str, poll_id: int, columns: dict):
+    """Write columns to path in the snapshot layout."""
+    choices, votes = len(columns["choice_ids"]), len(columns["voted_at"])
+    offsets = column_offsets(choices, votes)
+    exported_at = int(datetime.now(timezone.utc).timestamp() * 1_000_000)
+    partial = f"{path}.partial"
+    with open(partial, "wb") as file:
+        file.write(HEADER.pack(
+            MAGIC, VERSION, choices, poll_id, exported_at, votes
+        ).ljust(HEADER_SIZE, b"\0"))
+        for name, dtype in COLUMNS:
+            file.write(b"\0" * (offsets[name] - file.tell()))
+            file.write(np.ascontiguousarray(columns[name], dtype).tobytes())
+    os.replace(partial, path)
+
+
+def export_poll(poll_id: int) -> int:
+    """Export a poll's snapshot and return its number of votes."""
+    session = shard_session(poll_id)
+    try:
+        columns = load_columns(session, poll_id)
+    finally:
+        session.close()
+    os.makedirs(settings.SNAPSHOT_DIR, exist_ok=True)
+    write_snapshot(snapshot_path(poll_id), poll_id, columns)
+    return len(columns["voted_at"])
+
+
+class Snapshot:
+    """Read-only, memory-mapped view of a poll snapshot."""
+
+    def __init__(self, path: str):
+        """Map the snapshot at path and expose its columns as arrays."""
+        with open(path, "rb") as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, choices, self.poll_id, exported_at, votes = (
+            HEADER.unpack_from(self.buffer)
+        )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} snapshot")
+        offsets = column_offsets(choices, votes)
+        if len(self.buffer) < offsets["size"]:
+            raise ValueError(f"{path} is truncated")
+        self.exported_at = np.datetime64(exported_at, "us")
+        for name, dtype in COLUMNS:
+            setattr(self, name, np.frombuffer(
+                self.buffer, dtype=dtype, offset=offsets[name],
+                count=choices if name == "choice_ids" else votes
+            ))
+        self.voted_at = self.voted_at.view("datetime64[us]")
+
+    def crosstab(self, keys: np.ndarray) -> tuple:
+        """Count votes by key and choice.
+
+        keys holds one value per vote. Returns the distinct key values
+        and a (values, choices) matrix of vote counts, with columns in
+        choice_ids order.
+        """
+        values, inverse = np.unique(keys, return_inverse=True)
+        choices = len(self.choice_ids)
+        counts = np.bincount(
+            inverse.ravel() * choices + self.choice,
+            minlength=len(values) * choices
+        )
+        return values, counts.reshape(len(values), choices)
+
+    def by_signup_month(self) -> tuple:
+        """Count votes by voter signup month and choice."""
+        values, counts = self.crosstab(self.cohort)
+        months = values.astype("datetime64[M]")
+        months[values < 0] = np.datetime64("NaT")
+        return months, counts
+
+
+def main():
+    """Export and inspect snapshots from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Export and inspect columnar poll snapshots."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="export poll snapshots")
+    export.add_argument("poll_ids", nargs="*", type=int)
+    crosstab = commands.add_parser(
+        "crosstab", help="print results by voter signup month"
+    )
+    crosstab.add_argument("path")
+    args = parser.parse_args()
+    if args.command == "export":
+        poll_ids = args.poll_ids or [
+            poll_id for session in each_shard()
+            for poll_id in session.execute(select(Poll.id)).scalars().all()
+        ]
+        for poll_id in poll_ids:
+            print(f"poll {poll_id}: {export_poll(poll_id)} votes")
+        return
+    snapshot = Snapshot(args.path)
+    months, counts = snapshot.by_signup_month()
+    print("signup", *snapshot.choice_ids, sep="\t")
+    for month, row in zip(months, counts):
+        print(month, *row, sep="\t")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,41 @@
 #!/usr/bin/python3
 """Poll API."""
+import asyncio
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.openapi.utils import get_openapi
 from api.v1.users.user_routes import user_router
 from api.v1.bans.ban_routes import ban_router
+from api.v1.changes.change_routes import change_router
 from api.v1.choices.choice_route import choice_router
+from api.v1.choices.images import shutdown_pool
+from api.v1.jobs.job_routes import job_router
 from api.v1.votes.vote_routes import vote_router
 from api.v1.polls.poll_routes import poll_router
+from api.v1.polls import trending
+from api.v1.cache.cache_routes import cache_router
+from api.v1.load_shedding import LoadSheddingMiddleware
+from api.v1.polls.documents import document_refresher, warm_cache
+from api.v1.polls.scheduler import scheduler
+from api.v1.profiling.profile_routes import profile_router
+from api.v1.profiling.profiler import ProfilingMiddleware
+from api.v1.slow_queries.slow_log import RouteMiddleware, slow_queries
+from api.v1.slow_queries.slow_query_routes import slow_query_router
+from api.v1.stats.reach import reach
+from api.v1.stats.stats_routes import stats_router
+from api.v1.votes.partitions import ensure_partitions
+from api.v1.sharding import create_shards, shard_engines
 from .database_config import engine
 from .models import Base
 
 Base.metadata.create_all(bind=engine)
+ensure_partitions(engine)
+create_shards()
+for watched in (engine, *shard_engines):
+    slow_queries.watch(watched)
 app = FastAPI(
     debug=True, root_path="/",
     openapi_tags=["Poll API"],
@@ -21,6 +43,9 @@ app = FastAPI(
     openapi_url=None
 )
 
+# Shed requests beyond the adaptive concurrency limit
+app.add_middleware(LoadSheddingMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -28,8 +53,38 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["set-cookie"],
+    expose_headers=["set-cookie", "x-profile-id"],
 )
+app.add_middleware(RouteMiddleware)
+app.add_middleware(ProfilingMiddleware)
+
+
+background_tasks = set()
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    """Start the in-process maintenance loops."""
+    background_tasks.add(asyncio.create_task(trending.maintain()))
+    background_tasks.add(asyncio.create_task(scheduler.run()))
+    background_tasks.add(asyncio.create_task(reach.run()))
+    background_tasks.add(asyncio.create_task(document_refresher.run()))
+    await run_in_threadpool(warm_cache)
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    """Stop the maintenance loops and flush in-memory state."""
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, trending.persist_once)
+    await loop.run_in_executor(None, reach.flush_once)
+    await loop.run_in_executor(None, document_refresher.flush_now)
+    shutdown_pool()
+    slow_queries.shutdown()
 
 
 @app.get("/api")
@@ -60,3 +115,9 @@ app.include_router(ban_router)
 app.include_router(poll_router)
 app.include_router(choice_router)
 app.include_router(vote_router)
+app.include_router(job_router)
+app.include_router(stats_router)
+app.include_router(change_router)
+app.include_router(cache_router)
+app.include_router(profile_router)
+app.include_router(slow_query_router)
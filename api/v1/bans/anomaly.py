@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+"""Streaming detection of vote bursts from a few sources onto one choice.
+
+Each poll gets a sliding window of count-min sketches counting votes per
+(source, choice) pair, where a source is a user id or a client IP. Memory
+per poll is fixed by the sketch dimensions and the number of monitored
+polls is capped, so the detector never grows with traffic.
+"""
+import hashlib
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from api.v1.settings import settings
+
+MASK = (1 << 64) - 1
+
+
+class CountMinSketch:
+    """Approximate counter that never underestimates."""
+
+    def __init__(self, width: int, depth: int):
+        """Initialize an empty sketch of depth rows of width counters."""
+        self.width = width
+        self.depth = depth
+        self.clear()
+
+    def clear(self):
+        """Reset every counter."""
+        self.table = array("I", bytes(4 * self.width * self.depth))
+
+    def indexes(self, key: str) -> list:
+        """Return the counter index of key in every row."""
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [
+            row * self.width + ((first + row * second) & MASK) % self.width
+            for row in range(self.depth)
+        ]
+
+    def add(self, key: str, count: int = 1) -> int:
+        """Count key and return its new estimate."""
+        estimate = None
+        for index in self.indexes(key):
+            self.table[index] += count
+            value = self.table[index]
+            estimate = value if estimate is None else min(estimate, value)
+        return estimate
+
+    def estimate(self, key: str) -> int:
+        """Return the estimated count of key."""
+        return min(self.table[index] for index in self.indexes(key))
+
+
+class SlidingWindowSketch:
+    """Count-min sketches over the sub-windows of a sliding time window."""
+
+    def __init__(self, window: float, slots: int, width: int, depth: int):
+        """Initialize slots sketches that together cover window seconds."""
+        self.slot_length = window / slots
+        self.sketches = [CountMinSketch(width, depth) for _ in range(slots)]
+        self.slot_ids = [None] * slots
+
+    def add(self, key: str, at: float) -> int:
+        """Count key at time at and return its estimate over the window."""
+        slot = int(at // self.slot_length)
+        index = slot % len(self.sketches)
+        if self.slot_ids[index] != slot:
+            self.sketches[index].clear()
+            self.slot_ids[index] = slot
+        total = self.sketches[index].add(key)
+        for other, sketch in enumerate(self.sketches):
+            current = self.slot_ids[other]
+            if other != index and current is not None and (
+                slot - len(self.sketches) < current < slot
+            ):
+                total += sketch.estimate(key)
+        return total
+
+
+class AnomalyDetector:
+    """Flag and throttle sources voting in bursts onto a single choice."""
+
+    def __init__(self, clock=time.time):
+        """Initialize the detector from the settings."""
+        self.clock = clock
+        self.polls = OrderedDict()
+        self.flagged = deque(maxlen=settings.ANOMALY_MAX_EVENTS)
+        self.lock = threading.Lock()
+
+    def monitor(self, poll_id: int) -> SlidingWindowSketch:
+        """Return the sketch of a poll, evicting the least recently used."""
+        sketch = self.polls.pop(poll_id, None)
+        if sketch is None:
+            sketch = SlidingWindowSketch(
+                settings.ANOMALY_WINDOW_SECONDS, settings.ANOMALY_SLOTS,
+                settings.ANOMALY_SKETCH_WIDTH, settings.ANOMALY_SKETCH_DEPTH
+            )
+        self.polls[poll_id] = sketch
+        if len(self.polls) > settings.ANOMALY_MAX_POLLS:
+            self.polls.popitem(last=False)
+        return sketch
+
+    def check(self, poll_id: int, choice_id: int, sources: dict) -> str:
+        """Count a vote attempt and return "ok", "flag" or "throttle".
+
+        sources maps a source kind ("user", "ip") to its value. A source is
+        flagged each time its estimate reaches a multiple of
+        ANOMALY_FLAG_THRESHOLD and throttled from ANOMALY_THROTTLE_THRESHOLD.
+        """
+        at = self.clock()
+        with self.lock:
+            sketch = self.monitor(poll_id)
+            counts = {
+                f"{kind}:{value}": sketch.add(
+                    f"{kind}:{value}|{choice_id}", at
+                )
+                for kind, value in sources.items() if value
+            }
+        if not counts:
+            return "ok"
+        source, count = max(counts.items(), key=lambda item: item[1])
+        if count >= settings.ANOMALY_THROTTLE_THRESHOLD:
+            action = "throttle"
+        elif count % settings.ANOMALY_FLAG_THRESHOLD == 0:
+            action = "flag"
+        else:
+            return "ok"
+        if action == "flag" or count == settings.ANOMALY_THROTTLE_THRESHOLD:
+            self.flagged.append({
+                "poll_id": poll_id,
+                "choice_id": choice_id,
+                "source": source,
+                "votes": count,
+                "window_seconds": settings.ANOMALY_WINDOW_SECONDS,
+                "action": action,
+                "flagged_at": datetime.fromtimestamp(at, timezone.utc)
+            })
+        return action
+
+    def events(self, poll_id: int = None) -> list:
+        """Return the flagged events, newest first."""
+        return [
+            event for event in reversed(self.flagged)
+            if poll_id is None or event["poll_id"] == poll_id
+        ]
+
+
+detector = AnomalyDetector()
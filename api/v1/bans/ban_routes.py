@@ -1,11 +1,13 @@
 #!/usr/bin/python3
 """Bans user routes."""
+from typing import List, Optional
 from fastapi import APIRouter, HTTPException, Response, status, Depends
 from sqlalchemy.orm import Session
 from api.v1.database_config import get_db
 from api.v1.models import Ban, User, Moderator
 from api.v1.users.oauth import get_current_user
-from .schemas import BanSchema, BanRes
+from .anomaly import detector
+from .schemas import BanSchema, BanRes, FlaggedVoteRes
 
 ban_router = APIRouter(prefix="/ban", tags=["ban"])
 
@@ -120,3 +122,23 @@ async def unban_user(
     user.delete()
     session.commit()
     return
+
+
+@ban_router.get("/flagged", response_model=List[FlaggedVoteRes])
+async def retrieve_flagged_votes(
+    poll_id: Optional[int] = None,
+    session: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """Retrieve vote bursts flagged by the anomaly detector."""
+    moderator = session.query(
+        Moderator
+    ).filter(Moderator.mod_user == current_user.uuid_pk).first()
+
+    if not moderator:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="access denied"
+        )
+
+    return detector.events(poll_id)
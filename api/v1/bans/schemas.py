@@ -23,3 +23,15 @@ class BanRes(BaseModel):
     user_id: UUID
     created_at: datetime
     updated_at: Optional[datetime]
+
+
+class FlaggedVoteRes(BaseModel):
+    """Vote burst flagged by the anomaly detector."""
+
+    poll_id: int
+    choice_id: int
+    source: str
+    votes: int
+    window_seconds: int
+    action: str
+    flagged_at: datetime
@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+"""Buffered writes flushed to the database in batches."""
+import asyncio
+import logging
+import threading
+from typing import Callable
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWriter:
+    """Collect items in memory and hand them to flush in batches.
+
+    A batch is written every ``interval`` seconds, or sooner once
+    ``max_items`` are waiting. When a flush fails the items are kept for
+    the next attempt, up to ``max_pending`` items.
+    """
+
+    def __init__(
+        self, flush: Callable[[list], None], max_items: int,
+        interval: float, max_pending: int = None
+    ):
+        """Initialize an empty writer."""
+        self.flush = flush
+        self.max_items = max_items
+        self.interval = interval
+        self.max_pending = max_pending or 100 * max_items
+        self.items = []
+        self.lock = threading.Lock()
+        self.full = asyncio.Event()
+
+    def add(self, item):
+        """Buffer an item for the next batch."""
+        with self.lock:
+            self.items.append(item)
+            full = len(self.items) >= self.max_items
+        if full:
+            self.full.set()
+
+    def flush_now(self) -> int:
+        """Write the buffered items and return how many were written."""
+        with self.lock:
+            items, self.items = self.items, []
+        if not items:
+            return 0
+        try:
+            self.flush(items)
+        except Exception:
+            logger.exception(
+                "batch of %d items could not be written", len(items)
+            )
+            with self.lock:
+                self.items = (items + self.items)[-self.max_pending:]
+            return 0
+        return len(items)
+
+    async def run(self):
+        """Flush periodically, or as soon as a batch fills up."""
+        while True:
+            try:
+                await asyncio.wait_for(self.full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.full.clear()
+            await run_in_threadpool(self.flush_now)
@@ -0,0 +1,15 @@
+#!/usr/bin/python3
+"""Cache routes."""
+from fastapi import APIRouter, Depends
+from api.v1.users.oauth import get_current_user
+from .read_through import cache
+from .schemas import CacheMetricsRes
+
+cache_router = APIRouter(prefix="/cache", tags=["cache"])
+
+
+@cache_router.get("/metrics", response_model=CacheMetricsRes)
+async def get_cache_metrics(current_user: str = Depends(get_current_user)):
+    """Retrieve the read cache hit and miss counts."""
+    if current_user:
+        return cache.metrics()
@@ -0,0 +1,215 @@
+#!/usr/bin/python3
+"""Two-tier read-through cache of serialized API responses.
+
+Values are looked up in a per-process LRU with a short TTL, then in an
+optional shared Redis tier, and only then loaded from the database.
+Concurrent misses for the same key wait for a single load. Writers
+invalidate both tiers; other processes may serve their local copy for up
+to CACHE_LOCAL_TTL_SECONDS afterwards.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+from fastapi.concurrency import run_in_threadpool
+from api.v1.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def poll_key(poll_id: int) -> str:
+    """Return the cache key of a poll document."""
+    return f"poll:{poll_id}"
+
+
+def choice_key(choice_id: int) -> str:
+    """Return the cache key of a choice document."""
+    return f"choice:{choice_id}"
+
+
+class RedisTier:
+    """Shared cache tier kept in Redis.
+
+    Errors are logged and treated as misses so that an unavailable Redis
+    only costs database reads.
+    """
+
+    def __init__(self, url: str, ttl: float):
+        """Connect to the Redis server at url."""
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key: str) -> bytes:
+        """Return the value of key, or None."""
+        try:
+            return self.client.get(f"cache:{key}")
+        except Exception:
+            logger.warning("shared cache read of %s failed", key)
+            return None
+
+    def set(self, key: str, value: bytes):
+        """Store the value of key for the tier's TTL."""
+        try:
+            self.client.set(f"cache:{key}", value, px=int(self.ttl * 1000))
+        except Exception:
+            logger.warning("shared cache write of %s failed", key)
+
+    def delete(self, key: str):
+        """Drop key."""
+        try:
+            self.client.delete(f"cache:{key}")
+        except Exception:
+            logger.warning("shared cache delete of %s failed", key)
+
+
+class Flight:
+    """Database load in progress for a key."""
+
+    def __init__(self, future: asyncio.Future):
+        """Track the future the waiting requests share."""
+        self.future = future
+        self.stale = False
+
+
+class ReadThroughCache:
+    """LRU cache with a TTL in front of an optional shared tier."""
+
+    def __init__(
+        self, capacity: int, ttl: float, shared: RedisTier = None,
+        clock=time.monotonic
+    ):
+        """Initialize an empty cache."""
+        self.capacity = capacity
+        self.ttl = ttl
+        self.shared = shared
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.flights = {}
+        self.lock = threading.Lock()
+        self.counts = dict.fromkeys((
+            "local_hits", "shared_hits", "misses", "coalesced",
+            "invalidations", "evictions"
+        ), 0)
+
+    def count(self, name: str):
+        """Increment a metric."""
+        with self.lock:
+            self.counts[name] += 1
+
+    def get_local(self, key: str) -> bytes:
+        """Return a fresh local value of key, or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= self.clock():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            self.counts["local_hits"] += 1
+            return value
+
+    def put(self, key: str, value: bytes):
+        """Store value under key in the local tier."""
+        with self.lock:
+            self.entries[key] = (value, self.clock() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+                self.counts["evictions"] += 1
+
+    def prime(self, key: str, value: bytes):
+        """Store value under key in both tiers."""
+        self.put(key, value)
+        if self.shared:
+            self.shared.set(key, value)
+
+    def fill(self, key: str, load: Callable[[], bytes]) -> bytes:
+        """Read key from the shared tier, or load it and share it."""
+        if self.shared:
+            value = self.shared.get(key)
+            if value is not None:
+                self.count("shared_hits")
+                return value
+        self.count("misses")
+        value = load()
+        flight = self.flights.get(key)
+        if value is not None and self.shared and not (
+            flight and flight.stale
+        ):
+            self.shared.set(key, value)
+        return value
+
+    async def get(self, key: str, load: Callable[[], bytes]) -> bytes:
+        """Return the value of key, loading it on a miss.
+
+        load runs in the threadpool and may return None for a missing
+        entity, which is not cached. Concurrent misses share one load.
+        """
+        value = self.get_local(key)
+        if value is not None:
+            return value
+        flight = self.flights.get(key)
+        if flight is not None:
+            self.count("coalesced")
+            return await asyncio.shield(flight.future)
+        flight = Flight(asyncio.get_running_loop().create_future())
+        self.flights[key] = flight
+        try:
+            value = await run_in_threadpool(self.fill, key, load)
+            if value is not None and not flight.stale:
+                self.put(key, value)
+            flight.future.set_result(value)
+            return value
+        except Exception as error:
+            flight.future.set_exception(error)
+            flight.future.exception()
+            raise
+        finally:
+            del self.flights[key]
+            if not flight.future.done():
+                flight.future.cancel()
+
+    def invalidate(self, *keys: str):
+        """Drop keys from both tiers, including loads already running."""
+        for key in keys:
+            with self.lock:
+                self.entries.pop(key, None)
+                self.counts["invalidations"] += 1
+            flight = self.flights.get(key)
+            if flight is not None:
+                flight.stale = True
+            if self.shared:
+                self.shared.delete(key)
+
+    def metrics(self) -> dict:
+        """Return the hit and miss counts and the local tier's size."""
+        with self.lock:
+            counts = dict(self.counts)
+            size = len(self.entries)
+        lookups = (
+            counts["local_hits"] + counts["shared_hits"] + counts["misses"]
+            + counts["coalesced"]
+        )
+        return {
+            **counts,
+            "size": size,
+            "capacity": self.capacity,
+            "hit_ratio": (
+                (lookups - counts["misses"]) / lookups if lookups else None
+            ),
+            "shared": self.shared is not None
+        }
+
+
+cache = ReadThroughCache(
+    settings.CACHE_CAPACITY, settings.CACHE_LOCAL_TTL_SECONDS,
+    RedisTier(
+        settings.CACHE_REDIS_URL, settings.CACHE_SHARED_TTL_SECONDS
+    ) if settings.CACHE_REDIS_URL else None
+)
@@ -0,0 +1,19 @@
+#!/usr/bin/python3
+"""Cache schemas."""
+from typing import Optional
+from pydantic import BaseModel
+
+
+class CacheMetricsRes(BaseModel):
+    """Read-through cache metrics response schema."""
+
+    local_hits: int
+    shared_hits: int
+    misses: int
+    coalesced: int
+    invalidations: int
+    evictions: int
+    size: int
+    capacity: int
+    hit_ratio: Optional[float]
+    shared: bool
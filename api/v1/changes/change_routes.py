@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+"""Change feed routes."""
+from fastapi import APIRouter, HTTPException, Query, status, Depends
+from api.v1.polls.schemas import PollRes
+from api.v1.settings import settings
+from api.v1.sharding import get_all_dbs
+from api.v1.users.oauth import get_current_user
+from .feed import read_changes
+from .schemas import ChangesRes
+
+change_router = APIRouter(prefix="/changes", tags=["changes"])
+
+
+def decode_cursor(cursor: str, shards: int) -> list:
+    """Return the per-shard (xact, seq) positions of a cursor.
+
+    Shards the cursor lacks start from the beginning.
+    """
+    try:
+        positions = [
+            (int(xact or 0), int(seq)) for xact, _, seq in (
+                position.rpartition(":") for position in cursor.split(".")
+            )
+        ] if cursor else []
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return (positions + [(0, 0)] * shards)[:shards]
+
+
+@change_router.get("/", response_model=ChangesRes)
+async def get_changes(
+    since: str = Query("", max_length=2000),
+    limit: int = Query(
+        settings.CHANGE_FEED_PAGE_SIZE, ge=1,
+        le=settings.CHANGE_FEED_PAGE_SIZE
+    ),
+    sessions: list = Depends(get_all_dbs),
+    current_user: str = Depends(get_current_user)
+):
+    """Retrieve the polls and choices changed or deleted since a cursor.
+
+    Start with an empty cursor and pass the returned one to the next call;
+    keep calling while has_more is true.
+    """
+    pages = [
+        read_changes(session, since, limit)
+        for session, since in zip(
+            sessions, decode_cursor(since, len(sessions))
+        )
+    ]
+    return {
+        "cursor": ".".join(
+            ":".join(map(str, page["cursor"])) for page in pages
+        ),
+        "polls": [
+            {name: getattr(poll, name) for name in PollRes.__fields__}
+            for page in pages for poll in page["polls"]
+        ],
+        "choices": [
+            {
+                "id": choice.id,
+                "poll_id": choice.poll_id,
+                "text": choice.txt,
+                "image": choice.image,
+                "created_by": choice.created_by,
+                "created_at": choice.created_at,
+                "updated_at": choice.updated_at
+            }
+            for page in pages for choice in page["choices"]
+        ],
+        "deleted": [
+            deletion for page in pages for deletion in page["deleted"]
+        ],
+        "has_more": any(page["more"] for page in pages)
+    }
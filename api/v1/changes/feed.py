@@ -0,0 +1,148 @@
+#!/usr/bin/python3
+"""Incremental change feed of polls and choices.
+
+Every write to a poll or a choice appends a row to the changes table of
+its shard in the same transaction. Rows are read in (xact, seq) order, so
+a client that remembers the position of the last row it saw only has to
+fetch the rows after it; the entities changed several times are returned
+once, in their current state, and deleted ones as tombstones.
+
+Sequence values are taken when a change is inserted, not when it commits,
+so on PostgreSQL a row is only read once every transaction older than its
+own has finished: xact is the writing transaction's id, and rows below the
+snapshot's xmin can no longer be preceded by a commit still in flight.
+SQLite commits one writer at a time, so its rows are read as soon as they
+are visible.
+
+Run as ``python -m api.v1.changes.feed`` to record the polls and choices
+created before the feed existed.
+"""
+from datetime import datetime, timezone
+from sqlalchemy import (
+    cast, delete, exists, func, insert, literal, select, tuple_
+)
+from sqlalchemy.orm import Session, aliased
+from api.v1.dialects import dialect_of
+from api.v1.models import Change, Choice, Poll, Timestamp
+from api.v1.sharding import each_shard
+
+
+def record_change(
+    session: Session, entity: str, entity_id: int, poll_id: int = None,
+    op: str = "upsert"
+):
+    """Add a change of a poll or choice to the session's transaction."""
+    session.add(Change(
+        entity=entity, entity_id=entity_id,
+        poll_id=entity_id if poll_id is None else poll_id, op=op,
+        changed_at=datetime.now(timezone.utc)
+    ))
+
+
+def record_poll_deleted(session: Session, poll_id: int) -> list:
+    """Record tombstones for a poll and the choices deleted with it.
+
+    Returns the ids of the choices.
+    """
+    choice_ids = session.execute(
+        select(Choice.id).where(Choice.poll_id == poll_id)
+    ).scalars().all()
+    for choice_id in choice_ids:
+        record_change(session, "choice", choice_id, poll_id, "delete")
+    record_change(session, "poll", poll_id, op="delete")
+    return choice_ids
+
+
+def read_changes(session: Session, since: tuple, limit: int) -> dict:
+    """Return the settled changes of a shard after position since.
+
+    Up to limit changes are read. The returned cursor is the (xact, seq)
+    position of the last change read and more tells whether settled
+    changes remain.
+    """
+    query = session.query(
+        Change.xact, Change.seq, Change.entity, Change.entity_id, Change.op
+    ).filter(tuple_(Change.xact, Change.seq) > tuple_(*since))
+    if dialect_of(session) == "postgresql":
+        query = query.filter(Change.xact < func.txid_snapshot_xmin(
+            func.txid_current_snapshot()
+        ))
+    rows = query.order_by(Change.xact, Change.seq).limit(limit + 1).all()
+    settled = rows[:limit]
+    latest = {(row.entity, row.entity_id): row.op for row in settled}
+    polls = session.query(Poll).filter(Poll.id.in_([
+        entity_id for (entity, entity_id), op in latest.items()
+        if entity == "poll" and op == "upsert"
+    ])).all()
+    choices = session.query(Choice).filter(Choice.id.in_([
+        entity_id for (entity, entity_id), op in latest.items()
+        if entity == "choice" and op == "upsert"
+    ])).all()
+    found = {("poll", poll.id) for poll in polls} | {
+        ("choice", choice.id) for choice in choices
+    }
+    return {
+        "cursor": (settled[-1].xact, settled[-1].seq) if settled else since,
+        "polls": polls,
+        "choices": choices,
+        "deleted": [
+            {"entity": entity, "id": entity_id}
+            for entity, entity_id in latest if (entity, entity_id) not in found
+        ],
+        "more": len(rows) > limit
+    }
+
+
+def compact_shard(session: Session) -> int:
+    """Delete the changes superseded by a later change of the same entity.
+
+    The last change of every entity in feed order is kept, so reading
+    from any cursor still returns every entity changed after it.
+    """
+    later = aliased(Change)
+    compacted = session.execute(
+        delete(Change).where(
+            exists().where(
+                later.entity == Change.entity,
+                later.entity_id == Change.entity_id,
+                tuple_(later.xact, later.seq) > tuple_(
+                    Change.xact, Change.seq
+                )
+            )
+        ).execution_options(synchronize_session=False)
+    ).rowcount
+    session.commit()
+    return compacted
+
+
+def compact_changes() -> int:
+    """Compact the change feed of every shard."""
+    return sum(compact_shard(session) for session in each_shard())
+
+
+def backfill() -> int:
+    """Record a change for every poll and choice that has none."""
+    recorded = 0
+    now = datetime.now(timezone.utc)
+    for session in each_shard():
+        for entity, model, poll_id in (
+            ("poll", Poll, Poll.id), ("choice", Choice, Choice.poll_id)
+        ):
+            recorded += session.execute(
+                insert(Change).from_select(
+                    ["entity", "entity_id", "poll_id", "op", "changed_at"],
+                    select(
+                        cast(literal(entity), Change.entity.type), model.id,
+                        poll_id, cast(literal("upsert"), Change.op.type),
+                        literal(now, Timestamp)
+                    ).where(~exists().where(
+                        Change.entity == entity, Change.entity_id == model.id
+                    )).order_by(model.id)
+                )
+            ).rowcount
+        session.commit()
+    return recorded
+
+
+if __name__ == "__main__":
+    print(f"recorded {backfill()} changes")
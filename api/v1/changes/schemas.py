@@ -0,0 +1,36 @@
+#!/usr/bin/python3
+"""Change feed schemas."""
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+from pydantic import BaseModel
+from api.v1.polls.schemas import PollRes
+
+
+class ChangedChoice(BaseModel):
+    """Current state of a changed choice."""
+
+    id: int
+    poll_id: int
+    text: Optional[str]
+    image: Optional[str]
+    created_by: UUID
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+
+class Deletion(BaseModel):
+    """Tombstone of a deleted poll or choice."""
+
+    entity: str
+    id: int
+
+
+class ChangesRes(BaseModel):
+    """Change feed page response schema."""
+
+    cursor: str
+    polls: List[PollRes]
+    choices: List[ChangedChoice]
+    deleted: List[Deletion]
+    has_more: bool
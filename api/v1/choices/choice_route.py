@@ -1,29 +1,94 @@
 #!/usr/bin/python3
 """Choice routes."""
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, Response, status, Depends
+from typing import Optional
+from fastapi import (
+    APIRouter, Header, HTTPException, Request, Response, status, Depends
+)
 from sqlalchemy.orm import Session
+from api.v1.cache.read_through import cache, choice_key, poll_key
+from api.v1.changes.feed import record_change
 from api.v1.database_config import get_db
+from api.v1.polls.documents import refresh_document
+from api.v1.sharding import get_all_dbs, get_choice_db, routed_session
 from api.v1.users.oauth import get_current_user
+from .documents import choice_document
+from .images import check_length, image_url, serve_image, store_image
 from .schemas import ChoiceSchema, ChoiceRes
-from api.v1.models import Choice
+from api.v1.models import Choice, Poll
 
 choice_router = APIRouter(prefix="/choices", tags=["choices"])
 
 
 @choice_router.get("/", response_model=ChoiceRes)
 async def get_choices(
-    session: Session = Depends(get_db),
+    sessions: list = Depends(get_all_dbs),
     current_user: str = Depends(get_current_user)
 ):
     """Retrieve choices."""
     if current_user:
-        choices = session.query(Choice).all()
+        choices = [
+            choice for session in sessions
+            for choice in session.query(Choice).all()
+        ]
         if choices:
             return choices
         return {"message": "no choices available"}
 
 
+@choice_router.get("/images/{digest}")
+async def get_choice_image(
+    digest: str, thumbnail: bool = False,
+    range_: Optional[str] = Header(None, alias="Range"),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Serve a stored choice image or its thumbnail."""
+    return serve_image(digest, thumbnail, range_, if_none_match)
+
+
+@choice_router.post("/{id_}/image", response_model=ChoiceRes)
+async def upload_choice_image(
+    id_: int, request: Request,
+    session: Session = Depends(get_choice_db),
+    current_user: str = Depends(get_current_user)
+):
+    """Upload the image of a choice as the image field of a form.
+
+    The form is parsed here rather than by FastAPI so that the body is
+    streamed to storage, and refused as soon as it grows too large.
+    """
+    check_length(request.headers.get("content-length"))
+    choice = session.query(Choice).filter(Choice.id == id_).first()
+    if not choice:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="choice not found"
+        )
+
+    if choice.created_by != current_user.uuid_pk:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="access denied"
+        )
+
+    choice.image = image_url(await store_image(
+        request.stream(), request.headers.get("content-type")
+    ))
+    choice.updated_at = datetime.utcnow()
+    record_change(session, "choice", choice.id, choice.poll_id)
+    refresh_document(session, choice.poll_id)
+    session.commit()
+    cache.invalidate(choice_key(id_), poll_key(choice.poll_id))
+    session.refresh(choice)
+    return choice
+
+
+def load_choice(id_: int, db: Session) -> bytes:
+    """Load a choice document from the shard holding it."""
+    with routed_session(Choice, id_, db) as session:
+        return choice_document(session, id_)
+
+
 @choice_router.get("/{id_}", response_model=ChoiceRes)
 async def get_choice_by_id(
     id_: int, session: Session = Depends(get_db),
@@ -31,11 +96,11 @@ async def get_choice_by_id(
 ):
     """Retrieve a choice by its id."""
     if current_user:
-        choice = session.query(
-            Choice
-        ).filter(Choice.id == id_).one_or_none()
-        if choice:
-            return choice
+        document = await cache.get(
+            choice_key(id_), lambda: load_choice(id_, session)
+        )
+        if document is not None:
+            return Response(content=document, media_type="application/json")
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="choice not found"
@@ -45,7 +110,7 @@ async def get_choice_by_id(
 @choice_router.put("/{id_}/update", response_model=ChoiceRes)
 async def update_choice(
     id_: int, to_update: ChoiceSchema,
-    session: Session = Depends(get_db),
+    session: Session = Depends(get_choice_db),
     current_user: str = Depends(get_current_user)
 ):
     """Update a choice."""
@@ -64,11 +129,22 @@ async def update_choice(
         )
 
     if choice.first() and choice.first().created_by == current_user.uuid_pk:
-        choice.first().updated_at = datetime.utcnow()
-        update_c = choice.update(**to_update.dict())
+        updated = choice.first()
+        old_poll_id = updated.poll_id
+        for field, value in to_update.dict(exclude={"created_by"}).items():
+            setattr(updated, field, value)
+        updated.updated_at = datetime.utcnow()
+        if old_poll_id != updated.poll_id:
+            record_change(session, "choice", id_, old_poll_id)
+            refresh_document(session, old_poll_id)
+        record_change(session, "choice", id_, updated.poll_id)
+        refresh_document(session, updated.poll_id)
         session.commit()
-        session.refresh(update_c)
-        return update_c
+        cache.invalidate(choice_key(id_), *{
+            poll_key(old_poll_id), poll_key(updated.poll_id)
+        })
+        session.refresh(updated)
+        return updated
     raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="access denied"
@@ -77,7 +153,7 @@ async def update_choice(
 
 @choice_router.delete("/{id_}/delete")
 async def delete_choice(
-    id_: int, session: Session = Depends(get_db),
+    id_: int, session: Session = Depends(get_choice_db),
     current_user: str = Depends(get_current_user)
 ):
     """Delete a choice."""
@@ -96,8 +172,12 @@ async def delete_choice(
         )
 
     if choice.first() and choice.first().created_by == current_user.uuid_pk:
+        poll_id = choice.first().poll_id
+        record_change(session, "choice", id_, poll_id, "delete")
         choice.delete()
+        refresh_document(session, poll_id)
         session.commit()
+        cache.invalidate(choice_key(id_), poll_key(poll_id))
         return
     raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -115,9 +195,14 @@ async def create_choice(
     if current_user:
         choice.created_by = current_user.uuid_pk
         new_choice = Choice(**choice.dict())
-        session.add(new_choice)
-        session.commit()
-        session.refresh(new_choice)
+        with routed_session(Poll, choice.poll_id, session) as shard:
+            shard.add(new_choice)
+            shard.flush()
+            record_change(shard, "choice", new_choice.id, new_choice.poll_id)
+            refresh_document(shard, new_choice.poll_id)
+            shard.commit()
+            cache.invalidate(poll_key(new_choice.poll_id))
+            shard.refresh(new_choice)
         if new_choice:
             response.status_code = status.HTTP_201_CREATED
             return new_choice
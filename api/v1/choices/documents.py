@@ -0,0 +1,20 @@
+#!/usr/bin/python3
+"""Serialized choice documents for the read cache."""
+import orjson
+from sqlalchemy.orm import Session
+from api.v1.models import Choice
+
+CHOICE_FIELDS = (
+    "id", "poll_id", "image", "created_by", "created_at", "updated_at"
+)
+
+
+def choice_document(session: Session, choice_id: int) -> bytes:
+    """Serialize a choice, or return None if it does not exist."""
+    choice = session.query(Choice).filter(Choice.id == choice_id).first()
+    if not choice:
+        return None
+    return orjson.dumps({
+        **{name: getattr(choice, name) for name in CHOICE_FIELDS},
+        "text": choice.txt
+    })
@@ -0,0 +1,314 @@
+#!/usr/bin/python3
+"""Content-addressed storage for choice images."""
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+from api.v1.settings import settings
+
+CHUNK_SIZE = 64 * 1024
+# Room for the multipart boundaries and part headers around the image.
+FORM_OVERHEAD = 16 * 1024
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+DIGEST = re.compile(r"^[0-9a-f]{64}$")
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF8", "image/gif"),
+    (b"RIFF", "image/webp"),
+)
+
+_pool = None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Return the process pool used for thumbnailing."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.THUMBNAIL_WORKERS)
+    return _pool
+
+
+def shutdown_pool():
+    """Stop the thumbnailing processes."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+def image_path(digest: str, thumbnail: bool = False) -> str:
+    """Return the storage path of an image by its sha256 digest."""
+    name = f"{digest}.thumb" if thumbnail else digest
+    return os.path.join(settings.MEDIA_ROOT, digest[:2], name)
+
+
+def image_url(digest: str) -> str:
+    """Return the URL an image is served from."""
+    return f"/choices/images/{digest}"
+
+
+def make_thumbnail(source: str, target: str, size: int):
+    """Write a JPEG thumbnail of source; runs in a worker process."""
+    from PIL import Image
+
+    with Image.open(source) as image:
+        image.verify()
+    handle, partial = tempfile.mkstemp(dir=os.path.dirname(target))
+    try:
+        with os.fdopen(handle, "wb") as out, Image.open(source) as image:
+            image.thumbnail((size, size))
+            image.convert("RGB").save(out, "JPEG", quality=85)
+        os.replace(partial, target)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+
+def check_length(content_length: str):
+    """Reject an upload whose declared length cannot hold a valid image."""
+    if content_length and content_length.isdigit() and (
+        int(content_length) > settings.IMAGE_MAX_BYTES + FORM_OVERHEAD
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="image too large"
+        )
+
+
+def image_parser(content_type: str, pieces: list) -> tuple:
+    """Return a form parser and the state of its image field.
+
+    The parser appends the bytes of the form's first image file field to
+    pieces as they arrive; the state records whether one was seen and
+    whether the form was complete.
+    """
+    kind, options = parse_options_header(content_type or "")
+    if kind != b"multipart/form-data" or not options.get(b"boundary"):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="image file required"
+        )
+    part = {"field": b"", "value": b"", "headers": {}, "image": False,
+            "found": False, "ended": False}
+
+    def on_part_begin():
+        part["headers"] = {}
+
+    def on_header_field(data, start, end):
+        part["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        part["value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][part["field"].lower()] = part["value"]
+        part["field"] = part["value"] = b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(
+            part["headers"].get(b"content-disposition", b"")
+        )
+        part["image"] = not part["found"] and (
+            disposition.get(b"name") == b"image"
+            and b"filename" in disposition
+        )
+        part["found"] = part["found"] or part["image"]
+
+    def on_part_data(data, start, end):
+        if part["image"]:
+            pieces.append(data[start:end])
+
+    def on_part_end():
+        part["image"] = False
+
+    def on_end():
+        part["ended"] = True
+
+    return MultipartParser(options[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_end": on_end,
+    }), part
+
+
+def open_upload() -> tuple:
+    """Open a uniquely named temporary file in the media root."""
+    os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
+    handle, partial = tempfile.mkstemp(dir=settings.MEDIA_ROOT)
+    return os.fdopen(handle, "wb"), partial
+
+
+def keep_upload(partial: str, digest: str) -> str:
+    """Move a written upload to its content address and return the path."""
+    path = image_path(digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        os.remove(partial)
+    else:
+        os.replace(partial, path)
+    return path
+
+
+def too_large() -> HTTPException:
+    """Return the error refusing an oversized image."""
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail="image too large"
+    )
+
+
+def malformed() -> HTTPException:
+    """Return the error refusing a malformed or truncated form."""
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="malformed form"
+    )
+
+
+async def store_image(body: AsyncIterator[bytes], content_type: str) -> str:
+    """Store the image field of a streamed form and thumbnail it.
+
+    The form is parsed as its body arrives, and the image is hashed and
+    written to disk in the same pass, so a body growing past the limit is
+    refused while it is received whether or not its length was declared.
+    Identical images are stored once, and the thumbnail is rendered in a
+    worker process. File writes run in the thread pool, so the event loop
+    neither blocks on the disk nor decodes images.
+    """
+    sha = hashlib.sha256()
+    size = received = 0
+    pieces = []
+    parser, part = image_parser(content_type, pieces)
+    out, partial = await run_in_threadpool(open_upload)
+    try:
+        with out:
+            async for chunk in body:
+                received += len(chunk)
+                if received > settings.IMAGE_MAX_BYTES + FORM_OVERHEAD:
+                    raise too_large()
+                try:
+                    parser.write(chunk)
+                except MultipartParseError as error:
+                    raise malformed() from error
+                for piece in pieces:
+                    size += len(piece)
+                    if size > settings.IMAGE_MAX_BYTES:
+                        raise too_large()
+                    sha.update(piece)
+                if pieces:
+                    await run_in_threadpool(out.writelines, pieces)
+                    pieces.clear()
+        if not part["ended"]:
+            raise malformed()
+        if not part["found"]:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="image file required"
+            )
+        digest = sha.hexdigest()
+        path = await run_in_threadpool(keep_upload, partial, digest)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+    thumbnail = image_path(digest, thumbnail=True)
+    if not os.path.exists(thumbnail):
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                get_pool(), make_thumbnail, path, thumbnail,
+                settings.THUMBNAIL_SIZE
+            )
+        except Exception as error:
+            await run_in_threadpool(os.remove, path)
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="unsupported image"
+            ) from error
+    return digest
+
+
+def media_type(path: str) -> str:
+    """Guess the media type of a stored image from its magic bytes."""
+    with open(path, "rb") as image:
+        head = image.read(12)
+    for signature, kind in SIGNATURES:
+        if head.startswith(signature):
+            return kind
+    return "application/octet-stream"
+
+
+def iter_file(path: str, start: int, length: int):
+    """Yield length bytes of a file from start in chunks."""
+    with open(path, "rb") as image:
+        image.seek(start)
+        while length > 0:
+            chunk = image.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_image(
+    digest: str, thumbnail: bool = False,
+    range_header: str = None, if_none_match: str = None
+) -> Response:
+    """Serve a stored image with range and cache validation support."""
+    path = image_path(digest, thumbnail) if DIGEST.match(digest) else None
+    if not path or not os.path.exists(path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="image not found"
+        )
+    etag = f'"{digest}{"-thumb" if thumbnail else ""}"'
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Cache-Control": CACHE_CONTROL,
+        "ETag": etag,
+    }
+    if if_none_match == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED,
+                        headers=headers)
+
+    size = os.path.getsize(path)
+    start, end = 0, size - 1
+    code = status.HTTP_200_OK
+    if range_header:
+        match = RANGE.match(range_header.strip())
+        if match and match.group(1):
+            start = int(match.group(1))
+            if match.group(2):
+                end = min(int(match.group(2)), size - 1)
+        elif match and match.group(2):
+            start = max(size - int(match.group(2)), 0)
+        if not match or not any(match.groups()) or start > end:
+            raise HTTPException(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                detail="invalid range",
+                headers={"Content-Range": f"bytes */{size}"}
+            )
+        code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        iter_file(path, start, end - start + 1), status_code=code,
+        media_type="image/jpeg" if thumbnail else media_type(path),
+        headers=headers
+    )
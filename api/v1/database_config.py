@@ -1,13 +1,52 @@
 #!/usr/bin/python3
 """Database configuration."""
-from sqlalchemy import create_engine
+import math
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 from .settings import settings
 
 PASSW = settings.DB_USER_PASSW
 DB_NAME = settings.DB_NAME
-SQLALCHEMY_DATABASE_URL = f"postgresql://{PASSW}@localhost/{DB_NAME}"
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+SQLALCHEMY_DATABASE_URL = (
+    settings.DATABASE_URL or f"postgresql://{PASSW}@localhost/{DB_NAME}"
+)
+
+
+def configure_sqlite(dbapi_connection, connection_record):
+    """Tune a new SQLite connection for a concurrent web workload.
+
+    WAL lets readers run alongside the single writer, and NORMAL
+    synchronous mode only syncs at checkpoints, which is durable against
+    application crashes. exp() is registered for SQLite builds without
+    the math functions.
+    """
+    cursor = dbapi_connection.cursor()
+    for pragma in (
+        "journal_mode = WAL",
+        "synchronous = NORMAL",
+        "foreign_keys = ON",
+        "temp_store = MEMORY",
+        f"busy_timeout = {settings.SQLITE_BUSY_TIMEOUT_MS}",
+        f"cache_size = -{settings.SQLITE_CACHE_KIB}",
+        f"mmap_size = {settings.SQLITE_MMAP_BYTES}",
+    ):
+        cursor.execute(f"PRAGMA {pragma}")
+    cursor.close()
+    dbapi_connection.create_function("exp", 1, math.exp, deterministic=True)
+
+
+def make_engine(url: str):
+    """Create an engine for url, configuring SQLite connections."""
+    if not url.startswith("sqlite"):
+        return create_engine(url)
+    sqlite_engine = create_engine(
+        url, connect_args={"check_same_thread": False}
+    )
+    event.listen(sqlite_engine, "connect", configure_sqlite)
+    return sqlite_engine
+
+
+engine = make_engine(SQLALCHEMY_DATABASE_URL)
 session_local = sessionmaker(autoflush=False, autocommit=False, bind=engine)
 Base = declarative_base()
 
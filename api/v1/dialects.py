@@ -0,0 +1,41 @@
+#!/usr/bin/python3
+"""SQL constructs that differ between PostgreSQL and SQLite."""
+from sqlalchemy import Float
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.functions import FunctionElement
+
+
+def dialect_of(session: Session) -> str:
+    """Return the name of the database dialect a session is bound to."""
+    return session.get_bind().dialect.name
+
+
+def upsert(session: Session, model):
+    """Return an INSERT supporting ON CONFLICT for the session's database."""
+    if dialect_of(session) == "sqlite":
+        return sqlite.insert(model)
+    return postgresql.insert(model)
+
+
+class epoch(FunctionElement):
+    """Seconds since the Unix epoch of a timestamp expression."""
+
+    type = Float()
+    inherit_cache = True
+
+
+@compiles(epoch)
+def compile_epoch(element, compiler, **kw):
+    """Compile epoch with EXTRACT."""
+    return f"extract(epoch from {compiler.process(element.clauses, **kw)})"
+
+
+@compiles(epoch, "sqlite")
+def compile_epoch_sqlite(element, compiler, **kw):
+    """Compile epoch from the Julian day of SQLite's text timestamps."""
+    return (
+        f"((julianday({compiler.process(element.clauses, **kw)}) "
+        "- 2440587.5) * 86400.0)"
+    )
@@ -0,0 +1,23 @@
+#!/usr/bin/python3
+"""Handlers of the background job kinds."""
+from api.v1.changes.feed import compact_changes
+from api.v1.polls.finalize import finalize_closed_polls, finalize_poll
+from api.v1.polls.purge import purge_deleted, purge_poll, purge_user
+from api.v1.polls.timeseries import compact_rollups
+from api.v1.settings import settings
+from api.v1.votes.events import snapshot_tallies
+from .queue import job, periodic
+
+job("finalize_poll")(finalize_poll)
+job("finalize_closed_polls")(finalize_closed_polls)
+job("snapshot_tallies")(snapshot_tallies)
+job("compact_changes")(compact_changes)
+job("purge_poll")(purge_poll)
+job("purge_user")(purge_user)
+job("purge_deleted")(purge_deleted)
+job("compact_rollups")(compact_rollups)
+
+periodic("snapshot_tallies", settings.TALLY_SNAPSHOT_INTERVAL_SECONDS)
+periodic("compact_changes", settings.CHANGE_COMPACT_INTERVAL_SECONDS)
+periodic("purge_deleted", settings.PURGE_INTERVAL_SECONDS)
+periodic("compact_rollups", settings.ROLLUP_COMPACT_INTERVAL_SECONDS)
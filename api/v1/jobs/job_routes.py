@@ -0,0 +1,20 @@
+#!/usr/bin/python3
+"""Job queue routes."""
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from api.v1.database_config import get_db
+from api.v1.users.oauth import get_current_user
+from .queue import queue_metrics
+from .schemas import JobMetricsRes
+
+job_router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+@job_router.get("/metrics", response_model=JobMetricsRes)
+async def get_job_metrics(
+    session: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """Retrieve job queue depth and latency metrics."""
+    if current_user:
+        return queue_metrics(session)
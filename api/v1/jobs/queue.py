@@ -0,0 +1,224 @@
+#!/usr/bin/python3
+"""Durable job queue stored in the jobs table.
+
+Route handlers enqueue jobs inside their own transaction, so a job only
+becomes visible when the change that requested it is committed. Workers
+claim due jobs with ``FOR UPDATE SKIP LOCKED`` and hold them for a lease
+identified by a random token, which they renew while the job runs. Jobs
+of crashed workers are claimed again once their lease expires, and a
+worker whose lease was taken over can no longer finish the job.
+"""
+import random
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+from api.v1.database_config import session_local
+from api.v1.models import Job
+from api.v1.settings import settings
+
+handlers = {}
+schedules = {}
+
+
+def job(kind: str) -> Callable:
+    """Register the decorated function as the handler of a job kind."""
+    def register(handler: Callable) -> Callable:
+        handlers[kind] = handler
+        return handler
+    return register
+
+
+def periodic(kind: str, interval: float):
+    """Have workers enqueue a job kind every interval seconds."""
+    schedules[kind] = interval
+
+
+def enqueue_periodic(last_run: dict) -> list:
+    """Enqueue the periodic jobs that are due and not already pending.
+
+    last_run maps each kind to when this worker last enqueued it.
+    """
+    now = datetime.now(timezone.utc)
+    due = [
+        kind for kind, interval in schedules.items()
+        if kind not in last_run
+        or (now - last_run[kind]).total_seconds() >= interval
+    ]
+    if not due:
+        return []
+    session = session_local()
+    try:
+        pending = set(session.execute(
+            select(Job.kind).where(
+                Job.kind.in_(due), Job.status.in_(("queued", "running"))
+            )
+        ).scalars())
+        for kind in due:
+            last_run[kind] = now
+            if kind not in pending:
+                enqueue(session, kind)
+        session.commit()
+        return [kind for kind in due if kind not in pending]
+    finally:
+        session.close()
+
+
+def enqueue(
+    session: Session, kind: str, payload: dict = None,
+    delay: float = 0, max_attempts: int = 5
+) -> Job:
+    """Add a job to the session; it is queued when the session commits."""
+    new_job = Job(
+        kind=kind, payload=payload or {}, max_attempts=max_attempts,
+        run_at=datetime.now(timezone.utc) + timedelta(seconds=delay)
+    )
+    session.add(new_job)
+    return new_job
+
+
+def claim(limit: int) -> list:
+    """Lease up to limit due jobs and return them as dicts."""
+    now = datetime.now(timezone.utc)
+    session = session_local()
+    try:
+        jobs = session.query(Job).filter(
+            or_(
+                Job.status == "queued",
+                and_(Job.status == "running", Job.locked_until < now)
+            ),
+            Job.run_at <= now
+        ).order_by(Job.run_at).limit(limit).with_for_update(
+            skip_locked=True
+        ).all()
+        claimed = []
+        for leased in jobs:
+            leased.status = "running"
+            leased.attempts += 1
+            leased.started_at = now
+            leased.locked_until = now + timedelta(
+                seconds=settings.JOB_LEASE_SECONDS
+            )
+            leased.lease_token = secrets.token_hex(16)
+            claimed.append({
+                "id": leased.id, "lease": leased.lease_token,
+                "kind": leased.kind,
+                "payload": leased.payload, "attempts": leased.attempts,
+                "max_attempts": leased.max_attempts
+            })
+        session.commit()
+        return claimed
+    finally:
+        session.close()
+
+
+def backoff(attempts: int) -> float:
+    """Return the jittered delay before retrying after attempts failures."""
+    delay = min(
+        settings.JOB_BACKOFF_SECONDS * 2 ** (attempts - 1),
+        settings.JOB_BACKOFF_MAX_SECONDS
+    )
+    return random.uniform(delay / 2, delay)
+
+
+def heartbeat(job_id: int, lease: str) -> bool:
+    """Extend the lease of a running job; False once the lease is lost."""
+    session = session_local()
+    try:
+        renewed = session.query(Job).filter(
+            Job.id == job_id, Job.status == "running",
+            Job.lease_token == lease
+        ).update(
+            {
+                Job.locked_until: datetime.now(timezone.utc) + timedelta(
+                    seconds=settings.JOB_LEASE_SECONDS
+                )
+            },
+            synchronize_session=False
+        )
+        session.commit()
+        return bool(renewed)
+    finally:
+        session.close()
+
+
+def finish(job_id: int, lease: str, error: str = None) -> bool:
+    """Mark a claimed job done, or schedule a retry after a failure.
+
+    Returns False, leaving the job alone, when the lease has passed to
+    another worker.
+    """
+    now = datetime.now(timezone.utc)
+    session = session_local()
+    try:
+        finished = session.query(Job).filter(
+            Job.id == job_id, Job.status == "running",
+            Job.lease_token == lease
+        ).with_for_update().first()
+        if not finished:
+            session.rollback()
+            return False
+        finished.locked_until = None
+        finished.lease_token = None
+        if error is None:
+            finished.status = "done"
+            finished.finished_at = now
+        elif finished.attempts >= finished.max_attempts:
+            finished.status = "failed"
+            finished.finished_at = now
+            finished.last_error = error
+        else:
+            finished.status = "queued"
+            finished.last_error = error
+            finished.run_at = now + timedelta(
+                seconds=backoff(finished.attempts)
+            )
+        session.commit()
+        return True
+    finally:
+        session.close()
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Return the nearest-rank percentile of sorted values."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def queue_metrics(session: Session, window: int = 3600) -> dict:
+    """Summarize queue depth and the queue latency of recent jobs.
+
+    Queue latency is the time a job waited between becoming due and being
+    claimed by a worker.
+    """
+    now = datetime.now(timezone.utc)
+    counts = dict(
+        session.query(Job.status, func.count(Job.id)).group_by(
+            Job.status
+        ).all()
+    )
+    oldest = session.query(func.min(Job.run_at)).filter(
+        Job.status == "queued", Job.run_at <= now
+    ).scalar()
+    latencies = sorted(
+        (started_at - run_at).total_seconds()
+        for run_at, started_at in session.query(
+            Job.run_at, Job.started_at
+        ).filter(
+            Job.started_at >= now - timedelta(seconds=window)
+        ).order_by(Job.started_at.desc()).limit(1000)
+    )
+    return {
+        "queued": counts.get("queued", 0),
+        "running": counts.get("running", 0),
+        "done": counts.get("done", 0),
+        "failed": counts.get("failed", 0),
+        "oldest_due_seconds": (
+            (now - oldest).total_seconds() if oldest else 0.0
+        ),
+        "latency_p50_seconds": percentile(latencies, 0.5),
+        "latency_p95_seconds": percentile(latencies, 0.95),
+        "latency_max_seconds": latencies[-1] if latencies else None
+    }
@@ -0,0 +1,17 @@
+#!/usr/bin/python3
+"""Job schemas."""
+from typing import Optional
+from pydantic import BaseModel
+
+
+class JobMetricsRes(BaseModel):
+    """Job queue metrics response schema."""
+
+    queued: int
+    running: int
+    done: int
+    failed: int
+    oldest_due_seconds: float
+    latency_p50_seconds: Optional[float]
+    latency_p95_seconds: Optional[float]
+    latency_max_seconds: Optional[float]
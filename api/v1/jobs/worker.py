@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+"""Job queue worker.
+
+Run as ``python -m api.v1.jobs.worker --processes 2 --concurrency 4``.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import traceback
+from fastapi.concurrency import run_in_threadpool
+import api.v1.jobs.handlers  # noqa: F401 registers the job handlers
+from api.v1.settings import settings
+from .queue import claim, enqueue_periodic, finish, handlers, heartbeat
+
+logger = logging.getLogger(__name__)
+
+
+async def keep_leased(leased: dict):
+    """Renew a job's lease until cancelled or the lease is lost."""
+    while True:
+        await asyncio.sleep(settings.JOB_LEASE_SECONDS / 3)
+        try:
+            renewed = await run_in_threadpool(
+                heartbeat, leased["id"], leased["lease"]
+            )
+        except Exception:
+            logger.exception("lease of job %s not renewed", leased["id"])
+            continue
+        if not renewed:
+            logger.warning("job %s lost its lease", leased["id"])
+            return
+
+
+async def run_job(leased: dict):
+    """Run one claimed job and record its outcome."""
+    handler = handlers.get(leased["kind"])
+    error = None
+    if handler is None:
+        error = f"no handler for job kind {leased['kind']!r}"
+    else:
+        renewal = asyncio.create_task(keep_leased(leased))
+        try:
+            await run_in_threadpool(handler, **leased["payload"])
+        except Exception:
+            error = traceback.format_exc()
+            logger.warning("job %s failed: %s", leased["id"], error)
+        finally:
+            renewal.cancel()
+    await run_in_threadpool(finish, leased["id"], leased["lease"], error)
+
+
+async def work(concurrency: int):
+    """Claim and run jobs until cancelled."""
+    last_run = {}
+    while True:
+        try:
+            await run_in_threadpool(enqueue_periodic, last_run)
+            leased = await run_in_threadpool(claim, concurrency)
+        except Exception:
+            logger.exception("jobs could not be claimed")
+            leased = []
+        if not leased:
+            await asyncio.sleep(settings.JOB_POLL_SECONDS)
+            continue
+        await asyncio.gather(*(run_job(job) for job in leased))
+
+
+def serve(concurrency: int):
+    """Run a worker loop in the current process."""
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(work(concurrency))
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    """Start worker processes from the command line."""
+    parser = argparse.ArgumentParser(description="Run job queue workers.")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    workers = [
+        multiprocessing.Process(target=serve, args=(args.concurrency,))
+        for _ in range(args.processes - 1)
+    ]
+    for worker in workers:
+        worker.start()
+    serve(args.concurrency)
+    for worker in workers:
+        worker.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/python3
+"""Adaptive concurrency limiting with priority load shedding.
+
+The number of requests in flight is capped by a limit that follows the
+observed latency, in the manner of a gradient limiter: while recent
+latency stays within CONCURRENCY_TOLERANCE of the long-run average the
+limit grows by about its square root, and as latency rises above it the
+limit shrinks in proportion, at most halving per sample. Latency is
+measured up to the start of the response, so streamed bodies do not
+count.
+
+Each route has a priority class that may only use a share of the limit,
+so list and export requests are shed first, then ordinary ones, and vote
+casts and result reads last. A shed request gets 503 Service Unavailable
+with a Retry-After header instead of queueing behind the database pool.
+"""
+import math
+import re
+import time
+from typing import Callable
+import orjson
+from api.v1.settings import settings
+
+CRITICAL, NORMAL, LOW = "critical", "normal", "low"
+SHARES = {CRITICAL: 1.0, NORMAL: 0.8, LOW: 0.5}
+PRIORITIES = tuple(
+    (method, re.compile(path), priority)
+    for method, path, priority in (
+        ("POST", r"/votes/create", CRITICAL),
+        ("POST", r"/votes/ballot", CRITICAL),
+        ("GET", r"/polls/\d+/results", CRITICAL),
+        ("GET", r"/votes/tally/\d+", CRITICAL),
+        ("GET", r"/(polls|choices|votes|users|ban/users)/", LOW),
+        ("GET", r"/polls/\d+/export", LOW),
+        ("GET", r"/changes/", LOW),
+        ("POST", r"/polls/import", LOW),
+    )
+)
+
+
+def priority_of(method: str, path: str) -> str:
+    """Return the priority class of a request."""
+    for rule_method, pattern, priority in PRIORITIES:
+        if method == rule_method and pattern.fullmatch(path):
+            return priority
+    return NORMAL
+
+
+class AdaptiveLimit:
+    """In-flight request limit adjusted from latency samples.
+
+    Requests are admitted and completed on the event loop, so no lock is
+    needed.
+    """
+
+    def __init__(
+        self, initial: int, minimum: int, maximum: int,
+        tolerance: float = 1.5, smoothing: float = 0.2,
+        window: int = 600, clock: Callable[[], float] = time.monotonic
+    ):
+        """Initialize the limit with no requests in flight."""
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.window = window
+        self.clock = clock
+        self.in_flight = 0
+        self.long_latency = None
+
+    def admit(self, priority: str) -> bool:
+        """Take a slot for a request of the given priority, if one is free."""
+        if self.in_flight >= self.limit * SHARES[priority]:
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self, latency: float = None):
+        """Free a slot, adjusting the limit from the request's latency."""
+        in_flight = self.in_flight
+        self.in_flight -= 1
+        if latency is None or latency <= 0:
+            return
+        if self.long_latency is None:
+            self.long_latency = latency
+        self.long_latency += (latency - self.long_latency) / self.window
+        if self.long_latency > 2 * latency:
+            self.long_latency *= 0.95
+        if in_flight < self.limit / 2:
+            return
+        gradient = max(0.5, min(
+            1.0, self.tolerance * self.long_latency / latency
+        ))
+        target = self.limit * gradient + math.sqrt(self.limit)
+        self.limit = min(self.maximum, max(
+            self.minimum,
+            self.limit * (1 - self.smoothing) + target * self.smoothing
+        ))
+
+    def retry_after(self) -> int:
+        """Return the seconds a shed client should wait."""
+        return max(1, math.ceil(self.long_latency or 0))
+
+
+class LoadSheddingMiddleware:
+    """ASGI middleware shedding requests beyond the adaptive limit."""
+
+    def __init__(self, app, limit: AdaptiveLimit = None):
+        """Wrap app."""
+        self.app = app
+        self.limit = limit or concurrency_limit
+
+    async def __call__(self, scope, receive, send):
+        """Run the request if its priority class has a free slot."""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if not self.limit.admit(priority_of(scope["method"], scope["path"])):
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", str(self.limit.retry_after()).encode())
+                ]
+            })
+            await send({
+                "type": "http.response.body",
+                "body": orjson.dumps({"detail": "Server is overloaded"})
+            })
+            return
+        started = self.limit.clock()
+        latencies = []
+
+        async def send_timed(message):
+            if message["type"] == "http.response.start":
+                latencies.append(self.limit.clock() - started)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            self.limit.release(latencies[0] if latencies else None)
+
+
+concurrency_limit = AdaptiveLimit(
+    settings.CONCURRENCY_INITIAL_LIMIT, settings.CONCURRENCY_MIN_LIMIT,
+    settings.CONCURRENCY_MAX_LIMIT, settings.CONCURRENCY_TOLERANCE
+)
@@ -1,34 +1,71 @@
 #!/usr/bin/python3
 """Pall models."""
+import uuid
+from datetime import timezone
 from sqlalchemy import (
-    BOOLEAN, TIMESTAMP, Column, DateTime, String,
-    Enum, Integer, ForeignKey, text
+    BOOLEAN, DDL, JSON, TIMESTAMP, BigInteger, Column, Float, String, Enum,
+    Index, Integer, LargeBinary, ForeignKey, Select, Text, TypeDecorator,
+    Uuid, event, func, text
 )
-from sqlalchemy.orm import relationship
-from sqlalchemy.dialects.postgresql import UUID
-from .database_config import Base
+from sqlalchemy.orm import Session, relationship, with_loader_criteria
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from .database_config import Base, engine
+
+# Votes are range partitioned by created_at on PostgreSQL, which requires
+# created_at in the primary key; elsewhere id alone is the key.
+PARTITIONED = engine.dialect.name == "postgresql"
+
+
+class Timestamp(TypeDecorator):
+    """Timezone aware timestamp, kept in UTC where zones are not stored."""
+
+    impl = TIMESTAMP(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        """Convert aware values to naive UTC for databases without zones."""
+        if value is not None and value.tzinfo and dialect.name == "sqlite":
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    def process_result_value(self, value, dialect):
+        """Return naive values as UTC."""
+        if value is not None and value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value
+
+
+def new_uuid() -> str:
+    """Return a new random user id."""
+    return str(uuid.uuid4())
 
 
 class User(Base):
     """User class model."""
 
     __tablename__ = 'users'
+    __table_args__ = (
+        Index(
+            "ix_users_deleted_at", "deleted_at",
+            postgresql_where=text("deleted_at IS NOT NULL")
+        ),
+    )
     uuid_pk = Column(
-        "id", UUID(as_uuid=False), primary_key=True,
-        server_default=text("gen_random_uuid()")
+        "id", Uuid(as_uuid=False), primary_key=True, default=new_uuid
     )
     username = Column(String, nullable=False, unique=True)
     email = Column(String, nullable=False, unique=True)
     password = Column(String, nullable=False)
     polls = relationship("Poll", back_populates="user")
     created_at = Column(
-        TIMESTAMP(timezone=True), nullable=False,
-        server_default=text("now()")
+        Timestamp, nullable=False,
+        server_default=func.now()
     )
     updated_at = Column(
-        DateTime(timezone=True), server_default=None,
+        Timestamp, server_default=None,
         index=False
     )
+    deleted_at = Column(Timestamp, nullable=True)
 
     def __repr__(self):
         """User representation."""
@@ -39,29 +76,59 @@ class Poll(Base):
     """Poll class model."""
 
     __tablename__ = "polls"
+    __table_args__ = (
+        Index(
+            "ix_polls_search_vector", "search_vector",
+            postgresql_using="gin"
+        ),
+        Index(
+            "ix_polls_title_trgm", "title", postgresql_using="gin",
+            postgresql_ops={"title": "gin_trgm_ops"}
+        ),
+        Index(
+            "ix_polls_next_transition_at", "next_transition_at",
+            postgresql_where=text("next_transition_at IS NOT NULL")
+        ),
+        Index(
+            "ix_polls_deleted_at", "deleted_at",
+            postgresql_where=text("deleted_at IS NOT NULL")
+        ),
+    )
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(length=150), nullable=False)
     poll_type = Column(
         Enum("text", "image", name="poll_type_enum", create_type=False),
         nullable=False
     )
+    voting_method = Column(
+        Enum("single", "approval", "ranked", name="voting_method_enum"),
+        nullable=False, default="single", server_default="single"
+    )
     created_by = Column(
-        UUID, ForeignKey("users.id", ondelete="CASCADE"),
+        Uuid(as_uuid=False), ForeignKey("users.id", ondelete="CASCADE"),
         nullable=False
     )
     user = relationship("User", back_populates="polls",
                         foreign_keys=[created_by])
     choices = relationship("Choice", back_populates="poll")
     created_at = Column(
-        TIMESTAMP(timezone=True), nullable=False,
-        server_default=text("now()")
+        Timestamp, nullable=False,
+        server_default=func.now()
     )
     updated_at = Column(
-        DateTime(timezone=True), server_default=None,
+        Timestamp, server_default=None,
         index=False
     )
     is_add_choices_active = Column(BOOLEAN, nullable=True, default=False)
     is_voting_active = Column(BOOLEAN, nullable=True, default=False)
+    opens_at = Column(Timestamp, nullable=True)
+    closes_at = Column(Timestamp, nullable=True)
+    next_transition_at = Column(Timestamp, nullable=True)
+    finalized_at = Column(Timestamp, nullable=True)
+    deleted_at = Column(Timestamp, nullable=True)
+    search_vector = Column(
+        Text().with_variant(TSVECTOR(), "postgresql"), nullable=True
+    )
 
     def __repr__(self):
         """Poll string representation."""
@@ -75,7 +142,7 @@ class Choice(Base):
     id = Column(Integer, primary_key=True, index=True)
     poll_id = Column(
         Integer, ForeignKey("polls.id", ondelete="CASCADE"),
-        nullable=False
+        nullable=False, index=True
     )
     poll = relationship("Poll", back_populates="choices",
                         foreign_keys=[poll_id])
@@ -83,15 +150,17 @@ class Choice(Base):
     image = Column(String(length=250), nullable=True)
     votes = relationship("Vote", back_populates="choice")
     created_by = Column(
-        UUID, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+        Uuid(as_uuid=False), ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False
     )
     created_at = Column(
-        TIMESTAMP(timezone=True), nullable=False,
-        server_default=text("now()")
+        Timestamp, nullable=False,
+        server_default=func.now()
     )
     updated_at = Column(
-        DateTime(timezone=True), server_default=None, index=False
+        Timestamp, server_default=None, index=False
     )
+    deleted_at = Column(Timestamp, nullable=True)
 
     def __repr__(self):
         """Choice str representation."""
@@ -102,10 +171,11 @@ class Vote(Base):
     """User vote."""
 
     __tablename__ = 'votes'
-    id = Column(Integer, primary_key=True, index=True)
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     user = Column(
-        UUID, ForeignKey("users.id", ondelete="CASCADE"),
-        nullable=False
+        Uuid(as_uuid=False), ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False, index=True
     )
     choice_id = Column(
         Integer, ForeignKey("choices.id", ondelete="CASCADE"),
@@ -116,8 +186,220 @@ class Vote(Base):
         foreign_keys=[choice_id]
     )
     created_at = Column(
-        TIMESTAMP(timezone=True), nullable=False,
-        server_default=text("now()")
+        Timestamp, primary_key=PARTITIONED, nullable=False,
+        server_default=func.now()
+    )
+
+
+class Ballot(Base):
+    """Approval or ranked-choice ballot of a user in a poll.
+
+    choices packs the choice ids as little-endian uint32, in preference
+    order for ranked polls.
+    """
+
+    __tablename__ = "ballots"
+    __table_args__ = (
+        Index("ix_ballots_poll_id_user", "poll_id", "user", unique=True),
+    )
+    id = Column(
+        BigInteger().with_variant(Integer, "sqlite"), primary_key=True
+    )
+    poll_id = Column(
+        Integer, ForeignKey("polls.id", ondelete="CASCADE"),
+        nullable=False
+    )
+    user = Column(
+        Uuid(as_uuid=False), ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False, index=True
+    )
+    choices = Column(LargeBinary, nullable=False)
+    created_at = Column(
+        Timestamp, nullable=False,
+        server_default=func.now()
+    )
+
+
+class VoteRollup(Base):
+    """Votes cast on a choice within a minute, hour or day."""
+
+    __tablename__ = "vote_rollups"
+    poll_id = Column(
+        Integer, ForeignKey("polls.id", ondelete="CASCADE"),
+        primary_key=True, autoincrement=False
+    )
+    bucket = Column(
+        Enum("minute", "hour", "day", name="rollup_bucket_enum"),
+        primary_key=True
+    )
+    bucket_start = Column(Timestamp, primary_key=True)
+    choice_id = Column(Integer, primary_key=True, autoincrement=False)
+    votes = Column(Integer, nullable=False)
+
+
+class PollResult(Base):
+    """Frozen vote tally of a choice in a finalized poll."""
+
+    __tablename__ = "poll_results"
+    poll_id = Column(
+        Integer, ForeignKey("polls.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    choice_id = Column(Integer, primary_key=True)
+    votes = Column(Integer, nullable=False)
+    finalized_at = Column(
+        Timestamp, nullable=False,
+        server_default=func.now()
+    )
+
+
+class ArchivedVote(Base):
+    """Vote moved out of the hot votes table after its poll was finalized."""
+
+    __tablename__ = "votes_archive"
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user = Column(Uuid(as_uuid=False), nullable=False)
+    choice_id = Column(Integer, nullable=False)
+    poll_id = Column(
+        Integer, ForeignKey("polls.id", ondelete="CASCADE"),
+        nullable=False, index=True
+    )
+    created_at = Column(Timestamp, nullable=False)
+    archived_at = Column(
+        Timestamp, nullable=False,
+        server_default=func.now()
+    )
+
+
+class PollDocument(Base):
+    """Pre-serialized JSON document of a poll with its choices and counts."""
+
+    __tablename__ = "poll_documents"
+    poll_id = Column(
+        Integer, ForeignKey("polls.id", ondelete="CASCADE"),
+        primary_key=True, autoincrement=False
+    )
+    document = Column(LargeBinary, nullable=False)
+    built_at = Column(
+        Timestamp, nullable=False,
+        server_default=func.now()
+    )
+
+
+class PollTrending(Base):
+    """Persisted time-decayed popularity score of a poll."""
+
+    __tablename__ = "poll_trending"
+    poll_id = Column(Integer, primary_key=True, autoincrement=False)
+    score = Column(Float, nullable=False)
+    scored_at = Column(Timestamp, nullable=False)
+
+
+class Job(Base):
+    """Background job waiting in, or taken from, the job queue."""
+
+    __tablename__ = "jobs"
+    __table_args__ = (Index("ix_jobs_status_run_at", "status", "run_at"),)
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(length=50), nullable=False)
+    payload = Column(JSON, nullable=False, default=dict)
+    status = Column(String(length=10), nullable=False, default="queued")
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    last_error = Column(String, nullable=True)
+    run_at = Column(
+        Timestamp, nullable=False,
+        server_default=func.now()
+    )
+    locked_until = Column(Timestamp, nullable=True)
+    lease_token = Column(String(length=32), nullable=True)
+    started_at = Column(Timestamp, nullable=True)
+    finished_at = Column(Timestamp, nullable=True)
+    created_at = Column(
+        Timestamp, nullable=False,
+        server_default=func.now()
+    )
+
+    def __repr__(self):
+        """Job string representation."""
+        return f"{self.id}: {self.kind} ({self.status})"
+
+
+class VoteEvent(Base):
+    """Append-only record of a vote being cast or retracted.
+
+    Ballots record an event per counted choice, with the ballot's id as
+    vote_id.
+    """
+
+    __tablename__ = "vote_events"
+    __table_args__ = (Index("ix_vote_events_poll_id_id", "poll_id", "id"),)
+    id = Column(
+        BigInteger().with_variant(Integer, "sqlite"), primary_key=True
+    )
+    poll_id = Column(Integer, nullable=False)
+    choice_id = Column(Integer, nullable=False)
+    vote_id = Column(Integer, nullable=False)
+    user = Column(Uuid(as_uuid=False), nullable=False)
+    kind = Column(
+        Enum("cast", "retract", name="vote_event_kind_enum"),
+        nullable=False
+    )
+    created_at = Column(Timestamp, nullable=False)
+    recorded_at = Column(
+        Timestamp, nullable=False,
+        server_default=func.now()
+    )
+
+
+class TallySnapshot(Base):
+    """Per-choice tally of a poll up to and including an event."""
+
+    __tablename__ = "tally_snapshots"
+    poll_id = Column(Integer, primary_key=True)
+    last_event_id = Column(BigInteger, primary_key=True)
+    tallies = Column(JSON, nullable=False)
+    created_at = Column(
+        Timestamp, nullable=False,
+        server_default=func.now()
+    )
+
+
+class HllSketch(Base):
+    """Compressed HyperLogLog registers counting distinct voters."""
+
+    __tablename__ = "hll_sketches"
+    key = Column(String(length=64), primary_key=True)
+    registers = Column(LargeBinary, nullable=False)
+    updated_at = Column(
+        Timestamp, nullable=False,
+        server_default=func.now()
+    )
+
+
+class Change(Base):
+    """Entry of the poll and choice change feed."""
+
+    __tablename__ = "changes"
+    __table_args__ = (
+        Index("ix_changes_entity_seq", "entity", "entity_id", "seq"),
+        Index("ix_changes_xact_seq", "xact", "seq"),
+    )
+    seq = Column(
+        BigInteger().with_variant(Integer, "sqlite"), primary_key=True
+    )
+    xact = Column(BigInteger, nullable=False, server_default="0")
+    entity = Column(
+        Enum("poll", "choice", name="change_entity_enum"), nullable=False
+    )
+    entity_id = Column(Integer, nullable=False)
+    poll_id = Column(Integer, nullable=False, index=True)
+    op = Column(
+        Enum("upsert", "delete", name="change_op_enum"), nullable=False
+    )
+    changed_at = Column(
+        Timestamp, nullable=False,
+        server_default=func.now()
     )
 
 
@@ -128,19 +410,19 @@ class Moderator(Base):
     id = Column(Integer, primary_key=True, index=True)
     mod_for = Column(String(length=150), nullable=False)
     mod_user = Column(
-        UUID, ForeignKey("users.id"),
+        Uuid(as_uuid=False), ForeignKey("users.id"),
         nullable=False
     )
     created_by = Column(
-        UUID, ForeignKey("users.id", ondelete="CASCADE"),
+        Uuid(as_uuid=False), ForeignKey("users.id", ondelete="CASCADE"),
         nullable=False
     )
     created_at = Column(
-        TIMESTAMP(timezone=True), nullable=False,
-        server_default=text("now()")
+        Timestamp, nullable=False,
+        server_default=func.now()
     )
     updated_at = Column(
-        DateTime(timezone=True), server_default=None,
+        Timestamp, server_default=None,
         index=False
     )
 
@@ -155,7 +437,7 @@ class Ban(Base):
     __tablename__ = "ban"
     id = Column(Integer, index=True, primary_key=True)
     poll_owner_id = Column(
-        UUID, ForeignKey("users.id", ondelete="CASCADE"),
+        Uuid(as_uuid=False), ForeignKey("users.id", ondelete="CASCADE"),
         nullable=False
     )
     banned_by = Column(
@@ -163,12 +445,12 @@ class Ban(Base):
         nullable=False
     )
     user_id = Column(
-        UUID, ForeignKey("users.id", ondelete="CASCADE"),
+        Uuid(as_uuid=False), ForeignKey("users.id", ondelete="CASCADE"),
         nullable=False
     )
     created_at = Column(
-        TIMESTAMP(timezone=True), nullable=False,
-        server_default=text("now()")
+        Timestamp, nullable=False,
+        server_default=func.now()
     )
 
     def __repr__(self):
@@ -176,3 +458,88 @@ class Ban(Base):
         return f"""
             Ban id: {self.id} - user: {self.user_id} banned by {self.banned_by}
             """
+
+
+# Full-text search: polls.search_vector holds the weighted title and choice
+# texts and is kept current by triggers on both tables.
+trigram_extension = DDL(
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm"
+).execute_if(dialect="postgresql")
+polls_search_trigger = DDL("""
+        CREATE OR REPLACE FUNCTION polls_search_vector() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector :=
+                setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A')
+                || setweight(to_tsvector('english', coalesce((
+                    SELECT string_agg(text, ' ') FROM choices
+                    WHERE poll_id = NEW.id
+                ), '')), 'B');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql;
+        CREATE TRIGGER polls_search_vector_update
+            BEFORE INSERT OR UPDATE OF title ON polls
+            FOR EACH ROW EXECUTE FUNCTION polls_search_vector();
+""").execute_if(dialect="postgresql")
+choices_search_triggers = DDL("""
+        CREATE OR REPLACE FUNCTION choices_refresh_poll_search()
+        RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                UPDATE polls SET title = title
+                WHERE id IN (SELECT poll_id FROM new_rows);
+            ELSIF TG_OP = 'DELETE' THEN
+                UPDATE polls SET title = title
+                WHERE id IN (SELECT poll_id FROM old_rows);
+            ELSE
+                UPDATE polls SET title = title WHERE id IN (
+                    SELECT poll_id FROM new_rows
+                    UNION SELECT poll_id FROM old_rows
+                );
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+        CREATE TRIGGER choices_search_insert AFTER INSERT ON choices
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION choices_refresh_poll_search();
+        CREATE TRIGGER choices_search_update AFTER UPDATE ON choices
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION choices_refresh_poll_search();
+        CREATE TRIGGER choices_search_delete AFTER DELETE ON choices
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION choices_refresh_poll_search();
+""").execute_if(dialect="postgresql")
+
+# Change feed entries are ordered by the id of the transaction that wrote
+# them, so the feed can tell which entries no running transaction can
+# precede. SQLite runs one writer at a time, so its seqs already follow
+# commit order and xact stays 0.
+changes_xact_default = DDL(
+    "ALTER TABLE changes ALTER COLUMN xact SET DEFAULT txid_current()"
+).execute_if(dialect="postgresql")
+
+event.listen(Base.metadata, "before_create", trigram_extension)
+event.listen(Poll.__table__, "after_create", polls_search_trigger)
+event.listen(Choice.__table__, "after_create", choices_search_triggers)
+event.listen(Change.__table__, "after_create", changes_xact_default)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def hide_deleted(state):
+    """Leave soft-deleted users, polls and choices out of ORM queries.
+
+    Statements run with the include_deleted execution option, and compound
+    selects such as unions, see them.
+    """
+    if (
+        isinstance(state.statement, Select) and not state.is_column_load
+        and not state.is_relationship_load
+        and not state.execution_options.get("include_deleted", False)
+    ):
+        state.statement = state.statement.options(*(
+            with_loader_criteria(
+                model, model.deleted_at.is_(None), include_aliases=True
+            )
+            for model in (User, Poll, Choice)
+        ))
@@ -0,0 +1,122 @@
+#!/usr/bin/python3
+"""Pre-serialized poll documents.
+
+A poll, its choices and their vote counts are denormalized into one JSON
+document stored as bytes in poll_documents, so reading a poll is a single
+primary key lookup with no ORM or pydantic work. Writes to a poll or its
+choices rebuild the document in their own transaction; votes only queue
+the poll, and queued polls are rebuilt at most once per
+POLL_DOCUMENT_REFRESH_SECONDS.
+"""
+from datetime import datetime, timezone
+import orjson
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from api.v1.batching import BatchWriter
+from api.v1.cache.read_through import cache, poll_key
+from api.v1.dialects import upsert
+from api.v1.models import Choice, Poll, PollDocument
+from api.v1.sharding import each_shard, shard_of, shard_sessions
+from api.v1.settings import settings
+from .finalize import count_votes, frozen_results
+
+POLL_FIELDS = (
+    "id", "title", "poll_type", "voting_method", "created_by",
+    "is_add_choices_active", "is_voting_active", "opens_at", "closes_at",
+    "created_at", "updated_at", "finalized_at"
+)
+
+
+def build_document(session: Session, poll_id: int) -> bytes:
+    """Serialize a poll with its choices and counts, or None if missing."""
+    poll = session.query(Poll).filter(Poll.id == poll_id).first()
+    if not poll:
+        return None
+    if poll.finalized_at:
+        votes = dict(frozen_results(session, poll_id))
+    else:
+        votes = dict(count_votes(session, poll_id))
+    choices = [
+        {
+            "id": choice_id, "text": text, "image": image,
+            "votes": votes.get(choice_id, 0)
+        }
+        for choice_id, text, image in session.execute(
+            select(Choice.id, Choice.txt, Choice.image).where(
+                Choice.poll_id == poll_id
+            ).order_by(Choice.id)
+        )
+    ]
+    return orjson.dumps({
+        **{name: getattr(poll, name) for name in POLL_FIELDS},
+        "choices": choices,
+        "total_votes": sum(choice["votes"] for choice in choices)
+    })
+
+
+def refresh_document(session: Session, poll_id: int) -> bytes:
+    """Rebuild a poll's document in the session's transaction."""
+    session.flush()
+    document = build_document(session, poll_id)
+    if document is None:
+        session.execute(
+            delete(PollDocument).where(PollDocument.poll_id == poll_id)
+        )
+        return None
+    insert = upsert(session, PollDocument).values(
+        poll_id=poll_id, document=document,
+        built_at=datetime.now(timezone.utc)
+    )
+    session.execute(insert.on_conflict_do_update(
+        index_elements=[PollDocument.poll_id],
+        set_={
+            "document": insert.excluded.document,
+            "built_at": insert.excluded.built_at
+        }
+    ))
+    return document
+
+
+def load_document(session: Session, poll_id: int) -> bytes:
+    """Return a poll's stored document, building it on first read."""
+    document = session.execute(
+        select(PollDocument.document).where(PollDocument.poll_id == poll_id)
+    ).scalar()
+    if document is None:
+        document = refresh_document(session, poll_id)
+        session.commit()
+    return document
+
+
+def refresh_documents(poll_ids: list):
+    """Rebuild the documents of the queued polls, each once."""
+    for poll_id in set(poll_ids):
+        session = shard_sessions[shard_of(poll_id)]()
+        try:
+            refresh_document(session, poll_id)
+            session.commit()
+        finally:
+            session.close()
+        cache.invalidate(poll_key(poll_id))
+
+
+document_refresher = BatchWriter(
+    refresh_documents, settings.POLL_DOCUMENT_BATCH_SIZE,
+    settings.POLL_DOCUMENT_REFRESH_SECONDS
+)
+
+
+def warm_cache() -> int:
+    """Load the documents of the newest active polls into the cache."""
+    warmed = 0
+    for session in each_shard():
+        for poll_id in session.execute(
+            select(Poll.id).where(Poll.is_voting_active.is_(True)).order_by(
+                Poll.id.desc()
+            ).limit(settings.CACHE_WARMUP_POLLS)
+        ).scalars().all():
+            document = load_document(session, poll_id)
+            if document is not None:
+                cache.prime(poll_key(poll_id), document)
+                warmed += 1
+    return warmed
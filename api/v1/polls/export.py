@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+"""Streaming export of poll votes and results."""
+import csv
+import io
+import orjson
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, union_all
+from sqlalchemy.orm import Session
+from api.v1.models import ArchivedVote, Choice, Vote
+from api.v1.settings import settings
+
+VOTE_COLUMNS = ("id", "user", "choice_id", "created_at")
+RESULT_COLUMNS = ("choice_id", "votes")
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def votes_statement(poll_id: int):
+    """Select the live and archived votes of a poll."""
+    return union_all(
+        select(Vote.id, Vote.user, Vote.choice_id, Vote.created_at).join(
+            Choice, Choice.id == Vote.choice_id
+        ).where(Choice.poll_id == poll_id),
+        select(
+            ArchivedVote.id, ArchivedVote.user,
+            ArchivedVote.choice_id, ArchivedVote.created_at
+        ).where(ArchivedVote.poll_id == poll_id)
+    )
+
+
+def encode_csv(rows, columns: tuple = None) -> bytes:
+    """Encode rows, preceded by a header when columns are given, as CSV."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if columns:
+        writer.writerow(columns)
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def encode_ndjson(rows, columns: tuple) -> bytes:
+    """Encode rows as newline delimited JSON objects."""
+    return b"".join(
+        orjson.dumps(dict(zip(columns, row)), default=str) + b"\n"
+        for row in rows
+    )
+
+
+def encode(fmt: str, rows, columns: tuple, header: bool = False) -> bytes:
+    """Encode a chunk of rows in the requested format."""
+    if fmt == "csv":
+        return encode_csv(rows, columns if header else None)
+    return encode_ndjson(rows, columns)
+
+
+async def stream_votes(session: Session, poll_id: int, fmt: str):
+    """Yield encoded chunks of a poll's votes from a server-side cursor.
+
+    Only one chunk of rows is held in memory at a time. When the client
+    disconnects the response task is cancelled and the cursor is closed.
+    """
+    result = await run_in_threadpool(
+        session.execute,
+        votes_statement(poll_id).execution_options(
+            yield_per=settings.EXPORT_CHUNK_SIZE
+        )
+    )
+    try:
+        partitions = result.partitions()
+        header = True
+        while True:
+            rows = await run_in_threadpool(next, partitions, None)
+            if rows is None:
+                if header and fmt == "csv":
+                    yield encode_csv([], VOTE_COLUMNS)
+                return
+            yield encode(fmt, rows, VOTE_COLUMNS, header)
+            header = False
+    finally:
+        result.close()
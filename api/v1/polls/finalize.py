@@ -0,0 +1,139 @@
+#!/usr/bin/python3
+"""Poll finalization: freeze results and archive raw votes.
+
+Run as ``python -m api.v1.polls.finalize`` to finalize every poll whose
+voting has been closed.
+"""
+from datetime import datetime
+from sqlalchemy import func, insert, literal, or_, select, delete
+from sqlalchemy.orm import Session
+from api.v1.cache.read_through import cache, poll_key
+from api.v1.models import (
+    ArchivedVote, Choice, Poll, PollDocument, PollResult, Vote
+)
+from api.v1.sharding import each_shard, shard_session
+from api.v1.votes.ballots import count_ballots
+from api.v1.settings import settings
+
+
+def count_votes(session: Session, poll_id: int) -> list:
+    """Count live votes per choice of a poll.
+
+    Approval polls count approvals and ranked polls first preferences.
+    """
+    method = session.query(Poll.voting_method).filter(
+        Poll.id == poll_id
+    ).scalar()
+    if method in ("approval", "ranked"):
+        return count_ballots(session, poll_id, method)
+    rows = session.query(
+        Choice.id, func.count(Vote.id)
+    ).outerjoin(Vote, Vote.choice_id == Choice.id).filter(
+        Choice.poll_id == poll_id
+    ).group_by(Choice.id).order_by(Choice.id).all()
+    return [(choice_id, votes) for choice_id, votes in rows]
+
+
+def frozen_results(session: Session, poll_id: int) -> list:
+    """Return the frozen tally of a finalized poll."""
+    rows = session.query(PollResult.choice_id, PollResult.votes).filter(
+        PollResult.poll_id == poll_id
+    ).order_by(PollResult.choice_id).all()
+    return [(choice_id, votes) for choice_id, votes in rows]
+
+
+def freeze_results(session: Session, poll_id: int) -> Poll:
+    """Snapshot the tally of a closed poll into poll_results.
+
+    The poll row is locked so that concurrent finalizations freeze once.
+    The session is committed either way, together with anything the caller
+    added to it, such as the job that archives the votes.
+    """
+    poll = session.query(Poll).filter(
+        Poll.id == poll_id
+    ).with_for_update().first()
+    if not poll or poll.finalized_at:
+        session.commit()
+        return poll
+    session.add_all(
+        PollResult(poll_id=poll_id, choice_id=choice_id, votes=votes)
+        for choice_id, votes in count_votes(session, poll_id)
+    )
+    poll.finalized_at = datetime.utcnow()
+    # The document is rebuilt from the frozen tally on its next read.
+    session.execute(
+        delete(PollDocument).where(PollDocument.poll_id == poll_id)
+    )
+    session.commit()
+    cache.invalidate(poll_key(poll_id))
+    return poll
+
+
+def archive_votes(
+    session: Session, poll_id: int, chunk_size: int = None
+) -> int:
+    """Move the raw votes of a poll to votes_archive in chunks.
+
+    Every chunk is its own transaction so locks are held briefly.
+    """
+    chunk_size = chunk_size or settings.ARCHIVE_CHUNK_SIZE
+    moved = 0
+    while True:
+        ids = session.execute(
+            select(Vote.id).join(Choice, Choice.id == Vote.choice_id).where(
+                Choice.poll_id == poll_id
+            ).limit(chunk_size)
+        ).scalars().all()
+        if not ids:
+            return moved
+        session.execute(insert(ArchivedVote).from_select(
+            ["id", "user", "choice_id", "poll_id", "created_at"],
+            select(
+                Vote.id, Vote.user, Vote.choice_id,
+                literal(poll_id), Vote.created_at
+            ).where(Vote.id.in_(ids))
+        ))
+        session.execute(
+            delete(Vote).where(Vote.id.in_(ids)),
+            execution_options={"synchronize_session": False}
+        )
+        session.commit()
+        moved += len(ids)
+
+
+def finalize_poll(poll_id: int) -> int:
+    """Freeze and archive a closed poll in its own session."""
+    session = shard_session(poll_id)
+    try:
+        poll = freeze_results(session, poll_id)
+        if not poll:
+            return 0
+        return archive_votes(session, poll_id)
+    finally:
+        session.close()
+
+
+def finalize_closed_polls() -> dict:
+    """Finalize every closed poll that has not been finalized yet.
+
+    Polls frozen earlier whose live votes were never archived are picked up
+    again as well.
+    """
+    unarchived = select(Vote.id).join(
+        Choice, Choice.id == Vote.choice_id
+    ).where(Choice.poll_id == Poll.id).exists()
+    poll_ids = [
+        poll_id for session in each_shard()
+        for poll_id in session.execute(
+            select(Poll.id).where(
+                Poll.is_voting_active.is_not(True),
+                or_(Poll.finalized_at.is_(None), unarchived)
+            )
+        ).scalars().all()
+    ]
+    return {poll_id: finalize_poll(poll_id) for poll_id in poll_ids}
+
+
+if __name__ == "__main__":
+    for finalized, archived in finalize_closed_polls().items():
+        print(f"poll {finalized}: archived {archived} votes")
@@ -0,0 +1,275 @@
+#!/usr/bin/python3
+"""Bulk import of polls and their choices.
+
+Rows are validated one at a time while the file is read, loaded into
+temporary staging tables in batches (with COPY on PostgreSQL) and finally
+moved into ``polls`` and ``choices`` with two set-based INSERTs in the
+same transaction, which also adds them to the change feed.
+
+CSV files have one row per choice with the columns ``ref, title,
+poll_type, is_add_choices_active, is_voting_active, choice_text,
+choice_image``; rows sharing a ``ref`` belong to the same poll. NDJSON
+files have one poll per line with its ``choices`` as a list.
+
+Run as ``python -m api.v1.polls.importer FILE --owner USER_ID``.
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+from datetime import datetime, timezone
+from pydantic import ValidationError
+from sqlalchemy import Uuid, bindparam, text
+from sqlalchemy.orm import Session
+from api.v1.database_config import session_local
+from api.v1.dialects import dialect_of
+from api.v1.models import Timestamp
+from api.v1.settings import settings
+from api.v1.sharding import sharded
+from .schemas import ImportChoice, ImportPoll
+
+POLL_COLUMNS = (
+    "ref", "line", "title", "poll_type",
+    "is_add_choices_active", "is_voting_active"
+)
+CHOICE_COLUMNS = ("ref", "line", "text", "image")
+CSV_FIELDS = (
+    "ref", "title", "poll_type", "is_add_choices_active",
+    "is_voting_active", "choice_text", "choice_image"
+)
+
+
+def describe(error: Exception) -> str:
+    """Flatten a validation error into a single line."""
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}"
+            for err in error.errors()
+        )
+    return str(error)
+
+
+def read_ndjson(lines):
+    """Yield (line, ref, poll, choices, error) for every NDJSON poll."""
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            poll = ImportPoll(**json.loads(line))
+        except (ValueError, TypeError) as error:
+            yield number, None, None, [], describe(error)
+            continue
+        yield number, poll.ref, poll, poll.choices, None
+
+
+def read_csv(lines):
+    """Yield (line, ref, poll, choices, error) for every CSV row.
+
+    A poll is read from the first row of its ref; later rows with the same
+    ref only carry a choice and are yielded with a poll of None. When the
+    first row of a ref is rejected, so are the later rows of that ref.
+    """
+    reader = csv.DictReader(lines)
+    missing = set(CSV_FIELDS) - set(reader.fieldnames or ())
+    if missing:
+        error = f"missing columns: {', '.join(sorted(missing))}"
+        yield 1, None, None, [], error
+        return
+    seen = set()
+    rejected = {}
+    for row in reader:
+        number = reader.line_num
+        if row["ref"] in rejected:
+            error = f"poll row rejected on line {rejected[row['ref']]}"
+            yield number, None, None, [], error
+            continue
+        poll = None
+        try:
+            choices = []
+            if row["choice_text"]:
+                choices.append(ImportChoice(
+                    text=row["choice_text"],
+                    image=row["choice_image"] or None
+                ))
+            if row["ref"] not in seen:
+                poll = ImportPoll(
+                    ref=row["ref"], title=row["title"],
+                    poll_type=row["poll_type"],
+                    is_add_choices_active=row["is_add_choices_active"] or 0,
+                    is_voting_active=row["is_voting_active"] or 0
+                )
+        except ValidationError as error:
+            if row["ref"] not in seen:
+                rejected[row["ref"]] = number
+            yield number, None, None, [], describe(error)
+            continue
+        seen.add(row["ref"])
+        yield number, row["ref"], poll, choices, None
+
+
+class Stager:
+    """Buffer validated rows and load them into the staging tables.
+
+    PostgreSQL loads each batch with COPY, other databases with one
+    executemany INSERT per table.
+    """
+
+    def __init__(self, session: Session, batch_size: int):
+        """Create the staging tables for this transaction."""
+        self.session = session
+        self.copy = dialect_of(session) == "postgresql"
+        self.batch_size = batch_size
+        self.polls = []
+        self.choices = []
+        self.pending = 0
+        suffix = " ON COMMIT DROP" if self.copy else ""
+        if not self.copy:
+            session.execute(text("DROP TABLE IF EXISTS temp.import_polls"))
+            session.execute(text("DROP TABLE IF EXISTS temp.import_choices"))
+        session.execute(text(
+            "CREATE TEMP TABLE import_polls ("
+            "ref text PRIMARY KEY, line int, title text, poll_type text, "
+            "is_add_choices_active boolean, is_voting_active boolean, "
+            "poll_id int)" + suffix
+        ))
+        session.execute(text(
+            "CREATE TEMP TABLE import_choices ("
+            "ref text, line int, text text, image text)" + suffix
+        ))
+
+    def add(self, line: int, ref: str, poll: ImportPoll, choices: list):
+        """Stage a poll row and/or its choices."""
+        if poll:
+            self.polls.append((
+                ref, line, poll.title, poll.poll_type.value,
+                poll.is_add_choices_active, poll.is_voting_active
+            ))
+        for choice in choices:
+            self.choices.append((ref, line, choice.text, choice.image or None))
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Load the buffered rows into the staging tables."""
+        for table, columns, rows in (
+            ("import_polls", POLL_COLUMNS, self.polls),
+            ("import_choices", CHOICE_COLUMNS, self.choices),
+        ):
+            if not rows:
+                continue
+            if self.copy:
+                self.copy_rows(table, columns, rows)
+            else:
+                self.session.execute(
+                    text(
+                        f"INSERT INTO {table} ({', '.join(columns)}) "
+                        f"VALUES ({', '.join(':' + name for name in columns)})"
+                    ),
+                    [dict(zip(columns, row)) for row in rows]
+                )
+            rows.clear()
+        self.pending = 0
+
+    def copy_rows(self, table: str, columns: tuple, rows: list):
+        """COPY rows into a staging table as CSV."""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        cursor = self.session.connection().connection.cursor()
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) "
+            "FROM STDIN WITH (FORMAT csv, NULL '')",
+            buffer
+        )
+
+
+def record_imported(session: Session):
+    """Add the staged polls and their new choices to the change feed."""
+    changed_at = bindparam(
+        "changed_at", datetime.now(timezone.utc), type_=Timestamp
+    )
+    session.execute(text(
+        "INSERT INTO changes (entity, entity_id, poll_id, op, changed_at) "
+        "SELECT 'poll', poll_id, poll_id, 'upsert', :changed_at "
+        "FROM import_polls ORDER BY poll_id"
+    ).bindparams(changed_at))
+    session.execute(text(
+        "INSERT INTO changes (entity, entity_id, poll_id, op, changed_at) "
+        "SELECT 'choice', id, poll_id, 'upsert', :changed_at FROM choices "
+        "WHERE poll_id IN (SELECT poll_id FROM import_polls) ORDER BY id"
+    ).bindparams(changed_at))
+
+
+def import_polls(session: Session, lines, fmt: str, owner: str) -> dict:
+    """Import polls and choices owned by owner from an iterable of lines."""
+    reader = read_csv(lines) if fmt == "csv" else read_ndjson(lines)
+    stager = Stager(session, settings.IMPORT_BATCH_SIZE)
+    errors = []
+    refs = set()
+    for line, ref, poll, choices, error in reader:
+        if not error and poll and ref in refs:
+            error = "duplicate ref"
+        if error:
+            errors.append({"line": line, "error": error})
+            continue
+        refs.add(ref)
+        stager.add(line, ref, poll, choices)
+    stager.flush()
+
+    if stager.copy:
+        next_id = "nextval(pg_get_serial_sequence('polls', 'id'))"
+        poll_type = "CAST(poll_type AS poll_type_enum)"
+        owner_id = "CAST(:owner AS uuid)"
+    else:
+        # Only one writer at a time: ids follow the staging row order.
+        next_id = "rowid + (SELECT coalesce(max(id), 0) FROM polls)"
+        poll_type = "poll_type"
+        owner_id = ":owner"
+    owner_param = bindparam("owner", owner, type_=Uuid(as_uuid=False))
+    session.execute(text(f"UPDATE import_polls SET poll_id = {next_id}"))
+    polls = session.execute(text(
+        "INSERT INTO polls (id, title, poll_type, created_by, "
+        "is_add_choices_active, is_voting_active) "
+        f"SELECT poll_id, title, {poll_type}, "
+        f"{owner_id}, is_add_choices_active, is_voting_active "
+        "FROM import_polls"
+    ).bindparams(owner_param)).rowcount
+    choices = session.execute(text(
+        "INSERT INTO choices (poll_id, text, image, created_by) "
+        f"SELECT p.poll_id, c.text, c.image, {owner_id} "
+        "FROM import_choices c JOIN import_polls p USING (ref)"
+    ).bindparams(owner_param)).rowcount
+    record_imported(session)
+    session.commit()
+    errors.sort(key=lambda error: error["line"])
+    return {"polls": polls, "choices": choices, "errors": errors}
+
+
+def main():
+    """Import a file of polls from the command line."""
+    parser = argparse.ArgumentParser(description="Bulk import polls.")
+    parser.add_argument("path", help="CSV or NDJSON file to import")
+    parser.add_argument("--owner", required=True, help="owning user id")
+    parser.add_argument("--format", choices=("csv", "ndjson"))
+    args = parser.parse_args()
+    fmt = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    if sharded:
+        sys.exit("bulk import is not available on sharded databases")
+    session = session_local()
+    try:
+        with open(args.path, newline="", encoding="utf-8") as lines:
+            report = import_polls(session, lines, fmt, args.owner)
+    finally:
+        session.close()
+    for error in report["errors"]:
+        print(json.dumps(error), file=sys.stderr)
+    print(
+        f"imported {report['polls']} polls and {report['choices']} choices, "
+        f"{len(report['errors'])} rows rejected"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,47 @@
 #!/usr/bin/python3
 """Poll routes."""
-from datetime import datetime
-from fastapi import APIRouter, HTTPException, Response, status, Depends
+import io
+from datetime import datetime, timezone
+from typing import List
+from fastapi import (
+    APIRouter, HTTPException, Query, Response, status, Depends, UploadFile
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from api.v1.users.oauth import get_current_user
+from api.v1.cache.read_through import cache, choice_key, poll_key
+from api.v1.changes.feed import record_change, record_poll_deleted
 from api.v1.database_config import get_db
+from api.v1.jobs.queue import enqueue
 from api.v1.models import Poll
-from .schemas import PollSchema, PollRes
+from api.v1.sharding import (
+    allocate_poll_id, get_all_dbs, get_poll_db, routed_session, sharded
+)
+from api.v1.votes.ballots import runoff
+from .documents import load_document, refresh_document
+from .export import MEDIA_TYPES, RESULT_COLUMNS, encode, stream_votes
+from .importer import import_polls
+from .scheduler import scheduler, sync_schedule
+from .search import search_polls
+from .timeseries import series
+from .trending import trending
+from .finalize import count_votes, freeze_results, frozen_results
+from .purge import soft_delete_polls
+from .schemas import (
+    ImportRes, PollDocumentRes, PollSchema, PollRes, PollResultsRes,
+    PollSearchRes, TimeSeriesRes, TrendingPoll
+)
 
 poll_router = APIRouter(prefix="/polls", tags=["poll"])
 
 
 @poll_router.get("/", response_model=PollRes)
-async def retrieve_polls(session: Session = Depends(get_db)):
+async def retrieve_polls(sessions: list = Depends(get_all_dbs)):
     """Retrieve all polls."""
-    polls = session.query(Poll).all()
+    polls = [
+        poll for session in sessions for poll in session.query(Poll).all()
+    ]
     if polls:
         return polls
     return {"message": "No polls available"}
@@ -27,11 +54,17 @@ async def create_poll(
     current_user: str = Depends(get_current_user)
 ):
     """Create a new poll."""
-    poll.created_by = current_user.username
-    new_poll = Poll(**poll.dict())
-    session.add(new_poll)
-    session.commit()
-    session.refresh(new_poll)
+    poll.created_by = current_user.uuid_pk
+    new_poll = Poll(id=allocate_poll_id(), **poll.dict())
+    sync_schedule(new_poll)
+    with routed_session(Poll, new_poll.id, session) as shard:
+        shard.add(new_poll)
+        shard.flush()
+        record_change(shard, "poll", new_poll.id)
+        refresh_document(shard, new_poll.id)
+        shard.commit()
+        shard.refresh(new_poll)
+    scheduler.schedule(new_poll.id, new_poll.next_transition_at)
     if new_poll:
         response.status_code = status.HTTP_201_CREATED
         return new_poll
@@ -41,23 +74,86 @@ async def create_poll(
     )
 
 
-@poll_router.get("/{id_}", response_model=PollRes)
-async def retrieve_poll_by_id(id_: int, session: Session = Depends(get_db)):
-    """Retrieve a poll by the given id."""
-    get_poll = session.query(Poll).filter(Poll.id == id_).first()
+@poll_router.post("/import", response_model=ImportRes)
+async def import_poll_file(
+    file: UploadFile,
+    format_: str = Query(None, alias="format", regex="^(csv|ndjson)$"),
+    session: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """Bulk import polls and choices from a CSV or NDJSON file."""
+    if sharded:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Bulk import is not available on sharded databases"
+        )
+    if not format_:
+        format_ = "csv" if file.filename.endswith(".csv") else "ndjson"
+    lines = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    return await run_in_threadpool(
+        import_polls, session, lines, format_, current_user.uuid_pk
+    )
 
-    if not get_poll:
+
+@poll_router.get("/search", response_model=PollSearchRes)
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    prefix: bool = False,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    sessions: list = Depends(get_all_dbs)
+):
+    """Search polls by title and choice text, best matches first."""
+    hits = sorted(
+        (
+            hit for session in sessions
+            for hit in search_polls(session, q, offset + limit, 0, prefix)
+        ),
+        key=lambda hit: hit[1], reverse=True
+    )[offset:offset + limit]
+    return {
+        "items": [
+            {
+                **{name: getattr(poll, name) for name in PollRes.__fields__},
+                "rank": rank
+            }
+            for poll, rank in hits
+        ],
+        "limit": limit,
+        "offset": offset
+    }
+
+
+@poll_router.get("/trending", response_model=List[TrendingPoll])
+async def retrieve_trending_polls(limit: int = Query(10, ge=1, le=100)):
+    """Retrieve the polls with the most recent voting activity."""
+    return [
+        {"poll_id": poll_id, "score": score}
+        for poll_id, score in trending.trending(limit)
+    ]
+
+
+@poll_router.get("/{id_}", response_model=PollDocumentRes)
+async def retrieve_poll_by_id(
+    id_: int, session: Session = Depends(get_poll_db)
+):
+    """Retrieve a poll with its choices and vote counts."""
+    document = await cache.get(
+        poll_key(id_), lambda: load_document(session, id_)
+    )
+
+    if document is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Poll not found"
         )
 
-    return get_poll
+    return Response(content=document, media_type="application/json")
 
 
 @poll_router.put("/update/{id_}", response_model=PollRes)
 async def update_poll(
-    id_: int, poll: PollSchema, session: Session = Depends(get_db),
+    id_: int, poll: PollSchema, session: Session = Depends(get_poll_db),
     current_user: str = Depends(get_current_user)
 ):
     """Update a poll."""
@@ -69,25 +165,35 @@ async def update_poll(
             detail="Poll not found"
         )
 
-    if get_poll.first().created_by != current_user.username:
+    if get_poll.first().created_by != current_user.uuid_pk:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied"
         )
 
-    get_poll.first().updated_at = datetime.utcnow()
-    updated = get_poll.update(**poll.dict(), synchronize_session=False)
+    updated = get_poll.first()
+    for field, value in poll.dict(
+        exclude={"created_by", "voting_method"}
+    ).items():
+        setattr(updated, field, value)
+    updated.updated_at = datetime.utcnow()
+    sync_schedule(updated)
+    record_change(session, "poll", updated.id)
+    refresh_document(session, updated.id)
     session.commit()
+    cache.invalidate(poll_key(id_))
     session.refresh(updated)
+    scheduler.schedule(updated.id, updated.next_transition_at)
     return updated
 
 
 @poll_router.delete("/delete/{id_}")
 async def delete_poll(
-    id_: int, session: Session = Depends(get_db),
+    id_: int, session: Session = Depends(get_poll_db),
+    db: Session = Depends(get_db),
     current_user: str = Depends(get_current_user)
 ):
-    """Delete a poll."""
+    """Delete a poll; its votes and choices are purged in the background."""
     get_poll = session.query(Poll).filter(Poll.id == id_)
 
     if not get_poll.first():
@@ -96,12 +202,150 @@ async def delete_poll(
             detail="Poll not found"
         )
 
-    if get_poll.first().created_by != current_user.username:
+    if get_poll.first().created_by != current_user.uuid_pk:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied"
         )
 
-    get_poll.delete()
+    choice_ids = record_poll_deleted(session, id_)
+    soft_delete_polls(session, [id_], datetime.now(timezone.utc))
+    refresh_document(session, id_)
+    enqueue(db, "purge_poll", {"poll_id": id_})
     session.commit()
+    db.commit()
+    cache.invalidate(poll_key(id_), *map(choice_key, choice_ids))
     return
+
+
+def results_res(session: Session, poll: Poll, results: list) -> dict:
+    """Return the results of a poll, with the runoff of a ranked poll."""
+    return {
+        "poll_id": poll.id,
+        "voting_method": poll.voting_method,
+        "finalized_at": poll.finalized_at,
+        "results": [
+            {"choice_id": choice_id, "votes": votes}
+            for choice_id, votes in results
+        ],
+        **(runoff(session, poll.id) if poll.voting_method == "ranked" else {})
+    }
+
+
+@poll_router.get("/{id_}/results", response_model=PollResultsRes)
+async def retrieve_poll_results(
+    id_: int, session: Session = Depends(get_poll_db)
+):
+    """Retrieve poll results, served from the frozen snapshot once final."""
+    get_poll = session.query(Poll).filter(Poll.id == id_).first()
+
+    if not get_poll:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Poll not found"
+        )
+
+    if get_poll.finalized_at:
+        results = frozen_results(session, id_)
+    else:
+        results = count_votes(session, id_)
+    return results_res(session, get_poll, results)
+
+
+@poll_router.get("/{id_}/timeseries", response_model=TimeSeriesRes)
+async def retrieve_poll_timeseries(
+    id_: int,
+    bucket: str = Query("hour", regex="^(minute|hour|day)$"),
+    session: Session = Depends(get_poll_db)
+):
+    """Retrieve the votes cast on a poll per minute, hour or day."""
+    if not session.query(Poll.id).filter(Poll.id == id_).first():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Poll not found"
+        )
+
+    return {
+        "poll_id": id_,
+        "bucket": bucket,
+        "points": series(session, id_, bucket)
+    }
+
+
+@poll_router.post("/{id_}/finalize", response_model=PollResultsRes)
+async def finalize_poll_by_id(
+    id_: int, session: Session = Depends(get_poll_db),
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """Freeze the results of a closed poll and archive its votes."""
+    get_poll = session.query(Poll).filter(Poll.id == id_).first()
+
+    if not get_poll:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Poll not found"
+        )
+
+    if get_poll.created_by != current_user.uuid_pk:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+
+    if get_poll.is_voting_active:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Voting is still active"
+        )
+
+    # Unsharded, session is db and the job commits with the freeze. On a
+    # shard the job commits first, and finalize_poll freezes on its own
+    # should the freeze below never commit.
+    enqueue(db, "finalize_poll", {"poll_id": id_})
+    if session is not db:
+        db.commit()
+    get_poll = freeze_results(session, id_)
+    return results_res(session, get_poll, frozen_results(session, id_))
+
+
+@poll_router.get("/{id_}/export")
+async def export_poll(
+    id_: int,
+    format_: str = Query("csv", alias="format", regex="^(csv|ndjson)$"),
+    data: str = Query("votes", regex="^(votes|results)$"),
+    session: Session = Depends(get_poll_db),
+    current_user: str = Depends(get_current_user)
+):
+    """Stream the raw votes or the results of a poll as CSV or NDJSON."""
+    get_poll = session.query(Poll).filter(Poll.id == id_).first()
+
+    if not get_poll:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Poll not found"
+        )
+
+    if get_poll.created_by != current_user.uuid_pk:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+
+    headers = {
+        "Content-Disposition":
+            f"attachment; filename=poll-{id_}-{data}.{format_}"
+    }
+    if data == "results":
+        if get_poll.finalized_at:
+            results = frozen_results(session, id_)
+        else:
+            results = count_votes(session, id_)
+        return Response(
+            content=encode(format_, results, RESULT_COLUMNS, header=True),
+            media_type=MEDIA_TYPES[format_], headers=headers
+        )
+    return StreamingResponse(
+        stream_votes(session, id_, format_),
+        media_type=MEDIA_TYPES[format_], headers=headers
+    )
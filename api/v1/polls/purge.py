@@ -0,0 +1,220 @@
+#!/usr/bin/python3
+"""Soft deletion of polls and users with throttled background purging.
+
+Deleting a poll or a user only stamps deleted_at, which hides it from ORM
+queries at once, and queues a purge job. The purger then deletes the
+dependent votes and choices in chunks of PURGE_CHUNK_SIZE rows, each in
+its own short transaction and followed by a PURGE_PAUSE_SECONDS pause, so
+no long-held locks or large WAL bursts stall concurrent voting. A job
+stops after PURGE_BUDGET_SECONDS and queues its own continuation.
+
+Run as ``python -m api.v1.polls.purge`` to purge every soft-deleted poll
+and user.
+"""
+import time
+from datetime import datetime, timezone
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+from api.v1.database_config import session_local
+from api.v1.jobs.queue import enqueue
+from api.v1.models import (
+    ArchivedVote, Ballot, Choice, Moderator, Poll, TallySnapshot, User,
+    Vote, VoteEvent, VoteRollup
+)
+from api.v1.sharding import each_shard, shard_session
+from api.v1.settings import settings
+
+
+def soft_delete_polls(session: Session, poll_ids: list, now: datetime):
+    """Hide polls and their choices until they are purged."""
+    session.execute(
+        update(Poll).where(Poll.id.in_(poll_ids)).values(deleted_at=now),
+        execution_options={"synchronize_session": False}
+    )
+    session.execute(
+        update(Choice).where(Choice.poll_id.in_(poll_ids)).values(
+            deleted_at=now
+        ),
+        execution_options={"synchronize_session": False}
+    )
+
+
+def requeue(kind: str, payload: dict):
+    """Queue the continuation of an unfinished purge."""
+    session = session_local()
+    try:
+        enqueue(session, kind, payload)
+        session.commit()
+    finally:
+        session.close()
+
+
+def delete_chunks(
+    session: Session, model, condition, deadline: float, on_chunk=None
+) -> bool:
+    """Delete the rows of model matching condition a chunk at a time.
+
+    on_chunk is called with each chunk's ids before they are deleted.
+    Returns whether every row was deleted before the deadline.
+    """
+    while True:
+        ids = session.execute(
+            select(model.id).where(condition).limit(
+                settings.PURGE_CHUNK_SIZE
+            ).execution_options(include_deleted=True)
+        ).scalars().all()
+        if not ids:
+            return True
+        if on_chunk:
+            on_chunk(ids)
+        session.execute(
+            delete(model).where(model.id.in_(ids)),
+            execution_options={"synchronize_session": False}
+        )
+        session.commit()
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(settings.PURGE_PAUSE_SECONDS)
+
+
+def purge_poll_rows(session: Session, poll_id: int, deadline: float) -> bool:
+    """Delete a soft-deleted poll and its rows; return whether it is gone."""
+    poll_choices = select(Choice.id).where(Choice.poll_id == poll_id)
+    for model, condition in (
+        (Vote, Vote.choice_id.in_(poll_choices)),
+        (Ballot, Ballot.poll_id == poll_id),
+        (ArchivedVote, ArchivedVote.poll_id == poll_id),
+        (VoteEvent, VoteEvent.poll_id == poll_id),
+        (Choice, Choice.poll_id == poll_id),
+    ):
+        if not delete_chunks(session, model, condition, deadline):
+            return False
+    for model in (TallySnapshot, VoteRollup):
+        session.execute(delete(model).where(model.poll_id == poll_id))
+    session.execute(
+        delete(Poll).where(Poll.id == poll_id, Poll.deleted_at.is_not(None))
+    )
+    session.commit()
+    return True
+
+
+def purge_poll(poll_id: int) -> bool:
+    """Purge a soft-deleted poll, queueing a continuation if unfinished."""
+    deadline = time.monotonic() + settings.PURGE_BUDGET_SECONDS
+    session = shard_session(poll_id)
+    try:
+        deleted = session.execute(
+            select(Poll.id).where(
+                Poll.id == poll_id, Poll.deleted_at.is_not(None)
+            ).execution_options(include_deleted=True)
+        ).first()
+        if not deleted or purge_poll_rows(session, poll_id, deadline):
+            return True
+    finally:
+        session.close()
+    requeue("purge_poll", {"poll_id": poll_id})
+    return False
+
+
+def retract_votes(session: Session, vote_ids: list):
+    """Log retract events for votes about to be purged."""
+    now = datetime.now(timezone.utc)
+    session.execute(insert(VoteEvent), [
+        {
+            "poll_id": poll_id, "choice_id": choice_id, "vote_id": vote_id,
+            "user": user, "kind": "retract", "created_at": now
+        }
+        for vote_id, choice_id, user, poll_id in session.execute(
+            select(Vote.id, Vote.choice_id, Vote.user, Choice.poll_id).join(
+                Choice, Choice.id == Vote.choice_id
+            ).where(Vote.id.in_(vote_ids)).execution_options(
+                include_deleted=True
+            )
+        )
+    ])
+
+
+def purge_user_rows(session: Session, user_id: str, deadline: float) -> bool:
+    """Delete a user's polls, votes and choices from one shard."""
+    for poll_id in session.execute(
+        select(Poll.id).where(
+            Poll.created_by == user_id, Poll.deleted_at.is_not(None)
+        ).execution_options(include_deleted=True)
+    ).scalars().all():
+        if not purge_poll_rows(session, poll_id, deadline):
+            return False
+    user_choices = select(Choice.id).where(Choice.created_by == user_id)
+    return all(
+        delete_chunks(session, model, condition, deadline, on_chunk)
+        for model, condition, on_chunk in (
+            (
+                Vote, Vote.user == user_id,
+                lambda ids: retract_votes(session, ids)
+            ),
+            (
+                Vote, Vote.choice_id.in_(user_choices),
+                lambda ids: retract_votes(session, ids)
+            ),
+            (Ballot, Ballot.user == user_id, None),
+            (ArchivedVote, ArchivedVote.user == user_id, None),
+            (Choice, Choice.created_by == user_id, None),
+        )
+    )
+
+
+def purge_user(user_id: str) -> bool:
+    """Purge a soft-deleted user, queueing a continuation if unfinished."""
+    deadline = time.monotonic() + settings.PURGE_BUDGET_SECONDS
+    session = session_local()
+    try:
+        deleted = User.uuid_pk == user_id, User.deleted_at.is_not(None)
+        if not session.execute(
+            select(User.uuid_pk).where(*deleted).execution_options(
+                include_deleted=True
+            )
+        ).first():
+            return True
+        if all(
+            purge_user_rows(shard, user_id, deadline)
+            for shard in each_shard()
+        ):
+            session.execute(
+                delete(Moderator).where(Moderator.mod_user == user_id)
+            )
+            session.execute(delete(User).where(*deleted))
+            session.commit()
+            return True
+    finally:
+        session.close()
+    requeue("purge_user", {"user_id": user_id})
+    return False
+
+
+def purge_deleted() -> dict:
+    """Purge the soft-deleted polls and users left by unfinished jobs."""
+    poll_ids = [
+        poll_id for session in each_shard()
+        for poll_id in session.execute(
+            select(Poll.id).where(
+                Poll.deleted_at.is_not(None)
+            ).execution_options(include_deleted=True)
+        ).scalars().all()
+    ]
+    session = session_local()
+    try:
+        user_ids = session.execute(
+            select(User.uuid_pk).where(
+                User.deleted_at.is_not(None)
+            ).execution_options(include_deleted=True)
+        ).scalars().all()
+    finally:
+        session.close()
+    return {
+        "polls": sum(purge_poll(poll_id) for poll_id in poll_ids),
+        "users": sum(purge_user(user_id) for user_id in user_ids)
+    }
+
+
+if __name__ == "__main__":
+    purged = purge_deleted()
+    print(f"purged {purged['polls']} polls and {purged['users']} users")
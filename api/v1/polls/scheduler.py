@@ -0,0 +1,124 @@
+#!/usr/bin/python3
+"""Timer driven opening and closing of scheduled polls.
+
+Every poll with a pending transition stores its time in the indexed
+``next_transition_at`` column. At startup the scheduler loads those with
+a single index scan into a heap and then sleeps until the earliest one is
+due, so no periodic table scans are needed.
+"""
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta, timezone
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from api.v1.cache.read_through import cache, poll_key
+from api.v1.changes.feed import record_change
+from api.v1.models import Poll
+from api.v1.sharding import each_shard, shard_session
+from .documents import refresh_document
+
+logger = logging.getLogger(__name__)
+RETRY_DELAY = timedelta(seconds=5)
+
+
+def sync_schedule(poll: Poll, now: datetime = None):
+    """Align a poll's voting flags with its schedule.
+
+    Sets is_voting_active from the schedule moments that already passed and
+    stores the next pending moment in next_transition_at.
+    """
+    now = now or datetime.now(timezone.utc)
+    if poll.closes_at and poll.closes_at <= now:
+        poll.is_voting_active = False
+        poll.is_add_choices_active = False
+    elif poll.opens_at and poll.opens_at <= now:
+        poll.is_voting_active = True
+    elif poll.opens_at:
+        poll.is_voting_active = False
+    poll.next_transition_at = next(
+        (
+            moment for moment in (poll.opens_at, poll.closes_at)
+            if moment and moment > now
+        ),
+        None
+    )
+
+
+def apply_transition(poll_id: int, now: datetime = None):
+    """Apply a due transition and return the poll's next transition time."""
+    now = now or datetime.now(timezone.utc)
+    session = shard_session(poll_id)
+    try:
+        poll = session.query(Poll).filter(
+            Poll.id == poll_id
+        ).with_for_update().first()
+        if not poll or not poll.next_transition_at:
+            session.rollback()
+            return None
+        if poll.next_transition_at > now:
+            session.rollback()
+            return poll.next_transition_at
+        sync_schedule(poll, now)
+        record_change(session, "poll", poll_id)
+        refresh_document(session, poll_id)
+        session.commit()
+        cache.invalidate(poll_key(poll_id))
+        return poll.next_transition_at
+    finally:
+        session.close()
+
+
+def pending_transitions() -> list:
+    """Return (poll_id, next_transition_at) of every scheduled poll."""
+    return [
+        row for session in each_shard()
+        for row in session.execute(
+            select(Poll.id, Poll.next_transition_at).where(
+                Poll.next_transition_at.is_not(None)
+            )
+        ).all()
+    ]
+
+
+class PollScheduler:
+    """Heap of upcoming poll transitions served by one asyncio task."""
+
+    def __init__(self):
+        """Initialize an empty scheduler."""
+        self.heap = []
+        self.wakeup = asyncio.Event()
+
+    def schedule(self, poll_id: int, when: datetime):
+        """Schedule a transition; stale entries are ignored when they fire."""
+        if when:
+            heapq.heappush(self.heap, (when.timestamp(), poll_id))
+            self.wakeup.set()
+
+    async def run(self):
+        """Recover pending transitions, then apply them as they fall due."""
+        for poll_id, when in await run_in_threadpool(pending_transitions):
+            self.schedule(poll_id, when)
+        while True:
+            self.wakeup.clear()
+            now = datetime.now(timezone.utc)
+            if not self.heap:
+                await self.wakeup.wait()
+                continue
+            delay = self.heap[0][0] - now.timestamp()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, poll_id = heapq.heappop(self.heap)
+            try:
+                when = await run_in_threadpool(apply_transition, poll_id, now)
+            except Exception:
+                logger.exception("poll %s transition failed", poll_id)
+                when = now + RETRY_DELAY
+            self.schedule(poll_id, when)
+
+
+scheduler = PollScheduler()
@@ -1,10 +1,10 @@
 #!/usr/bin/python3
 """Poll schema."""
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import Enum
 from imaplib import Int2AP
-from typing import Optional
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, constr, validator
 
 
 class PollType(str, Enum):
@@ -14,14 +14,40 @@ class PollType(str, Enum):
     image = "image"
 
 
+class VotingMethod(str, Enum):
+    """Poll voting method choices."""
+
+    single = "single"
+    approval = "approval"
+    ranked = "ranked"
+
+
 class PollSchema(BaseModel):
     """Poll schema."""
 
     title: str
     poll_type: PollType
+    voting_method: VotingMethod = VotingMethod.single
     created_by: Optional[str]
     is_add_choices_active: bool
     is_voting_active: bool
+    opens_at: Optional[datetime] = None
+    closes_at: Optional[datetime] = None
+
+    @validator("opens_at", "closes_at")
+    def as_utc(cls, value):
+        """Read naive schedule times as UTC."""
+        if value and value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value
+
+    @validator("closes_at")
+    def closes_after_opening(cls, value, values):
+        """Ensure a poll closes after it opens."""
+        opens_at = values.get("opens_at")
+        if value and opens_at and value <= opens_at:
+            raise ValueError("closes_at must be after opens_at")
+        return value
 
 
 class PollRes(BaseModel):
@@ -30,8 +56,123 @@ class PollRes(BaseModel):
     id: int
     title: str
     poll_type: PollType
+    voting_method: VotingMethod = VotingMethod.single
     created_by: Optional[str]
     is_add_choices_active: bool
     is_voting_active: bool
+    opens_at: Optional[datetime]
+    closes_at: Optional[datetime]
     created_at: datetime
     updated_at: Optional[datetime]
+
+
+class DocumentChoice(BaseModel):
+    """Choice of a poll document with its vote count."""
+
+    id: int
+    text: Optional[str]
+    image: Optional[str]
+    votes: int
+
+
+class PollDocumentRes(PollRes):
+    """Poll with its choices and vote counts."""
+
+    finalized_at: Optional[datetime]
+    choices: List[DocumentChoice]
+    total_votes: int
+
+
+class PollSearchHit(PollRes):
+    """Ranked poll search result."""
+
+    rank: float
+
+
+class PollSearchRes(BaseModel):
+    """Poll search response schema."""
+
+    items: List[PollSearchHit]
+    limit: int
+    offset: int
+
+
+class TrendingPoll(BaseModel):
+    """Trending poll with its decayed vote score."""
+
+    poll_id: int
+    score: float
+
+
+class ChoiceTally(BaseModel):
+    """Vote count of a single choice."""
+
+    choice_id: int
+    votes: int
+
+
+class RunoffRound(BaseModel):
+    """Round of an instant runoff."""
+
+    tallies: List[ChoiceTally]
+    eliminated: Optional[int]
+
+
+class PollResultsRes(BaseModel):
+    """Poll results response schema."""
+
+    poll_id: int
+    voting_method: VotingMethod = VotingMethod.single
+    finalized_at: Optional[datetime]
+    results: List[ChoiceTally]
+    winner: Optional[int]
+    rounds: Optional[List[RunoffRound]]
+
+
+class TimeSeriesPoint(BaseModel):
+    """Votes cast within one bucket of a time series."""
+
+    start: datetime
+    votes: int
+    choices: List[ChoiceTally]
+
+
+class TimeSeriesRes(BaseModel):
+    """Poll vote time series response schema."""
+
+    poll_id: int
+    bucket: str
+    points: List[TimeSeriesPoint]
+
+
+class ImportChoice(BaseModel):
+    """Choice row of a bulk import."""
+
+    text: constr(max_length=50)
+    image: Optional[constr(max_length=250)]
+
+
+class ImportPoll(BaseModel):
+    """Poll row of a bulk import."""
+
+    ref: constr(min_length=1)
+    title: constr(min_length=1, max_length=150)
+    poll_type: PollType
+    is_add_choices_active: bool = False
+    is_voting_active: bool = False
+    choices: List[ImportChoice] = []
+
+
+class ImportRowError(BaseModel):
+    """Rejected row of a bulk import."""
+
+    line: int
+    error: str
+
+
+class ImportRes(BaseModel):
+    """Bulk import report."""
+
+    polls: int
+    choices: int
+    errors: List[ImportRowError]
@@ -0,0 +1,65 @@
+#!/usr/bin/python3
+"""Full-text and typeahead search over polls."""
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.orm import Session
+from api.v1.dialects import dialect_of
+from api.v1.models import Choice, Poll
+
+
+def escape_like(term: str) -> str:
+    """Escape LIKE wildcards in a user supplied term."""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def contains(column, term: str):
+    """Return a case-insensitive substring match of term on column."""
+    return column.ilike(f"%{escape_like(term)}%", escape="\\")
+
+
+def portable_search(q: str, prefix: bool):
+    """Return (rank, condition) for databases without text search.
+
+    Prefix queries rank shorter titles first. Other queries need every
+    term in the title or a choice, and rank title matches above choice
+    matches like the weights of search_vector.
+    """
+    if prefix:
+        condition = Poll.title.ilike(f"{escape_like(q)}%", escape="\\")
+        return len(q) / func.length(Poll.title), condition
+    terms = q.split() or [q]
+    rank = sum(
+        case((contains(Poll.title, term), 1.0), else_=0.4) for term in terms
+    )
+    condition = and_(*(
+        or_(
+            contains(Poll.title, term),
+            Poll.choices.any(contains(Choice.txt, term))
+        )
+        for term in terms
+    ))
+    return rank, condition
+
+
+def search_polls(
+    session: Session, q: str, limit: int, offset: int,
+    prefix: bool = False
+) -> list:
+    """Return (poll, rank) pairs matching q, best first.
+
+    Full-text queries go through the GIN indexed search_vector and are
+    ranked with ts_rank_cd. Prefix queries are for typeahead: they match
+    the start of the title through the trigram index and rank by
+    similarity. Other databases fall back to LIKE matching.
+    """
+    if dialect_of(session) != "postgresql":
+        rank, condition = portable_search(q, prefix)
+    elif prefix:
+        rank = func.similarity(Poll.title, q)
+        condition = Poll.title.ilike(f"{escape_like(q)}%", escape="\\")
+    else:
+        query = func.websearch_to_tsquery("english", q)
+        rank = func.ts_rank_cd(Poll.search_vector, query)
+        condition = Poll.search_vector.op("@@")(query)
+    return session.query(Poll, rank.label("rank")).filter(
+        condition
+    ).order_by(rank.desc(), Poll.id).limit(limit).offset(offset).all()
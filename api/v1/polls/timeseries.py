@@ -0,0 +1,150 @@
+#!/usr/bin/python3
+"""Pre-aggregated vote time series.
+
+Votes cast are counted per poll, choice and minute as their events are
+written, so a chart reads a bounded number of rollup rows instead of
+scanning votes. Compaction folds minute buckets older than
+ROLLUP_MINUTE_RETENTION_SECONDS into hour buckets, and hour buckets older
+than ROLLUP_HOUR_RETENTION_SECONDS into day buckets; coarser series add
+up the finer rows not yet folded, while minute series only reach back as
+far as the minutes kept.
+
+Run as ``python -m api.v1.polls.timeseries`` to compact every shard.
+"""
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.orm import Session
+from api.v1.dialects import upsert
+from api.v1.models import VoteRollup
+from api.v1.sharding import each_shard
+from api.v1.settings import settings
+
+BUCKETS = ("minute", "hour", "day")
+
+
+def truncate(moment: datetime, bucket: str) -> datetime:
+    """Return the start of the bucket holding moment, in UTC."""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    moment = moment.astimezone(timezone.utc).replace(second=0, microsecond=0)
+    if bucket in ("hour", "day"):
+        moment = moment.replace(minute=0)
+    if bucket == "day":
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def add_counts(session: Session, bucket: str, counts: Counter):
+    """Add vote counts keyed by (poll_id, choice_id, start) to a bucket."""
+    if not counts:
+        return
+    insert = upsert(session, VoteRollup)
+    session.execute(
+        insert.on_conflict_do_update(
+            index_elements=[
+                VoteRollup.poll_id, VoteRollup.bucket,
+                VoteRollup.bucket_start, VoteRollup.choice_id
+            ],
+            set_={"votes": VoteRollup.votes + insert.excluded.votes}
+        ),
+        [
+            {
+                "poll_id": poll_id, "choice_id": choice_id, "bucket": bucket,
+                "bucket_start": start, "votes": votes
+            }
+            for (poll_id, choice_id, start), votes in sorted(counts.items())
+        ]
+    )
+
+
+def record_events(session: Session, events: list):
+    """Count the cast events of a batch into minute buckets."""
+    add_counts(session, "minute", Counter(
+        (event["poll_id"], event["choice_id"],
+         truncate(event["created_at"], "minute"))
+        for event in events if event["kind"] == "cast"
+    ))
+
+
+def series(session: Session, poll_id: int, bucket: str) -> list:
+    """Return a poll's votes per bucket, oldest first.
+
+    Each point has the bucket's start, its total and its per-choice votes.
+    """
+    points = {}
+    for start, choice_id, votes in session.execute(
+        select(
+            VoteRollup.bucket_start, VoteRollup.choice_id, VoteRollup.votes
+        ).where(
+            VoteRollup.poll_id == poll_id,
+            VoteRollup.bucket.in_(BUCKETS[:BUCKETS.index(bucket) + 1])
+        )
+    ):
+        choices = points.setdefault(truncate(start, bucket), Counter())
+        choices[choice_id] += votes
+    return [
+        {
+            "start": start,
+            "votes": sum(choices.values()),
+            "choices": [
+                {"choice_id": choice_id, "votes": votes}
+                for choice_id, votes in sorted(choices.items())
+            ]
+        }
+        for start, choices in sorted(points.items())
+    ]
+
+
+def fold(session: Session, finer: str, coarser: str, before: datetime) -> int:
+    """Fold the finer buckets starting before a time into coarser ones.
+
+    Each chunk of ROLLUP_COMPACT_CHUNK_SIZE rows is folded in its own
+    transaction. Returns the number of rows folded.
+    """
+    folded = 0
+    while True:
+        rows = session.execute(
+            select(
+                VoteRollup.poll_id, VoteRollup.choice_id,
+                VoteRollup.bucket_start, VoteRollup.votes
+            ).where(
+                VoteRollup.bucket == finer, VoteRollup.bucket_start < before
+            ).limit(settings.ROLLUP_COMPACT_CHUNK_SIZE)
+        ).all()
+        if not rows:
+            return folded
+        counts = Counter()
+        for poll_id, choice_id, start, votes in rows:
+            counts[poll_id, choice_id, truncate(start, coarser)] += votes
+        add_counts(session, coarser, counts)
+        session.execute(delete(VoteRollup).where(
+            VoteRollup.bucket == finer,
+            tuple_(
+                VoteRollup.poll_id, VoteRollup.choice_id,
+                VoteRollup.bucket_start
+            ).in_([row[:3] for row in rows])
+        ))
+        session.commit()
+        folded += len(rows)
+
+
+def compact_shard(session: Session) -> int:
+    """Fold a shard's expired minute and hour buckets."""
+    now = datetime.now(timezone.utc)
+    return fold(session, "minute", "hour", truncate(
+        now - timedelta(seconds=settings.ROLLUP_MINUTE_RETENTION_SECONDS),
+        "hour"
+    )) + fold(session, "hour", "day", truncate(
+        now - timedelta(seconds=settings.ROLLUP_HOUR_RETENTION_SECONDS),
+        "day"
+    ))
+
+
+def compact_rollups() -> int:
+    """Compact the vote rollups of every shard."""
+    return sum(compact_shard(session) for session in each_shard())
+
+
+if __name__ == "__main__":
+    print(f"folded {compact_rollups()} rollup buckets")
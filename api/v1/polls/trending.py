@@ -0,0 +1,258 @@
+#!/usr/bin/python3
+"""Trending polls ranked by exponentially time-decayed vote counts.
+
+Scores are kept relative to a reference time (the epoch) so that a vote
+only ever adds to one score: decaying every score by the same factor does
+not change their order. The epoch is moved forward periodically to keep
+the weights in floating point range.
+"""
+import asyncio
+import heapq
+import logging
+from bisect import bisect_left, insort
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from operator import itemgetter
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+from api.v1.database_config import session_local
+from api.v1.dialects import epoch, upsert
+from api.v1.models import Choice, PollTrending, Vote
+from api.v1.sharding import each_shard
+from api.v1.settings import settings
+
+logger = logging.getLogger(__name__)
+MIN_SCORE = 1e-3
+MAX_EXPONENT = 20.0
+
+
+class TrendingEngine:
+    """Decayed score per poll with a bounded set of top candidates."""
+
+    def __init__(self, half_life: float, capacity: int, clock=time.time):
+        """Initialize an empty engine."""
+        self.decay = math.log(2) / half_life
+        self.capacity = capacity
+        self.clock = clock
+        self.epoch = clock()
+        self.scores = {}
+        self.pending = {}
+        self.top = {}
+        self.ranked = []
+        self.lock = threading.RLock()
+
+    def weight(self, at: float) -> float:
+        """Return the epoch-relative weight of an event at time at."""
+        return math.exp(self.decay * (at - self.epoch))
+
+    def record(self, poll_id: int, at: float = None, count: float = 1.0):
+        """Add count votes for a poll cast at time at."""
+        at = self.clock() if at is None else at
+        with self.lock:
+            if self.decay * (at - self.epoch) > MAX_EXPONENT:
+                self.rebase(at)
+            added = count * self.weight(at)
+            score = self.scores.get(poll_id, 0.0) + added
+            self.scores[poll_id] = score
+            self.pending[poll_id] = self.pending.get(poll_id, 0.0) + added
+            self.offer(poll_id, score)
+
+    def offer(self, poll_id: int, score: float):
+        """Update the candidate set with a poll's new score.
+
+        Scores only grow, so a poll enters the candidate set once it beats
+        the smallest member. The candidates are kept in a list sorted by
+        score, which costs a bisect and a short memmove per vote and lets
+        trending() read the top K without looking at the others.
+        """
+        if poll_id in self.top:
+            del self.ranked[bisect_left(
+                self.ranked, (self.top[poll_id], poll_id)
+            )]
+        elif len(self.top) >= self.capacity:
+            if score <= self.ranked[0][0]:
+                return
+            del self.top[self.ranked.pop(0)[1]]
+        self.top[poll_id] = score
+        insort(self.ranked, (score, poll_id))
+
+    def rebase(self, now: float = None):
+        """Move the epoch to now, dropping polls that decayed away."""
+        now = self.clock() if now is None else now
+        with self.lock:
+            self._rebase(now)
+
+    def _rebase(self, now: float):
+        """Rebase while holding the lock."""
+        factor = math.exp(-self.decay * (now - self.epoch))
+        self.epoch = now
+        self.scores = {
+            poll_id: score * factor
+            for poll_id, score in self.scores.items()
+            if score * factor >= MIN_SCORE
+        }
+        self.pending = {
+            poll_id: score * factor for poll_id, score in self.pending.items()
+        }
+        self.top = dict(heapq.nlargest(
+            self.capacity, self.scores.items(), key=itemgetter(1)
+        ))
+        self.ranked = sorted(
+            (score, poll_id) for poll_id, score in self.top.items()
+        )
+
+    def load(self, rows):
+        """Replace the scores by (poll_id, score, scored_at) rows.
+
+        Increments that have not been persisted yet are kept on top.
+        """
+        with self.lock:
+            self.scores = dict(self.pending)
+            for poll_id, score, scored_at in rows:
+                self.scores[poll_id] = self.scores.get(poll_id, 0.0) + (
+                    score * self.weight(scored_at.timestamp())
+                )
+            self._rebase(self.clock())
+
+    def trending(self, limit: int, now: float = None) -> list:
+        """Return the limit hottest (poll_id, score) pairs at time now."""
+        now = self.clock() if now is None else now
+        with self.lock:
+            factor = math.exp(-self.decay * (now - self.epoch))
+            hottest = self.ranked[:-limit - 1:-1] if limit > 0 else []
+        return [(poll_id, score * factor) for score, poll_id in hottest]
+
+    def take_pending(self, now: float = None) -> dict:
+        """Return and reset the unpersisted score increments as of now."""
+        now = self.clock() if now is None else now
+        with self.lock:
+            factor = math.exp(-self.decay * (now - self.epoch))
+            pending, self.pending = self.pending, {}
+        return {poll_id: added * factor for poll_id, added in pending.items()}
+
+    def restore_pending(self, pending: dict, now: float):
+        """Put back increments taken at now that could not be persisted."""
+        with self.lock:
+            factor = math.exp(self.decay * (now - self.epoch))
+            for poll_id, added in pending.items():
+                self.pending[poll_id] = (
+                    self.pending.get(poll_id, 0.0) + added * factor
+                )
+
+
+trending = TrendingEngine(
+    settings.TRENDING_HALF_LIFE_SECONDS, settings.TRENDING_CAPACITY
+)
+
+
+def persist(session: Session, engine: TrendingEngine = trending):
+    """Merge unpersisted increments into poll_trending and reload it.
+
+    Increments are added to the stored score after decaying it to now, so
+    several API workers can share the table; reloading picks up the votes
+    recorded by the other workers.
+    """
+    now = datetime.now(timezone.utc)
+    pending = engine.take_pending(now.timestamp())
+    try:
+        rows = merge(session, engine, pending, now)
+    except BaseException:
+        session.rollback()
+        engine.restore_pending(pending, now.timestamp())
+        raise
+    engine.load(rows)
+
+
+def merge(
+    session: Session, engine: TrendingEngine, pending: dict, now: datetime
+) -> list:
+    """Upsert increments, drop decayed rows and return the stored scores."""
+    if pending:
+        stmt = upsert(session, PollTrending).values([
+            {"poll_id": poll_id, "score": score, "scored_at": now}
+            for poll_id, score in pending.items()
+        ])
+        session.execute(stmt.on_conflict_do_update(
+            index_elements=[PollTrending.poll_id],
+            set_={
+                "score": PollTrending.score * func.exp(
+                    -engine.decay * (
+                        epoch(stmt.excluded.scored_at)
+                        - epoch(PollTrending.scored_at)
+                    )
+                ) + stmt.excluded.score,
+                "scored_at": stmt.excluded.scored_at
+            }
+        ))
+    rows = session.execute(
+        select(
+            PollTrending.poll_id, PollTrending.score, PollTrending.scored_at
+        )
+    ).all()
+    stale = [
+        poll_id for poll_id, score, scored_at in rows
+        if score * math.exp(
+            -engine.decay * (now - scored_at).total_seconds()
+        ) < MIN_SCORE
+    ]
+    if stale:
+        session.execute(
+            delete(PollTrending).where(PollTrending.poll_id.in_(stale))
+        )
+    session.commit()
+    return rows
+
+
+def rebuild(session: Session, engine: TrendingEngine = trending):
+    """Recompute the scores from votes cast within ten half-lives."""
+    horizon = datetime.now(timezone.utc) - timedelta(
+        seconds=10 * math.log(2) / engine.decay
+    )
+    for shard in each_shard():
+        result = shard.execute(
+            select(Choice.poll_id, Vote.created_at).join(
+                Choice, Choice.id == Vote.choice_id
+            ).where(
+                Vote.created_at >= horizon
+            ).execution_options(yield_per=settings.EXPORT_CHUNK_SIZE)
+        )
+        for poll_id, created_at in result:
+            engine.record(poll_id, created_at.timestamp())
+        result.close()
+    persist(session, engine)
+
+
+def restore(engine: TrendingEngine = trending):
+    """Load persisted scores, rebuilding them from votes when missing."""
+    session = session_local()
+    try:
+        if session.query(PollTrending.poll_id).first():
+            persist(session, engine)
+        else:
+            rebuild(session, engine)
+    finally:
+        session.close()
+
+
+def persist_once(engine: TrendingEngine = trending):
+    """Persist the engine in its own session."""
+    session = session_local()
+    try:
+        persist(session, engine)
+    finally:
+        session.close()
+
+
+async def maintain(engine: TrendingEngine = trending):
+    """Restore the scores, then persist them periodically."""
+    step = restore
+    while True:
+        try:
+            await run_in_threadpool(step, engine)
+            step = persist_once
+        except Exception:
+            logger.exception("trending scores could not be persisted")
+        await asyncio.sleep(settings.TRENDING_PERSIST_SECONDS)
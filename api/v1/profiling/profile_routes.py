@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+"""Profiling routes."""
+import json
+import os
+from typing import List
+from fastapi import APIRouter, HTTPException, Path, status, Depends
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+from api.v1.database_config import get_db
+from api.v1.models import Moderator
+from api.v1.users.oauth import get_current_user
+from .profiler import list_profiles, profile_path
+from .schemas import ProfileRes
+
+profile_router = APIRouter(prefix="/profiles", tags=["profiles"])
+PROFILE_ID = Path(regex=r"^\d+-[0-9a-f]{8}$")
+
+
+def existing_path(profile_id: str, suffix: str) -> str:
+    """Return the path of a stored profile file or raise a 404."""
+    path = profile_path(profile_id, suffix)
+    if not os.path.exists(path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+    return path
+
+
+@profile_router.get("/", response_model=List[str])
+async def get_profiles(
+    session: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """Retrieve the ids of the stored profiles, newest first."""
+    moderator = session.query(
+        Moderator
+    ).filter(Moderator.mod_user == current_user.uuid_pk).first()
+
+    if not moderator:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="access denied"
+        )
+
+    return list_profiles()
+
+
+@profile_router.get("/{profile_id}", response_model=ProfileRes)
+async def get_profile(
+    profile_id: str = PROFILE_ID,
+    session: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """Retrieve a profiled request's SQL and top functions."""
+    moderator = session.query(
+        Moderator
+    ).filter(Moderator.mod_user == current_user.uuid_pk).first()
+
+    if not moderator:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="access denied"
+        )
+
+    with open(existing_path(profile_id, "json")) as file:
+        return json.load(file)
+
+
+@profile_router.get("/{profile_id}/download")
+async def download_profile(
+    profile_id: str = PROFILE_ID,
+    session: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """Download a profile's cProfile stats for pstats or snakeviz."""
+    moderator = session.query(
+        Moderator
+    ).filter(Moderator.mod_user == current_user.uuid_pk).first()
+
+    if not moderator:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="access denied"
+        )
+
+    return FileResponse(
+        existing_path(profile_id, "prof"),
+        media_type="application/octet-stream",
+        filename=f"{profile_id}.prof"
+    )
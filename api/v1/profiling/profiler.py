@@ -0,0 +1,195 @@
+#!/usr/bin/python3
+"""Opt-in profiling of individual requests.
+
+A request is profiled when it carries an X-Profile header signed with
+PROFILE_SECRET_KEY, or when it is drawn at PROFILE_SAMPLE_RATE. Its
+cProfile stats and the SQL it issued are written to PROFILE_DIR, which
+keeps the newest PROFILE_KEEP profiles, and the profile id is returned in
+the X-Profile-Id response header. Requests that are not profiled pay one
+header lookup; the SQL hooks are only installed while a profile runs.
+
+cProfile follows the event loop thread, so one request is profiled at a
+time and other requests running alongside it show up in its stats.
+
+Run as ``python -m api.v1.profiling.profiler`` to print a header value
+valid for PROFILE_TOKEN_SECONDS.
+"""
+import cProfile
+import hashlib
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import time
+import uuid
+from contextvars import ContextVar
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from api.v1.settings import settings
+
+PROFILE_HEADER = b"x-profile"
+recorded_queries = ContextVar("recorded_queries", default=None)
+
+
+def sign(expires: int) -> str:
+    """Return the signature of a profile token expiring at expires."""
+    return hmac.new(
+        settings.PROFILE_SECRET_KEY.encode(), str(expires).encode(),
+        hashlib.sha256
+    ).hexdigest()
+
+
+def profile_token(ttl: float = None) -> str:
+    """Return an X-Profile header value valid for ttl seconds."""
+    expires = int(time.time() + (ttl or settings.PROFILE_TOKEN_SECONDS))
+    return f"{expires}.{sign(expires)}"
+
+
+def valid_token(token: str) -> bool:
+    """Tell whether token is an unexpired, correctly signed profile token."""
+    if not settings.PROFILE_SECRET_KEY:
+        return False
+    expires, _, signature = token.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(signature, sign(int(expires)))
+
+
+def wants_profile(scope: dict) -> bool:
+    """Tell whether a request should be profiled."""
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            return valid_token(value.decode("latin-1"))
+    rate = settings.PROFILE_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
+def before_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    """Note when a statement of a profiled request starts."""
+    if recorded_queries.get() is not None:
+        conn.info.setdefault("profile_started", []).append(
+            time.perf_counter()
+        )
+
+
+def after_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    """Record a statement of a profiled request with its duration."""
+    queries = recorded_queries.get()
+    if queries is None or not conn.info.get("profile_started"):
+        return
+    started = conn.info["profile_started"].pop()
+    if len(queries) < settings.PROFILE_MAX_QUERIES:
+        queries.append({
+            "statement": statement,
+            "executemany": executemany,
+            "ms": round((time.perf_counter() - started) * 1000, 3)
+        })
+
+
+SQL_HOOKS = (
+    ("before_cursor_execute", before_cursor_execute),
+    ("after_cursor_execute", after_cursor_execute)
+)
+
+
+def profile_path(profile_id: str, suffix: str) -> str:
+    """Return the path of a profile's file with the given suffix."""
+    return os.path.join(settings.PROFILE_DIR, f"{profile_id}.{suffix}")
+
+
+def list_profiles() -> list:
+    """Return the stored profile ids, newest first."""
+    try:
+        names = os.listdir(settings.PROFILE_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        (name[:-5] for name in names if name.endswith(".json")),
+        reverse=True
+    )
+
+
+def save_profile(profile_id: str, profiler: cProfile.Profile, report: dict):
+    """Write a profile and drop the oldest beyond PROFILE_KEEP."""
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    profiler.dump_stats(profile_path(profile_id, "prof"))
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(
+        settings.PROFILE_TOP_FUNCTIONS
+    )
+    report["stats"] = text.getvalue()
+    with open(profile_path(profile_id, "json"), "w") as file:
+        json.dump(report, file)
+    for stale in list_profiles()[settings.PROFILE_KEEP:]:
+        for suffix in ("json", "prof"):
+            try:
+                os.remove(profile_path(stale, suffix))
+            except FileNotFoundError:
+                pass
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling the requests that ask for it."""
+
+    def __init__(self, app):
+        """Wrap app."""
+        self.app = app
+        self.active = False
+
+    async def __call__(self, scope, receive, send):
+        """Run the request, under the profiler when it is wanted."""
+        if scope["type"] != "http" or self.active or not wants_profile(
+            scope
+        ):
+            await self.app(scope, receive, send)
+            return
+        self.active = True
+        profile_id = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        statuses = []
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-profile-id", profile_id.encode())
+                ]
+            await send(message)
+
+        queries = recorded_queries.set([])
+        for name, hook in SQL_HOOKS:
+            event.listen(Engine, name, hook)
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profiler.disable()
+            duration = time.perf_counter() - started
+            for name, hook in SQL_HOOKS:
+                event.remove(Engine, name, hook)
+            report = {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": statuses[0] if statuses else None,
+                "ms": round(duration * 1000, 3),
+                "queries": recorded_queries.get()
+            }
+            recorded_queries.reset(queries)
+            self.active = False
+            await run_in_threadpool(
+                save_profile, profile_id, profiler, report
+            )
+
+
+if __name__ == "__main__":
+    print(profile_token())
@@ -0,0 +1,24 @@
+#!/usr/bin/python3
+"""Profiling schemas."""
+from typing import List, Optional
+from pydantic import BaseModel
+
+
+class ProfiledQuery(BaseModel):
+    """SQL statement issued by a profiled request."""
+
+    statement: str
+    executemany: bool
+    ms: float
+
+
+class ProfileRes(BaseModel):
+    """Profiled request response schema."""
+
+    id: str
+    method: str
+    path: str
+    status: Optional[int]
+    ms: float
+    queries: List[ProfiledQuery]
+    stats: str
@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+"""In-process token bucket rate limiting."""
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+from fastapi import HTTPException, Request, status
+from fastapi.security.utils import get_authorization_scheme_param
+from jose import JWTError, jwt
+from api.v1.settings import settings
+
+
+class TokenBucketLimiter:
+    """Token buckets keyed by client, evicting the least recently used.
+
+    Every key gets ``burst`` tokens refilled at ``rate`` tokens per second.
+    Acquiring a token and evicting an idle bucket are both O(1), and at most
+    ``max_keys`` buckets are kept in memory.
+    """
+
+    def __init__(
+        self, rate: float, burst: int, max_keys: int = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """Initialize an empty limiter."""
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys or settings.RATE_LIMIT_MAX_KEYS
+        self.clock = clock
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def acquire(self, key, cost: float = 1.0) -> float:
+        """Take cost tokens for key.
+
+        Returns 0 when the tokens were granted, otherwise the number of
+        seconds until enough tokens will be available.
+        """
+        now = self.clock()
+        with self.lock:
+            bucket = self.buckets.pop(key, None)
+            if bucket is None:
+                tokens = float(self.burst)
+            else:
+                tokens = min(
+                    float(self.burst),
+                    bucket[0] + (now - bucket[1]) * self.rate
+                )
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost - tokens) / self.rate
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return wait
+
+
+def client_ip(request: Request) -> str:
+    """Key a request by the client address."""
+    return request.client.host if request.client else "unknown"
+
+
+def user_or_ip(request: Request) -> str:
+    """Key a request by the authenticated user id, falling back to the IP."""
+    for authorization in (
+        request.headers.get("Authorization"),
+        request.cookies.get("Authorization")
+    ):
+        scheme, token = get_authorization_scheme_param(authorization)
+        if scheme.lower() != "bearer":
+            continue
+        try:
+            claims = jwt.decode(
+                token, settings.OAUTH2_SECRET_KEY,
+                algorithms=[settings.ALGORITHM]
+            )
+        except JWTError:
+            break
+        if claims.get("uuid_pk"):
+            return f"user:{claims['uuid_pk']}"
+    return f"ip:{client_ip(request)}"
+
+
+class RateLimit:
+    """Route dependency rejecting clients that exhausted their bucket."""
+
+    def __init__(
+        self, rate: float, burst: int,
+        key: Callable[[Request], str] = user_or_ip
+    ):
+        """Initialize the rate limit of a route."""
+        self.limiter = TokenBucketLimiter(rate, burst)
+        self.key = key
+
+    async def __call__(self, request: Request):
+        """Take a token for the client or raise 429 Too Many Requests."""
+        wait = self.limiter.acquire(self.key(request))
+        if wait:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(wait))}
+            )
+
+
+vote_rate_limit = RateLimit(
+    settings.VOTE_RATE_LIMIT, settings.VOTE_RATE_BURST
+)
+login_rate_limit = RateLimit(
+    settings.LOGIN_RATE_LIMIT, settings.LOGIN_RATE_BURST, key=client_ip
+)
@@ -7,10 +7,82 @@ class Settings(BaseSettings):
     """Settings for environment variables."""
 
     OAUTH2_SECRET_KEY: str
-    DB_USER_PASSW: str
-    DB_NAME: str
+    DB_USER_PASSW: str = ""
+    DB_NAME: str = ""
+    DATABASE_URL: str = ""
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_WEEKS: int
+    VOTE_PARTITIONS_AHEAD: int = 3
+    VOTE_PARTITION_RETENTION_MONTHS: int = 0
+    ARCHIVE_CHUNK_SIZE: int = 5000
+    EXPORT_CHUNK_SIZE: int = 2000
+    IMPORT_BATCH_SIZE: int = 10000
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    VOTE_RATE_LIMIT: float = 5.0
+    VOTE_RATE_BURST: int = 20
+    LOGIN_RATE_LIMIT: float = 0.5
+    LOGIN_RATE_BURST: int = 10
+    MEDIA_ROOT: str = "./media"
+    IMAGE_MAX_BYTES: int = 10 * 1024 * 1024
+    THUMBNAIL_SIZE: int = 320
+    THUMBNAIL_WORKERS: int = 2
+    TRENDING_HALF_LIFE_SECONDS: int = 6 * 3600
+    TRENDING_CAPACITY: int = 1000
+    TRENDING_PERSIST_SECONDS: int = 30
+    JOB_LEASE_SECONDS: int = 300
+    JOB_POLL_SECONDS: float = 1.0
+    JOB_BACKOFF_SECONDS: float = 5.0
+    JOB_BACKOFF_MAX_SECONDS: float = 3600.0
+    TALLY_SNAPSHOT_LAG_SECONDS: int = 300
+    TALLY_SNAPSHOT_INTERVAL_SECONDS: int = 600
+    ANOMALY_WINDOW_SECONDS: int = 60
+    ANOMALY_SLOTS: int = 6
+    ANOMALY_SKETCH_WIDTH: int = 512
+    ANOMALY_SKETCH_DEPTH: int = 4
+    ANOMALY_MAX_POLLS: int = 500
+    ANOMALY_MAX_EVENTS: int = 1000
+    ANOMALY_FLAG_THRESHOLD: int = 20
+    ANOMALY_THROTTLE_THRESHOLD: int = 100
+    REACH_PERSIST_SECONDS: int = 10
+    SHARD_DATABASES: str = ""
+    SHARD_VNODES: int = 64
+    SHARD_ID_STRIDE: int = 64
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_KIB: int = 64 * 1024
+    SQLITE_MMAP_BYTES: int = 256 * 1024 * 1024
+    CHANGE_FEED_PAGE_SIZE: int = 1000
+    CHANGE_COMPACT_INTERVAL_SECONDS: int = 3600
+    POLL_DOCUMENT_REFRESH_SECONDS: float = 2.0
+    POLL_DOCUMENT_BATCH_SIZE: int = 1000
+    CACHE_CAPACITY: int = 10000
+    CACHE_LOCAL_TTL_SECONDS: float = 5.0
+    CACHE_SHARED_TTL_SECONDS: float = 300.0
+    CACHE_REDIS_URL: str = ""
+    CACHE_WARMUP_POLLS: int = 500
+    PURGE_CHUNK_SIZE: int = 1000
+    PURGE_PAUSE_SECONDS: float = 0.05
+    PURGE_BUDGET_SECONDS: float = 60.0
+    PURGE_INTERVAL_SECONDS: int = 3600
+    PROFILE_SECRET_KEY: str = ""
+    PROFILE_TOKEN_SECONDS: int = 600
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_DIR: str = "./profiles"
+    PROFILE_KEEP: int = 100
+    PROFILE_MAX_QUERIES: int = 1000
+    PROFILE_TOP_FUNCTIONS: int = 40
+    SLOW_QUERY_MS: float = 200.0
+    SLOW_QUERY_KEEP: int = 200
+    SLOW_QUERY_EXPLAIN_RATE: float = 0.2
+    SLOW_QUERY_EXPLAIN_BURST: int = 5
+    CONCURRENCY_INITIAL_LIMIT: int = 20
+    CONCURRENCY_MIN_LIMIT: int = 4
+    CONCURRENCY_MAX_LIMIT: int = 200
+    CONCURRENCY_TOLERANCE: float = 1.5
+    ROLLUP_MINUTE_RETENTION_SECONDS: int = 2 * 3600
+    ROLLUP_HOUR_RETENTION_SECONDS: int = 7 * 86400
+    ROLLUP_COMPACT_CHUNK_SIZE: int = 5000
+    ROLLUP_COMPACT_INTERVAL_SECONDS: int = 600
+    SNAPSHOT_DIR: str = "./snapshots"
 
     class Config:
         """Configuration for environment variables."""
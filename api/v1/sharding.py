@@ -0,0 +1,394 @@
+#!/usr/bin/python3
+"""Hash sharding of poll data across several databases.
+
+Users, moderators, bans, jobs and the statistics tables stay on the global
+database configured by DB_NAME. A poll and everything that hangs off it
+(choices, votes, results, archived votes, vote events, tally snapshots,
+change feed entries and poll documents) live on the shard that owns the
+poll id on a consistent hash ring, so adding a shard moves only about 1/N
+of the polls.
+
+Poll ids are drawn from the global ``poll_ids`` sequence because the shard
+is only known once the id is. Choice, vote and event ids come from each
+shard's own sequences, interleaved so that shard ``i`` only hands out ids
+congruent to ``i + 1`` modulo SHARD_ID_STRIDE; ids stay globally unique and
+double as a hint of the shard a row was created on. Foreign keys to global
+tables are dropped on the shards, so deleting a user does not cascade to
+their polls or votes.
+
+With SHARD_DATABASES unset the global database is the only shard and every
+helper falls back to the request's own session.
+
+Run ``python -m api.v1.sharding rebalance`` after changing SHARD_DATABASES
+to move polls to the shards that now own them.
+"""
+import argparse
+import bisect
+import hashlib
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from fastapi import Depends
+from sqlalchemy import (
+    MetaData, Sequence, create_engine, delete, event, func, insert,
+    select, text
+)
+from sqlalchemy.dialects.postgresql import ENUM
+from sqlalchemy.orm import Session, sessionmaker
+from api.v1.database_config import PASSW, engine, get_db
+from api.v1.models import (
+    Base, Change, Choice, Poll, Vote, changes_xact_default,
+    choices_search_triggers, polls_search_trigger, trigram_extension
+)
+from api.v1.votes.partitions import ensure_partitions
+from .settings import settings
+
+SHARD_TABLES = (
+    "polls", "choices", "votes", "ballots", "poll_results",
+    "votes_archive", "vote_events", "vote_rollups", "tally_snapshots",
+    "changes", "poll_documents"
+)
+INTERLEAVED = ("choices", "votes", "vote_events")
+
+poll_ids = Sequence("poll_ids")
+
+
+class HashRing:
+    """Consistent hash ring mapping keys onto shard indexes."""
+
+    def __init__(self, shards, vnodes: int = 64):
+        """Place vnodes points of every shard on the ring."""
+        self.points = []
+        self.owners = []
+        for shard in shards:
+            for vnode in range(vnodes):
+                point = self.hash(f"shard-{shard}-{vnode}")
+                index = bisect.bisect(self.points, point)
+                self.points.insert(index, point)
+                self.owners.insert(index, shard)
+
+    @staticmethod
+    def hash(key: str) -> int:
+        """Return the ring position of a key."""
+        digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big")
+
+    def shard_for(self, key) -> int:
+        """Return the shard owning key."""
+        index = bisect.bisect(self.points, self.hash(str(key)))
+        return self.owners[index % len(self.owners)]
+
+
+def shard_url(database: str) -> str:
+    """Return the URL of a shard given as a database name or a URL."""
+    if "://" in database:
+        return database
+    return f"postgresql://{PASSW}@localhost/{database}"
+
+
+def shard_metadata() -> MetaData:
+    """Return the shard tables with foreign keys to global tables removed."""
+    metadata = MetaData()
+    event.listen(metadata, "before_create", trigram_extension)
+    for name in SHARD_TABLES:
+        table = Base.metadata.tables[name].to_metadata(metadata)
+        for constraint in list(table.foreign_key_constraints):
+            if constraint.elements[0].target_fullname.split(".")[0] in (
+                SHARD_TABLES
+            ):
+                continue
+            table.constraints.discard(constraint)
+            for element in constraint.elements:
+                table.foreign_keys.discard(element)
+                element.parent.foreign_keys.discard(element)
+    event.listen(
+        metadata.tables["polls"], "after_create", polls_search_trigger
+    )
+    event.listen(
+        metadata.tables["choices"], "after_create", choices_search_triggers
+    )
+    event.listen(
+        metadata.tables["changes"], "after_create", changes_xact_default
+    )
+    return metadata
+
+
+shard_names = [
+    name.strip() for name in settings.SHARD_DATABASES.split(",")
+    if name.strip()
+]
+sharded = bool(shard_names)
+shard_engines = [
+    create_engine(shard_url(name)) for name in shard_names
+] or [engine]
+shard_sessions = [
+    sessionmaker(autoflush=False, autocommit=False, bind=shard_engine)
+    for shard_engine in shard_engines
+]
+ring = HashRing(range(len(shard_engines)), settings.SHARD_VNODES)
+
+
+def shard_of(poll_id: int) -> int:
+    """Return the index of the shard owning a poll."""
+    return ring.shard_for(poll_id)
+
+
+def shard_session(poll_id: int) -> Session:
+    """Open a session on the shard owning a poll."""
+    return shard_sessions[shard_of(poll_id)]()
+
+
+def each_shard():
+    """Yield a session on every shard in turn."""
+    for make_session in shard_sessions:
+        session = make_session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+
+def get_all_dbs(db: Session = Depends(get_db)):
+    """Get a session on every shard for a cross-shard read."""
+    if not sharded:
+        yield [db]
+        return
+    sessions = [make_session() for make_session in shard_sessions]
+    try:
+        yield sessions
+    finally:
+        for session in sessions:
+            session.close()
+
+
+def allocate_poll_id() -> int:
+    """Return a new global poll id, or None to let the database assign it."""
+    if not sharded:
+        return None
+    with engine.connect() as connection:
+        return connection.scalar(poll_ids.next_value())
+
+
+def find_shard(model, id_: int) -> int:
+    """Return the index of the shard holding a choice or vote id."""
+    hint = (id_ - 1) % settings.SHARD_ID_STRIDE
+    for index in sorted(range(len(shard_sessions)), key=lambda i: i != hint):
+        session = shard_sessions[index]()
+        try:
+            if session.query(model.id).filter(model.id == id_).first():
+                return index
+        finally:
+            session.close()
+    return None
+
+
+@contextmanager
+def routed_session(model, id_: int, db: Session = None):
+    """Provide the session of the shard holding a poll, choice or vote.
+
+    db is reused when there is only one shard. Unknown choice and vote ids
+    are routed to the first shard, where they are simply not found.
+    """
+    if not sharded and db is not None:
+        yield db
+        return
+    if model is Poll:
+        index = shard_of(id_)
+    else:
+        index = find_shard(model, id_) or 0
+    session = shard_sessions[index]()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def routed_by(model):
+    """Return a dependency opening the shard holding the row id_."""
+    def get_shard_db(id_: int, db: Session = Depends(get_db)):
+        """Get the session of the shard holding id_."""
+        with routed_session(model, id_, db) as session:
+            yield session
+    return get_shard_db
+
+
+get_poll_db = routed_by(Poll)
+get_choice_db = routed_by(Choice)
+get_vote_db = routed_by(Vote)
+
+
+def interleave(bind, index: int):
+    """Make a shard's serial ids congruent to index + 1 modulo the stride."""
+    stride = settings.SHARD_ID_STRIDE
+    with bind.begin() as connection:
+        for table in INTERLEAVED:
+            sequence = connection.scalar(
+                text("SELECT pg_get_serial_sequence(:table, 'id')"),
+                {"table": table}
+            )
+            step = connection.scalar(
+                text(
+                    "SELECT seqincrement FROM pg_sequence "
+                    "WHERE seqrelid = to_regclass(:sequence)"
+                ),
+                {"sequence": sequence}
+            )
+            if step == stride:
+                continue
+            last = connection.scalar(text(
+                f"SELECT greatest(last_value, (SELECT coalesce(max(id), 0) "
+                f"FROM {table})) FROM {sequence}"
+            ))
+            start = last + 1 + (index - last) % stride
+            connection.execute(text(
+                f"ALTER SEQUENCE {sequence} "
+                f"INCREMENT BY {stride} RESTART WITH {start}"
+            ))
+
+
+def create_shard_schema(bind, index: int, metadata: MetaData = None):
+    """Create the shard tables, vote partitions and interleaved sequences."""
+    metadata = metadata or shard_metadata()
+    if bind.dialect.name == "postgresql":
+        ENUM(
+            *Poll.__table__.c.poll_type.type.enums, name="poll_type_enum"
+        ).create(bind=bind, checkfirst=True)
+    metadata.create_all(bind=bind)
+    ensure_partitions(bind)
+    if bind.dialect.name == "postgresql":
+        interleave(bind, index)
+
+
+def create_shards():
+    """Create the shard schemas and advance the global poll id sequence."""
+    if not sharded:
+        return
+    metadata = shard_metadata()
+    highest = 0
+    for index, shard_engine in enumerate(shard_engines):
+        create_shard_schema(shard_engine, index, metadata)
+        with shard_engine.connect() as connection:
+            highest = max(
+                highest,
+                connection.scalar(select(func.max(Poll.id))) or 0
+            )
+    with engine.begin() as connection:
+        poll_ids.create(bind=connection, checkfirst=True)
+        connection.execute(
+            text(
+                "SELECT setval('poll_ids', greatest(:highest, "
+                "(SELECT last_value FROM poll_ids)))"
+            ),
+            {"highest": highest}
+        )
+
+
+def poll_filter(table, poll_id: int):
+    """Return the condition selecting the rows of a shard table for a poll."""
+    if table.name == "polls":
+        return table.c.id == poll_id
+    if table.name == "votes":
+        return table.c.choice_id.in_(
+            select(Choice.id).where(Choice.poll_id == poll_id)
+        )
+    return table.c.poll_id == poll_id
+
+
+def move_poll(source: Session, target: Session, poll_id: int) -> int:
+    """Copy a poll's rows to another shard, then delete the originals.
+
+    Rows left on the target by an interrupted move are replaced, so moving
+    again is safe. Writes to the poll during the move are not carried
+    over; run it while the poll is idle. Change feed entries are not
+    copied since seqs are per shard; the poll and its choices are recorded
+    as changed on the target instead. Returns the number of rows moved.
+    """
+    tables = [Base.metadata.tables[name] for name in SHARD_TABLES]
+    if not source.query(Poll.id).filter(
+        Poll.id == poll_id
+    ).with_for_update().first():
+        source.rollback()
+        return 0
+    for table in reversed(tables):
+        target.execute(delete(table).where(poll_filter(table, poll_id)))
+    moved = 0
+    for table in tables:
+        if table.name == "changes":
+            continue
+        result = source.execute(
+            select(table).where(poll_filter(table, poll_id)).execution_options(
+                yield_per=settings.ARCHIVE_CHUNK_SIZE
+            )
+        )
+        for rows in result.partitions():
+            target.execute(insert(table), [dict(row._mapping) for row in rows])
+            moved += len(rows)
+    changed_at = datetime.now(timezone.utc)
+    target.execute(insert(Change), [
+        {
+            "entity": entity, "entity_id": entity_id, "poll_id": poll_id,
+            "op": "upsert", "changed_at": changed_at
+        }
+        for entity, entity_id in [("poll", poll_id)] + [
+            ("choice", choice_id) for choice_id in target.execute(
+                select(Choice.id).where(Choice.poll_id == poll_id)
+            ).scalars()
+        ]
+    ])
+    target.commit()
+    for table in reversed(tables):
+        source.execute(delete(table).where(poll_filter(table, poll_id)))
+    source.commit()
+    return moved
+
+
+def rebalance(dry_run: bool = False) -> dict:
+    """Move every poll to the shard that owns it on the current ring.
+
+    Returns the number of polls moved per (source, target) shard pair.
+    """
+    moves = {}
+    for index, make_session in enumerate(shard_sessions):
+        source = make_session()
+        try:
+            misplaced = [
+                poll_id for poll_id in source.execute(
+                    select(Poll.id)
+                ).scalars() if shard_of(poll_id) != index
+            ]
+            for poll_id in misplaced:
+                owner = shard_of(poll_id)
+                moves[index, owner] = moves.get((index, owner), 0) + 1
+                if dry_run:
+                    continue
+                target = shard_sessions[owner]()
+                try:
+                    move_poll(source, target, poll_id)
+                finally:
+                    target.close()
+        finally:
+            source.close()
+    return moves
+
+
+def main():
+    """Manage the shards from the command line."""
+    parser = argparse.ArgumentParser(description="Manage poll shards.")
+    parser.add_argument("command", choices=("create", "rebalance"))
+    parser.add_argument(
+        "--dry-run", action="store_true",
+        help="report the polls that would move without moving them"
+    )
+    args = parser.parse_args()
+    if args.command == "create":
+        create_shards()
+        print(f"{len(shard_engines)} shards ready")
+        return
+    for (source, target), count in sorted(
+        rebalance(args.dry_run).items()
+    ):
+        verb = "would move" if args.dry_run else "moved"
+        print(f"shard {source} -> {target}: {verb} {count} polls")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+#!/usr/bin/python3
+"""Slow query schemas."""
+from typing import Any, Optional
+from pydantic import BaseModel
+
+
+class QueryRoute(BaseModel):
+    """Request that issued a slow statement."""
+
+    method: str
+    path: str
+    endpoint: Optional[str]
+
+
+class SlowQueryRes(BaseModel):
+    """Slow statement response schema."""
+
+    at: str
+    ms: float
+    statement: str
+    parameters: Any
+    route: Optional[QueryRoute]
+    plan: Optional[str]
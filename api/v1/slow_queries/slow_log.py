@@ -0,0 +1,196 @@
+#!/usr/bin/python3
+"""Slow query log with EXPLAIN plans.
+
+Every statement run through a watched engine is timed. Statements slower
+than SLOW_QUERY_MS are logged as one JSON line and kept, newest
+SLOW_QUERY_KEEP first, with the route that issued them and the shape of
+their parameters; the values themselves are never stored. The plan of a
+slow SELECT is captured on a background thread with
+EXPLAIN (ANALYZE, BUFFERS) on PostgreSQL and EXPLAIN QUERY PLAN on
+SQLite, at most SLOW_QUERY_EXPLAIN_RATE times a second. ANALYZE runs the
+statement again, so SELECTs that lock rows or advance a sequence only get
+the estimated plan of a plain EXPLAIN.
+"""
+import logging
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from datetime import datetime, timezone
+import orjson
+from sqlalchemy import event
+from api.v1.rate_limit import TokenBucketLimiter
+from api.v1.settings import settings
+
+logger = logging.getLogger(__name__)
+current_scope = ContextVar("current_scope", default=None)
+EXPLAIN_PREFIXES = {
+    "postgresql": "EXPLAIN (ANALYZE, BUFFERS) ",
+    "sqlite": "EXPLAIN QUERY PLAN ",
+}
+ESTIMATE_PREFIXES = {
+    "postgresql": "EXPLAIN ",
+    "sqlite": "EXPLAIN QUERY PLAN ",
+}
+SIDE_EFFECTS = re.compile(
+    r"\bFOR\s+(NO\s+KEY\s+UPDATE|UPDATE|KEY\s+SHARE|SHARE)\b"
+    r"|\b(nextval|setval)\s*\(",
+    re.IGNORECASE
+)
+
+
+def explain_prefix(dialect: str, statement: str) -> str:
+    """Return the EXPLAIN prefix for a statement, or None to skip it."""
+    if statement.lstrip()[:6].upper() != "SELECT":
+        return None
+    if SIDE_EFFECTS.search(statement):
+        return ESTIMATE_PREFIXES.get(dialect)
+    return EXPLAIN_PREFIXES.get(dialect)
+
+
+def parameters_shape(parameters, executemany: bool):
+    """Describe parameters by their names and types, without values."""
+    if executemany:
+        return {
+            "rows": len(parameters),
+            "row": parameters_shape(parameters[0], False)
+            if parameters else None
+        }
+    if isinstance(parameters, dict):
+        return {
+            name: type(value).__name__ for name, value in parameters.items()
+        }
+    return [type(value).__name__ for value in parameters or ()]
+
+
+def route_of(scope: dict) -> dict:
+    """Return the method, path and endpoint of a request scope."""
+    if scope is None:
+        return None
+    endpoint = scope.get("endpoint")
+    return {
+        "method": scope["method"],
+        "path": scope["path"],
+        "endpoint": getattr(endpoint, "__name__", None)
+    }
+
+
+class RouteMiddleware:
+    """ASGI middleware making the current request known to the log."""
+
+    def __init__(self, app):
+        """Wrap app."""
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        """Run the request with its scope in the context."""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_scope.reset(token)
+
+
+class SlowQueryLog:
+    """Recent slow statements of the watched engines."""
+
+    def __init__(
+        self, threshold_ms: float, keep: int, explain_rate: float,
+        explain_burst: int
+    ):
+        """Initialize an empty log."""
+        self.threshold = threshold_ms / 1000
+        self.records = deque(maxlen=keep)
+        self.limiter = TokenBucketLimiter(explain_rate, explain_burst)
+        self.pool = None
+        self.watched = set()
+
+    def watch(self, engine):
+        """Time the statements of engine."""
+        if engine in self.watched:
+            return
+        self.watched.add(engine)
+        event.listen(engine, "before_cursor_execute", self.before_execute)
+        event.listen(engine, "after_cursor_execute", self.after_execute)
+
+    def before_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        """Note when a statement starts."""
+        conn.info.setdefault("slow_query_started", []).append(
+            time.perf_counter()
+        )
+
+    def after_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        """Record the statement if it was slow."""
+        started = conn.info.get("slow_query_started")
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        if elapsed < self.threshold or context.execution_options.get(
+            "slow_query_explain"
+        ):
+            return
+        record = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "ms": round(elapsed * 1000, 3),
+            "statement": statement,
+            "parameters": parameters_shape(parameters, executemany),
+            "route": route_of(current_scope.get()),
+            "plan": None
+        }
+        self.records.appendleft(record)
+        prefix = explain_prefix(conn.dialect.name, statement)
+        if (
+            prefix and not executemany
+            and not self.limiter.acquire("explain")
+        ):
+            self.executor().submit(
+                self.explain, conn.engine, prefix, record, parameters
+            )
+        else:
+            logger.warning("slow query %s", orjson.dumps(record).decode())
+
+    def explain(self, engine, prefix: str, record: dict, parameters):
+        """Capture the plan of a slow statement and log it."""
+        try:
+            with engine.connect() as connection:
+                rows = connection.exec_driver_sql(
+                    prefix + record["statement"], parameters,
+                    execution_options={"slow_query_explain": True}
+                ).all()
+                connection.rollback()
+            record["plan"] = "\n".join(str(row[-1]) for row in rows)
+        except Exception as error:
+            record["plan"] = f"EXPLAIN failed: {error}"
+        logger.warning("slow query %s", orjson.dumps(record).decode())
+
+    def executor(self) -> ThreadPoolExecutor:
+        """Return the thread that runs EXPLAINs."""
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="explain"
+            )
+        return self.pool
+
+    def shutdown(self):
+        """Stop the EXPLAIN thread, dropping queued plans."""
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def recent(self, limit: int) -> list:
+        """Return up to limit slow statements, newest first."""
+        return list(self.records)[:limit]
+
+
+slow_queries = SlowQueryLog(
+    settings.SLOW_QUERY_MS, settings.SLOW_QUERY_KEEP,
+    settings.SLOW_QUERY_EXPLAIN_RATE, settings.SLOW_QUERY_EXPLAIN_BURST
+)
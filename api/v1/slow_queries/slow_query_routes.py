@@ -0,0 +1,32 @@
+#!/usr/bin/python3
+"""Slow query routes."""
+from typing import List
+from fastapi import APIRouter, HTTPException, Query, status, Depends
+from sqlalchemy.orm import Session
+from api.v1.database_config import get_db
+from api.v1.models import Moderator
+from api.v1.users.oauth import get_current_user
+from .schemas import SlowQueryRes
+from .slow_log import slow_queries
+
+slow_query_router = APIRouter(prefix="/slow-queries", tags=["slow queries"])
+
+
+@slow_query_router.get("/", response_model=List[SlowQueryRes])
+async def get_slow_queries(
+    limit: int = Query(50, ge=1, le=1000),
+    session: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """Retrieve the recent slow statements with their plans, newest first."""
+    moderator = session.query(
+        Moderator
+    ).filter(Moderator.mod_user == current_user.uuid_pk).first()
+
+    if not moderator:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="access denied"
+        )
+
+    return slow_queries.recent(limit)
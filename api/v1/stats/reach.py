@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+"""Distinct voter counts per poll and per poll owner.
+
+Votes update in-memory sketches that only hold the voters seen since the
+last flush; they keep the voters' hashes while few, and HyperLogLog
+registers past SPARSE_LIMIT. Flushing merges them into the persisted
+sketches under a row lock; since merging takes the register-wise maximum,
+any number of API workers can flush into the same rows.
+
+Run as ``python -m api.v1.stats.reach`` to backfill the sketches from
+the votes, archived votes and ballots.
+"""
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from api.v1.database_config import session_local
+from api.v1.dialects import upsert
+from api.v1.models import (
+    ArchivedVote, Ballot, Choice, HllSketch, Poll, Vote
+)
+from api.v1.sharding import each_shard
+from api.v1.settings import settings
+from .hyperloglog import HyperLogLog, SparseSketch
+
+logger = logging.getLogger(__name__)
+
+
+def poll_key(poll_id: int) -> str:
+    """Return the sketch key of a poll's voters."""
+    return f"poll:{poll_id}"
+
+
+def owner_key(owner_id) -> str:
+    """Return the sketch key of the voters across an owner's polls."""
+    return f"owner:{owner_id}"
+
+
+class ReachCounter:
+    """Unflushed per-key sketches of the voters seen by this worker."""
+
+    def __init__(self):
+        """Initialize an empty counter."""
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def add(self, poll_id: int, owner_id, voter):
+        """Count a voter for a poll and its owner."""
+        with self.lock:
+            for key in (poll_key(poll_id), owner_key(owner_id)):
+                self.pending.setdefault(key, SparseSketch()).add(voter)
+
+    def flush(self, session: Session) -> int:
+        """Merge the pending sketches into the persisted ones."""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return 0
+        try:
+            merge_sketches(session, pending)
+        except Exception:
+            with self.lock:
+                for key, sketch in pending.items():
+                    self.pending.setdefault(key, SparseSketch()).merge(sketch)
+            raise
+        return len(pending)
+
+    def flush_once(self):
+        """Flush in a session of its own."""
+        session = session_local()
+        try:
+            self.flush(session)
+        finally:
+            session.close()
+
+    async def run(self):
+        """Flush every REACH_PERSIST_SECONDS."""
+        while True:
+            await asyncio.sleep(settings.REACH_PERSIST_SECONDS)
+            try:
+                await run_in_threadpool(self.flush_once)
+            except Exception:
+                logger.exception("reach sketches could not be persisted")
+
+
+def merge_sketches(session: Session, sketches: dict):
+    """Merge sketches into hll_sketches in one transaction."""
+    keys = sorted(sketches)
+    session.execute(upsert(session, HllSketch).values([
+        {"key": key, "registers": HyperLogLog().dumps()} for key in keys
+    ]).on_conflict_do_nothing(index_elements=[HllSketch.key]))
+    now = datetime.now(timezone.utc)
+    for stored in session.query(HllSketch).filter(
+        HllSketch.key.in_(keys)
+    ).order_by(HllSketch.key).with_for_update():
+        sketch = HyperLogLog.loads(stored.registers)
+        sketches[stored.key].merge_into(sketch)
+        stored.registers = sketch.dumps()
+        stored.updated_at = now
+    session.commit()
+
+
+def load_sketch(session: Session, key: str) -> HyperLogLog:
+    """Return the persisted sketch of key merged with this worker's."""
+    registers = session.execute(
+        select(HllSketch.registers).where(HllSketch.key == key)
+    ).scalar()
+    sketch = HyperLogLog.loads(registers) if registers else HyperLogLog()
+    with reach.lock:
+        pending = reach.pending.get(key)
+        if pending:
+            pending.merge_into(sketch)
+    return sketch
+
+
+def backfill(session: Session) -> int:
+    """Rebuild every sketch from the votes and ballots of every shard."""
+    counter = ReachCounter()
+    for shard in each_shard():
+        for query in (
+            select(Choice.poll_id, Poll.created_by, Vote.user).join(
+                Choice, Choice.id == Vote.choice_id
+            ).join(Poll, Poll.id == Choice.poll_id),
+            select(
+                ArchivedVote.poll_id, Poll.created_by, ArchivedVote.user
+            ).join(Poll, Poll.id == ArchivedVote.poll_id),
+            select(Ballot.poll_id, Poll.created_by, Ballot.user).join(
+                Poll, Poll.id == Ballot.poll_id
+            )
+        ):
+            result = shard.execute(query.execution_options(
+                yield_per=settings.EXPORT_CHUNK_SIZE
+            ))
+            for poll_id, owner_id, voter in result:
+                counter.add(poll_id, owner_id, voter)
+            result.close()
+    return counter.flush(session)
+
+
+reach = ReachCounter()
+
+
+if __name__ == "__main__":
+    backfill_session = session_local()
+    try:
+        print(f"backfilled {backfill(backfill_session)} sketches")
+    finally:
+        backfill_session.close()
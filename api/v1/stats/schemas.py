@@ -0,0 +1,13 @@
+#!/usr/bin/python3
+"""Statistics schemas."""
+from pydantic import BaseModel
+
+
+class ReachRes(BaseModel):
+    """Approximate distinct voter count response schema."""
+
+    key: str
+    unique_voters: int
+    standard_error: float
+    low: int
+    high: int
@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+"""Statistics routes."""
+from fastapi import APIRouter, HTTPException, status, Depends
+from sqlalchemy.orm import Session
+from api.v1.database_config import get_db
+from api.v1.models import Poll
+from api.v1.sharding import routed_session
+from api.v1.users.oauth import get_current_user
+from .reach import load_sketch, owner_key, poll_key
+from .schemas import ReachRes
+
+stats_router = APIRouter(prefix="/stats", tags=["stats"])
+
+
+def reach_res(session: Session, key: str) -> dict:
+    """Return the estimate of a key with its two standard error bounds."""
+    sketch = load_sketch(session, key)
+    estimate = sketch.count()
+    margin = 2 * sketch.standard_error * estimate
+    return {
+        "key": key,
+        "unique_voters": estimate,
+        "standard_error": sketch.standard_error,
+        "low": max(0, round(estimate - margin)),
+        "high": round(estimate + margin)
+    }
+
+
+@stats_router.get("/polls/{poll_id}", response_model=ReachRes)
+async def retrieve_poll_reach(
+    poll_id: int, session: Session = Depends(get_db)
+):
+    """Retrieve the approximate number of distinct voters of a poll."""
+    with routed_session(Poll, poll_id, session) as shard:
+        found = shard.query(Poll.id).filter(Poll.id == poll_id).first()
+    if not found:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Poll not found"
+        )
+    return reach_res(session, poll_key(poll_id))
+
+
+@stats_router.get("/owners/{user_id}", response_model=ReachRes)
+async def retrieve_owner_reach(
+    user_id: str, session: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """Retrieve the approximate number of distinct voters of an owner."""
+    if str(current_user.uuid_pk) != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to view this owner's reach"
+        )
+    return reach_res(session, owner_key(user_id))
@@ -8,6 +8,7 @@ from api.v1.app import app
 from api.v1.users.oauth import create_token
 from api.v1.models import Base, Poll
 from api.v1.database_config import get_db
+from api.v1.rate_limit import login_rate_limit, vote_rate_limit
 from api.v1.settings import settings
 
 PASSW = settings.DB_USER_PASSW
@@ -43,6 +44,8 @@ def client(session):
         finally:
             session.close()
     app.dependency_overrides[get_db] = get_test_db
+    app.dependency_overrides[login_rate_limit] = lambda: None
+    app.dependency_overrides[vote_rate_limit] = lambda: None
     yield TestClient(app)
 
 
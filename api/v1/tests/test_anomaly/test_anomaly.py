@@ -0,0 +1,27 @@
+#!/usr/bin/python3
+"""Test cases for the vote burst sketches."""
+from api.v1.bans.anomaly import CountMinSketch, SlidingWindowSketch
+
+
+def test_count_min_never_underestimates():
+    """Test estimates are at least the true counts."""
+    sketch = CountMinSketch(width=64, depth=4)
+    for number in range(500):
+        sketch.add(f"key{number % 50}")
+    assert all(sketch.estimate(f"key{number}") >= 10 for number in range(50))
+
+
+def test_count_min_add_returns_estimate():
+    """Test add returns the running estimate of a key."""
+    sketch = CountMinSketch(width=1024, depth=4)
+    assert [sketch.add("user:a|1") for _ in range(3)] == [1, 2, 3]
+    assert sketch.estimate("user:b|1") == 0
+
+
+def test_sliding_window_forgets_old_slots():
+    """Test counts older than the window are dropped."""
+    sketch = SlidingWindowSketch(window=60, slots=6, width=256, depth=4)
+    for second in range(0, 30):
+        sketch.add("ip:1.2.3.4|7", second)
+    assert sketch.add("ip:1.2.3.4|7", 59) == 31
+    assert sketch.add("ip:1.2.3.4|7", 125) == 1
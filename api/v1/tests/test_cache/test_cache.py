@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+"""Test cases for the read-through cache."""
+import asyncio
+import threading
+from api.v1.cache.read_through import ReadThroughCache
+
+
+class Clock:
+    """Manually advanced clock."""
+
+    def __init__(self):
+        """Start at zero."""
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        """Return the current time."""
+        return self.now
+
+
+def test_concurrent_misses_share_one_load():
+    """Test simultaneous misses for a key run a single load."""
+    cache = ReadThroughCache(10, 60)
+    release = threading.Event()
+    loads = []
+
+    def load():
+        """Count the load and block until released."""
+        loads.append(1)
+        release.wait(5)
+        return b"poll"
+
+    async def main():
+        """Issue concurrent reads, then let the load finish."""
+        requests = [
+            asyncio.create_task(cache.get("poll:1", load)) for _ in range(20)
+        ]
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(*requests)
+
+    assert asyncio.run(main()) == [b"poll"] * 20
+    assert len(loads) == 1
+    assert cache.metrics()["coalesced"] == 19
+    assert asyncio.run(cache.get("poll:1", load)) == b"poll"
+    assert cache.metrics()["local_hits"] == 1
+
+
+def test_entries_expire_and_are_evicted():
+    """Test the TTL and the LRU capacity bound the local tier."""
+    clock = Clock()
+    cache = ReadThroughCache(2, 10, clock=clock)
+    cache.put("a", b"1")
+    cache.put("b", b"2")
+    assert cache.get_local("a") == b"1"
+    cache.put("c", b"3")
+    assert cache.get_local("b") is None
+    clock.now = 11
+    assert cache.get_local("a") is None
+    assert cache.metrics()["evictions"] == 1
+
+
+def test_invalidation_during_a_load_is_not_cached():
+    """Test a value loaded across an invalidation is not stored."""
+    cache = ReadThroughCache(10, 60)
+
+    def load():
+        """Load while a writer invalidates the key."""
+        cache.invalidate("poll:1")
+        return b"stale"
+
+    assert asyncio.run(cache.get("poll:1", load)) == b"stale"
+    assert cache.get_local("poll:1") is None
+
+
+def test_missing_entities_are_not_cached():
+    """Test a load returning None is retried on the next read."""
+    cache = ReadThroughCache(10, 60)
+    assert asyncio.run(cache.get("poll:1", lambda: None)) is None
+    assert asyncio.run(cache.get("poll:1", lambda: b"poll")) == b"poll"
@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+"""Test cases for the poll and choice change feed."""
+import pytest
+from sqlalchemy.orm import Session
+from api.v1.changes.feed import (
+    compact_shard, read_changes, record_change, record_poll_deleted
+)
+from api.v1.database_config import make_engine
+from api.v1.models import Change, Choice, Poll, User, new_uuid
+
+
+@pytest.fixture
+def session(tmp_path):
+    """Provide a session on a fresh SQLite database with one user."""
+    engine = make_engine(f"sqlite:///{tmp_path / 'changes.db'}")
+    for model in (User, Poll, Choice, Change):
+        model.__table__.create(bind=engine)
+    with Session(engine) as session:
+        session.add(User(
+            uuid_pk=new_uuid(), username="owner", email="owner@example.com",
+            password="secret"
+        ))
+        session.commit()
+        yield session
+
+
+def add_poll(session: Session, title: str) -> Poll:
+    """Create a poll with one choice, recording both changes."""
+    owner = session.query(User).one().uuid_pk
+    poll = Poll(title=title, poll_type="text", created_by=owner)
+    session.add(poll)
+    session.flush()
+    record_change(session, "poll", poll.id)
+    choice = Choice(poll_id=poll.id, txt="yes", created_by=owner)
+    session.add(choice)
+    session.flush()
+    record_change(session, "choice", choice.id, poll.id)
+    session.commit()
+    return poll
+
+
+def test_entities_are_returned_once_in_their_current_state(session):
+    """Test repeated changes collapse to the entity's latest state."""
+    poll = add_poll(session, "Lunch")
+    poll.title = "Dinner"
+    record_change(session, "poll", poll.id)
+    session.commit()
+    page = read_changes(session, (0, 0), 100)
+    assert [changed.title for changed in page["polls"]] == ["Dinner"]
+    assert len(page["choices"]) == 1
+    assert page["deleted"] == []
+    assert page["cursor"] == (0, 3)
+    assert not page["more"]
+    assert read_changes(session, page["cursor"], 100)["polls"] == []
+
+
+def test_deleted_polls_leave_tombstones(session):
+    """Test a deleted poll and its choices come back as tombstones."""
+    poll = add_poll(session, "Lunch")
+    cursor = read_changes(session, (0, 0), 100)["cursor"]
+    poll_id, choice_id = poll.id, poll.choices[0].id
+    record_poll_deleted(session, poll_id)
+    session.query(Choice).filter(Choice.poll_id == poll_id).delete()
+    session.query(Poll).filter(Poll.id == poll_id).delete()
+    session.commit()
+    page = read_changes(session, cursor, 100)
+    assert page["polls"] == [] and page["choices"] == []
+    assert page["deleted"] == [
+        {"entity": "choice", "id": choice_id},
+        {"entity": "poll", "id": poll_id}
+    ]
+
+
+def test_positions_follow_the_writing_transaction(session):
+    """Test changes are read and compacted in transaction, then seq order."""
+    poll = add_poll(session, "Lunch")
+    record_change(session, "poll", poll.id)
+    session.commit()
+    session.query(Change).filter(Change.seq == 3).update({"xact": 1})
+    session.query(Change).filter(Change.seq == 1).update({"xact": 2})
+    session.commit()
+    first = read_changes(session, (0, 0), 1)
+    assert first["cursor"] == (0, 2) and first["more"]
+    second = read_changes(session, first["cursor"], 1)
+    assert second["cursor"] == (1, 3) and second["more"]
+    third = read_changes(session, second["cursor"], 1)
+    assert third["cursor"] == (2, 1) and not third["more"]
+    assert compact_shard(session) == 1
+    assert session.query(Change.seq).filter(
+        Change.entity == "poll"
+    ).scalar() == 1
+
+
+def test_pages_and_compaction(session):
+    """Test paging reports more changes and compaction keeps the latest."""
+    poll = add_poll(session, "Lunch")
+    for _ in range(3):
+        record_change(session, "poll", poll.id)
+    session.commit()
+    first = read_changes(session, (0, 0), 2)
+    assert first["cursor"] == (0, 2) and first["more"]
+    assert compact_shard(session) == 3
+    second = read_changes(session, first["cursor"], 2)
+    assert [changed.id for changed in second["polls"]] == [poll.id]
+    assert second["cursor"] == (0, 5) and not second["more"]
@@ -0,0 +1,130 @@
+#!/usr/bin/python3
+"""Test cases for the columnar poll snapshots."""
+from datetime import datetime, timezone
+import numpy as np
+import pytest
+from sqlalchemy.orm import Session, sessionmaker
+from api.v1.analytics import columnar
+from api.v1.database_config import make_engine
+from api.v1.models import (
+    PARTITIONED, ArchivedVote, Ballot, Choice, Poll, User, Vote, new_uuid
+)
+from api.v1.votes.tally import pack
+
+
+def moment(month: int, day: int = 1) -> datetime:
+    """Return a UTC time in 2024."""
+    return datetime(2024, month, day, 12, tzinfo=timezone.utc)
+
+
+def test_snapshots_round_trip_through_mmap(tmp_path):
+    """Test written columns map back unchanged and cross-tabulate."""
+    path = str(tmp_path / "poll-7.col")
+    columnar.write_snapshot(path, 7, {
+        "choice_ids": np.array([10, 20]),
+        "voted_at": np.array([1, 2, 3]),
+        "choice": np.array([0, 1, 1]),
+        "cohort": np.array([648, 649, -1])
+    })
+    snapshot = columnar.Snapshot(path)
+    assert snapshot.poll_id == 7
+    assert snapshot.choice_ids.tolist() == [10, 20]
+    assert snapshot.voted_at.dtype == np.dtype("datetime64[us]")
+    assert not snapshot.cohort.flags.writeable
+    months, counts = snapshot.by_signup_month()
+    assert [str(month) for month in months] == ["NaT", "2024-01", "2024-02"]
+    assert counts.tolist() == [[0, 1], [1, 0], [0, 1]]
+
+
+def test_other_files_are_rejected(tmp_path):
+    """Test a file without the snapshot header is refused."""
+    path = tmp_path / "poll-7.col"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        columnar.Snapshot(str(path))
+
+
+@pytest.mark.skipif(
+    PARTITIONED, reason="partitioned votes cannot be created on SQLite"
+)
+def test_polls_export_live_and_archived_votes(tmp_path, monkeypatch):
+    """Test an exported poll holds its votes in time order with cohorts."""
+    engine = make_engine(f"sqlite:///{tmp_path / 'columnar.db'}")
+    for model in (User, Poll, Choice, Vote, ArchivedVote):
+        model.__table__.create(bind=engine)
+    monkeypatch.setattr(columnar, "session_local", sessionmaker(bind=engine))
+    monkeypatch.setattr(columnar.settings, "SNAPSHOT_DIR", str(tmp_path))
+    with Session(engine) as session:
+        early, late = new_uuid(), new_uuid()
+        for user_id, joined in ((early, moment(1)), (late, moment(3))):
+            session.add(User(
+                uuid_pk=user_id, username=user_id, email=user_id,
+                password="secret", created_at=joined
+            ))
+        session.add(Poll(
+            id=1, title="Lunch", poll_type="text", created_by=early
+        ))
+        session.flush()
+        session.add_all([
+            Choice(id=5, poll_id=1, txt="soup", created_by=early),
+            Choice(id=6, poll_id=1, txt="salad", created_by=early),
+        ])
+        session.flush()
+        session.add_all([
+            Vote(user=late, choice_id=6, created_at=moment(4, 2)),
+            Vote(user=early, choice_id=5, created_at=moment(4, 3)),
+            ArchivedVote(
+                id=9, user=new_uuid(), choice_id=6, poll_id=1,
+                created_at=moment(4, 1)
+            ),
+        ])
+        session.commit()
+        columns = columnar.load_columns(session, 1)
+    columnar.write_snapshot(columnar.snapshot_path(1), 1, columns)
+    snapshot = columnar.Snapshot(columnar.snapshot_path(1))
+    assert snapshot.choice.tolist() == [1, 1, 0]
+    assert snapshot.cohort.tolist() == [-1, 650, 648]
+    assert snapshot.voted_at[0] == np.datetime64("2024-04-01T12:00")
+
+
+@pytest.mark.parametrize(
+    "method, choices", [("approval", [1, 0, 1]), ("ranked", [1, 0])]
+)
+def test_ballots_export_as_they_are_counted(
+    tmp_path, monkeypatch, method, choices
+):
+    """Test approvals export per approved choice and rankings by first."""
+    engine = make_engine(f"sqlite:///{tmp_path / 'ballots.db'}")
+    for model in (User, Poll, Choice, Ballot):
+        model.__table__.create(bind=engine)
+    monkeypatch.setattr(columnar, "session_local", sessionmaker(bind=engine))
+    with Session(engine) as session:
+        first, second = new_uuid(), new_uuid()
+        for user_id in (first, second):
+            session.add(User(
+                uuid_pk=user_id, username=user_id, email=user_id,
+                password="secret", created_at=moment(1)
+            ))
+        session.add(Poll(
+            id=1, title="Lunch", poll_type="text", created_by=first,
+            voting_method=method
+        ))
+        session.flush()
+        session.add_all([
+            Choice(id=5, poll_id=1, txt="soup", created_by=first),
+            Choice(id=6, poll_id=1, txt="salad", created_by=first),
+        ])
+        session.add_all([
+            Ballot(
+                poll_id=1, user=first, choices=pack([6]),
+                created_at=moment(4, 1)
+            ),
+            Ballot(
+                poll_id=1, user=second, choices=pack([5, 6]),
+                created_at=moment(4, 2)
+            ),
+        ])
+        session.commit()
+        columns = columnar.load_columns(session, 1)
+    assert columns["choice"].tolist() == choices
+    assert columns["cohort"].tolist() == [648] * len(choices)
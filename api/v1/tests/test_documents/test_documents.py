@@ -0,0 +1,59 @@
+#!/usr/bin/python3
+"""Test cases for the pre-serialized poll documents."""
+import orjson
+import pytest
+from sqlalchemy.orm import Session
+from api.v1.database_config import make_engine
+from api.v1.models import (
+    Choice, Poll, PollDocument, PollResult, User, new_uuid
+)
+from api.v1.polls.documents import load_document, refresh_document
+
+
+@pytest.fixture
+def session(tmp_path):
+    """Provide a session on a fresh SQLite database with one poll."""
+    engine = make_engine(f"sqlite:///{tmp_path / 'documents.db'}")
+    for model in (User, Poll, Choice, PollResult, PollDocument):
+        model.__table__.create(bind=engine)
+    with Session(engine) as session:
+        owner = User(
+            uuid_pk=new_uuid(), username="owner", email="owner@example.com",
+            password="secret"
+        )
+        session.add(owner)
+        session.add(Poll(
+            id=1, title="Lunch", poll_type="text", created_by=owner.uuid_pk
+        ))
+        session.add(Choice(poll_id=1, txt="soup", created_by=owner.uuid_pk))
+        session.commit()
+        yield session
+
+
+def test_documents_are_built_on_first_read(session, monkeypatch):
+    """Test a missing document is built once and then read as stored."""
+    monkeypatch.setattr(
+        "api.v1.polls.documents.count_votes", lambda session, poll_id: [(1, 3)]
+    )
+    document = orjson.loads(load_document(session, 1))
+    assert document["title"] == "Lunch"
+    assert document["choices"] == [
+        {"id": 1, "text": "soup", "image": None, "votes": 3}
+    ]
+    assert document["total_votes"] == 3
+    session.query(Poll).update({"title": "Dinner"})
+    assert orjson.loads(load_document(session, 1))["title"] == "Lunch"
+
+
+def test_refresh_rebuilds_and_drops_documents(session):
+    """Test refreshing follows writes and removes deleted polls."""
+    session.add(PollResult(poll_id=1, choice_id=1, votes=7))
+    session.query(Poll).update({"finalized_at": Poll.created_at})
+    refresh_document(session, 1)
+    document = orjson.loads(load_document(session, 1))
+    assert document["choices"][0]["votes"] == 7
+    session.query(Choice).delete()
+    session.query(Poll).delete()
+    assert refresh_document(session, 1) is None
+    assert load_document(session, 1) is None
+    assert session.query(PollDocument).count() == 0
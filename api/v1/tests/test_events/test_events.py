@@ -0,0 +1,122 @@
+#!/usr/bin/python3
+"""Test cases for the vote event log and tally snapshots."""
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy.orm import Session
+from api.v1.batching import BatchWriter
+from api.v1.database_config import make_engine
+from api.v1.models import (
+    Poll, TallySnapshot, User, VoteEvent, VoteRollup, new_uuid
+)
+from api.v1.votes.events import (
+    record, record_ballot, rebuild_tally, snapshot_shard
+)
+
+NOW = datetime.now(timezone.utc)
+
+
+def test_batches_flush_together():
+    """Test buffered items are written as one batch once full."""
+    batches = []
+    writer = BatchWriter(batches.append, max_items=2, interval=60)
+    writer.add(1)
+    assert not writer.full.is_set()
+    writer.add(2)
+    assert writer.full.is_set()
+    assert writer.flush_now() == 2
+    assert writer.flush_now() == 0
+    assert batches == [[1, 2]]
+
+
+def test_failed_batches_are_retried_up_to_a_bound():
+    """Test a failed batch is kept, oldest items dropped past the bound."""
+    def fail(items):
+        raise ConnectionError("database unavailable")
+
+    writer = BatchWriter(fail, max_items=2, interval=60, max_pending=3)
+    for item in range(4):
+        writer.add(item)
+    assert writer.flush_now() == 0
+    assert writer.items == [1, 2, 3]
+    writer.flush = list
+    assert writer.flush_now() == 3
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    """Provide a session on a fresh SQLite database with two polls."""
+    monkeypatch.setattr(
+        "api.v1.votes.events.settings.TALLY_SNAPSHOT_LAG_SECONDS", 60
+    )
+    engine = make_engine(f"sqlite:///{tmp_path / 'events.db'}")
+    for model in (User, Poll, VoteEvent, VoteRollup, TallySnapshot):
+        model.__table__.create(bind=engine)
+    with Session(engine) as session:
+        owner = new_uuid()
+        session.add(User(
+            uuid_pk=owner, username="owner", email="owner@example.com",
+            password="secret"
+        ))
+        for poll_id in (1, 2):
+            session.add(Poll(
+                id=poll_id, title="Lunch", poll_type="text", created_by=owner
+            ))
+        session.flush()
+        for event_id, poll_id, choice_id, kind, settled in (
+            (1, 1, 10, "cast", True),
+            (2, 1, 11, "cast", True),
+            (3, 2, 20, "cast", False),
+            (4, 1, 10, "cast", True),
+            (5, 1, 11, "retract", True),
+        ):
+            session.add(VoteEvent(
+                id=event_id, poll_id=poll_id, choice_id=choice_id,
+                vote_id=event_id, user=owner, kind=kind, created_at=NOW,
+                recorded_at=NOW - timedelta(minutes=5 if settled else 0)
+            ))
+        session.commit()
+        yield session
+
+
+def test_unsettled_polls_are_snapshotted_later(session):
+    """Test a poll behind another poll's snapshot is not skipped."""
+    assert snapshot_shard(session) == 1
+    assert rebuild_tally(session, 1) == (5, {10: 2, 11: 0})
+    assert rebuild_tally(session, 2) == (0, {20: 1})
+    session.get(VoteEvent, 3).recorded_at = NOW - timedelta(minutes=5)
+    session.commit()
+    assert snapshot_shard(session) == 1
+    assert rebuild_tally(session, 2) == (3, {20: 1})
+    assert snapshot_shard(session) == 0
+
+
+def test_events_share_the_vote_transaction(session):
+    """Test an event and its rollup are only kept if the vote commits."""
+    vote = type("Vote", (), {
+        "id": 6, "choice_id": 20, "user": session.get(VoteEvent, 3).user
+    })
+    record(session, "cast", vote, 2)
+    assert session.query(VoteRollup.votes).filter(
+        VoteRollup.choice_id == 20
+    ).scalar() == 1
+    session.rollback()
+    assert session.query(VoteEvent).count() == 5
+    assert session.query(VoteRollup).count() == 0
+    record(session, "cast", vote, 2)
+    session.commit()
+    assert session.query(VoteEvent).count() == 6
+    assert rebuild_tally(session, 2) == (0, {20: 2})
+
+
+def test_replaced_ballots_retract_what_they_no_longer_count(session):
+    """Test a ballot casts its counted choices and a swap retracts them."""
+    ballot = type("Ballot", (), {
+        "id": 7, "poll_id": 1, "user": session.get(VoteEvent, 1).user
+    })
+    record_ballot(session, ballot, [], [10, 11])
+    record_ballot(session, ballot, [10, 11], [11, 12])
+    session.commit()
+    assert rebuild_tally(session, 1) == (0, {10: 2, 11: 1, 12: 1})
+    assert session.query(VoteRollup.choice_id, VoteRollup.votes).order_by(
+        VoteRollup.choice_id
+    ).all() == [(10, 1), (11, 1), (12, 1)]
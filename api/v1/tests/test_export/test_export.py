@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+"""Test cases for the streaming vote and result exports."""
+import asyncio
+import csv
+import io
+from datetime import datetime, timezone
+import orjson
+import pytest
+from sqlalchemy.orm import Session
+from api.v1.database_config import make_engine
+from api.v1.models import (
+    PARTITIONED, ArchivedVote, Choice, Poll, User, Vote, new_uuid
+)
+from api.v1.polls.export import (
+    RESULT_COLUMNS, VOTE_COLUMNS, encode, encode_csv, encode_ndjson,
+    stream_votes
+)
+
+CAST_AT = datetime(2024, 5, 1, 12, tzinfo=timezone.utc)
+
+
+def test_csv_quotes_and_headers():
+    """Test CSV rows are quoted as needed and headed only when asked."""
+    rows = [(1, 'soup, "hot"'), (2, None)]
+    assert encode_csv(rows) == b'1,"soup, ""hot"""\r\n2,\r\n'
+    assert encode_csv(rows, ("id", "txt")).startswith(b"id,txt\r\n")
+    assert encode_csv([], RESULT_COLUMNS) == b"choice_id,votes\r\n"
+
+
+def test_ndjson_has_one_object_per_line():
+    """Test NDJSON rows become objects and datetimes strings."""
+    lines = encode_ndjson([(7, CAST_AT)], ("id", "at")).splitlines()
+    assert [orjson.loads(line) for line in lines] == [
+        {"id": 7, "at": "2024-05-01T12:00:00+00:00"}
+    ]
+
+
+def test_encode_dispatches_on_format():
+    """Test the header flag only applies to CSV."""
+    rows = [(5, 3)]
+    assert encode("csv", rows, RESULT_COLUMNS, header=True) == (
+        b"choice_id,votes\r\n5,3\r\n"
+    )
+    assert encode("csv", rows, RESULT_COLUMNS) == b"5,3\r\n"
+    assert encode("ndjson", rows, RESULT_COLUMNS, header=True) == (
+        b'{"choice_id":5,"votes":3}\n'
+    )
+
+
+@pytest.mark.skipif(
+    PARTITIONED, reason="partitioned votes cannot be created on SQLite"
+)
+def test_votes_stream_in_chunks(tmp_path, monkeypatch):
+    """Test live and archived votes stream as CSV chunks after a header."""
+    monkeypatch.setattr("api.v1.polls.export.settings.EXPORT_CHUNK_SIZE", 2)
+    engine = make_engine(f"sqlite:///{tmp_path / 'export.db'}")
+    for model in (User, Poll, Choice, Vote, ArchivedVote):
+        model.__table__.create(bind=engine)
+    with Session(engine) as session:
+        owner = new_uuid()
+        session.add(User(
+            uuid_pk=owner, username="owner", email="owner@example.com",
+            password="secret"
+        ))
+        session.add(Poll(
+            id=1, title="Lunch", poll_type="text", created_by=owner
+        ))
+        session.flush()
+        session.add(Choice(id=5, poll_id=1, txt="soup", created_by=owner))
+        session.flush()
+        session.add_all([
+            Vote(user=owner, choice_id=5, created_at=CAST_AT),
+            Vote(user=owner, choice_id=5, created_at=CAST_AT),
+            ArchivedVote(
+                id=9, user=owner, choice_id=5, poll_id=1, created_at=CAST_AT
+            ),
+        ])
+        session.commit()
+
+        async def collect(poll_id: int) -> list:
+            return [
+                chunk async for chunk in stream_votes(session, poll_id, "csv")
+            ]
+
+        chunks = asyncio.run(collect(1))
+        empty = asyncio.run(collect(2))
+    assert len(chunks) == 2
+    rows = list(csv.reader(io.StringIO(b"".join(chunks).decode())))
+    assert tuple(rows[0]) == VOTE_COLUMNS
+    assert sorted(int(row[0]) for row in rows[1:])[-1] == 9
+    assert len(rows) == 4
+    assert empty == [encode_csv([], VOTE_COLUMNS)]
@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+"""Test cases for freezing poll results and archiving votes."""
+import pytest
+from sqlalchemy.orm import Session
+from api.v1.database_config import make_engine
+from api.v1.models import (
+    PARTITIONED, ArchivedVote, Ballot, Choice, Poll, PollDocument,
+    PollResult, User, Vote, new_uuid
+)
+from api.v1.polls.finalize import (
+    archive_votes, count_votes, freeze_results, frozen_results
+)
+
+pytestmark = pytest.mark.skipif(
+    PARTITIONED, reason="partitioned votes cannot be created on SQLite"
+)
+
+
+@pytest.fixture
+def session(tmp_path):
+    """Provide a session on a fresh SQLite database with a closed poll."""
+    engine = make_engine(f"sqlite:///{tmp_path / 'finalize.db'}")
+    for model in (
+        User, Poll, Choice, Vote, Ballot, ArchivedVote, PollResult,
+        PollDocument
+    ):
+        model.__table__.create(bind=engine)
+    with Session(engine) as session:
+        owner = new_uuid()
+        session.add(User(
+            uuid_pk=owner, username="owner", email="owner@example.com",
+            password="secret"
+        ))
+        session.add(Poll(
+            id=1, title="Lunch", poll_type="text", created_by=owner,
+            is_voting_active=False
+        ))
+        for votes in (3, 1):
+            choice = Choice(poll_id=1, txt="soup", created_by=owner)
+            session.add(choice)
+            session.flush()
+            for _ in range(votes):
+                session.add(Vote(user=owner, choice_id=choice.id))
+        session.commit()
+        yield session
+
+
+def test_freeze_snapshots_the_tally(session):
+    """Test the frozen results match the live count and stop changing."""
+    live = count_votes(session, 1)
+    assert [votes for _, votes in live] == [3, 1]
+    poll = freeze_results(session, 1)
+    assert poll.finalized_at is not None
+    assert frozen_results(session, 1) == live
+
+
+def test_freeze_runs_once(session):
+    """Test finalizing a frozen poll keeps its first snapshot."""
+    first = freeze_results(session, 1).finalized_at
+    assert freeze_results(session, 1).finalized_at == first
+    assert session.query(PollResult).count() == 2
+
+
+def test_archive_moves_votes_in_chunks(session):
+    """Test every vote moves to the archive and none stay live."""
+    freeze_results(session, 1)
+    assert archive_votes(session, 1, chunk_size=3) == 4
+    assert session.query(Vote).count() == 0
+    assert session.query(ArchivedVote).filter(
+        ArchivedVote.poll_id == 1
+    ).count() == 4
+    assert [votes for _, votes in frozen_results(session, 1)] == [3, 1]
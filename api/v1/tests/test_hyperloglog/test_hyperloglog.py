@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+"""Test cases for the HyperLogLog sketch."""
+from api.v1.stats.hyperloglog import SPARSE_LIMIT, HyperLogLog, SparseSketch
+
+
+def test_count_within_error_bound():
+    """Test estimates stay within four standard errors."""
+    sketch = HyperLogLog()
+    for number in range(50000):
+        sketch.add(f"user{number}")
+    assert abs(sketch.count() - 50000) < 4 * sketch.standard_error * 50000
+
+
+def test_small_counts_are_exact_enough():
+    """Test small cardinalities use the linear counting correction."""
+    sketch = HyperLogLog()
+    for number in range(20):
+        sketch.add(number)
+        sketch.add(number)
+    assert sketch.count() == 20
+
+
+def test_merge_counts_the_union():
+    """Test merging two sketches estimates their union."""
+    first, second = HyperLogLog(), HyperLogLog()
+    for number in range(30000):
+        first.add(number)
+        second.add(number + 20000)
+    first.merge(second)
+    assert abs(first.count() - 50000) < 4 * first.standard_error * 50000
+
+
+def test_dumps_round_trip():
+    """Test serialized registers load into an identical sketch."""
+    sketch = HyperLogLog()
+    for number in range(1000):
+        sketch.add(number)
+    assert HyperLogLog.loads(sketch.dumps()).count() == sketch.count()
+
+
+def test_sparse_sketches_switch_to_registers_when_large():
+    """Test sparse sketches keep hashes until they outgrow the limit."""
+    small, large = SparseSketch(), SparseSketch()
+    for number in range(SPARSE_LIMIT):
+        small.add(number)
+        large.add(number)
+    large.add(SPARSE_LIMIT)
+    assert small.dense is None and len(small.hashes) == SPARSE_LIMIT
+    assert large.dense is not None and not large.hashes
+    small.merge(large)
+    assert small.dense is not None
+
+
+def test_sparse_sketches_merge_like_dense_ones():
+    """Test a sparse sketch adds the same registers as its values."""
+    expected, merged = HyperLogLog(), HyperLogLog()
+    sketch = SparseSketch()
+    for number in range(100):
+        expected.add(number)
+        sketch.add(number)
+    sketch.merge_into(merged)
+    assert merged.registers == expected.registers
@@ -0,0 +1,139 @@
+#!/usr/bin/python3
+"""Test cases for content-addressed choice image storage."""
+import asyncio
+import io
+import os
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+from api.v1.choices.images import (
+    CHUNK_SIZE, FORM_OVERHEAD, check_length, image_path, shutdown_pool,
+    store_image
+)
+
+
+@pytest.fixture(autouse=True)
+def media_root(tmp_path, monkeypatch):
+    """Store images in a temporary media root capped at 1 KiB."""
+    monkeypatch.setattr(
+        "api.v1.choices.images.settings.MEDIA_ROOT", str(tmp_path)
+    )
+    monkeypatch.setattr(
+        "api.v1.choices.images.settings.IMAGE_MAX_BYTES", 1024
+    )
+    yield tmp_path
+    shutdown_pool()
+
+
+BOUNDARY = "b0undary"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def form(data: bytes, name: str = "image") -> bytes:
+    """Encode data as a form's file field."""
+    return (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="title"\r\n\r\n'
+        f"Lunch\r\n--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="{name}"; '
+        'filename="image.png"\r\n'
+        "Content-Type: image/png\r\n\r\n"
+    ).encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+async def chunks(body: bytes, size: int = 7):
+    """Stream a body in small chunks, as a chunked request would."""
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def upload(data: bytes, name: str = "image") -> str:
+    """Store the image field of a streamed form."""
+    return asyncio.run(store_image(chunks(form(data, name)), CONTENT_TYPE))
+
+
+def png() -> bytes:
+    """Return a small PNG image."""
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "red").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize(
+    "content_length, rejected",
+    [
+        (None, False), ("", False), ("chunked", False), ("512", False),
+        (str(1024 + FORM_OVERHEAD), False),
+        (str(1024 + FORM_OVERHEAD + 1), True),
+    ]
+)
+def test_declared_length_is_checked(content_length, rejected):
+    """Test oversized declared bodies are refused before being read."""
+    if rejected:
+        with pytest.raises(HTTPException) as error:
+            check_length(content_length)
+        assert error.value.status_code == 413
+    else:
+        check_length(content_length)
+
+
+def test_oversized_upload_is_rejected(media_root):
+    """Test an upload past the limit is refused and leaves no file."""
+    with pytest.raises(HTTPException) as error:
+        upload(b"x" * 1025)
+    assert error.value.status_code == 413
+    assert os.listdir(media_root) == []
+
+
+def test_oversized_body_is_rejected_while_received(media_root):
+    """Test an undeclared body is refused once it outgrows the form."""
+    received = []
+
+    async def endless():
+        while True:
+            received.append(CHUNK_SIZE)
+            yield b"x" * CHUNK_SIZE
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(store_image(endless(), CONTENT_TYPE))
+    assert error.value.status_code == 413
+    assert sum(received) <= 1024 + FORM_OVERHEAD + CHUNK_SIZE
+    assert os.listdir(media_root) == []
+
+
+@pytest.mark.parametrize(
+    "body, content_type, code",
+    [
+        (form(b"data", name="other"), CONTENT_TYPE, 422),
+        (form(b"data"), "application/json", 422),
+        (form(b"data")[:-20], CONTENT_TYPE, 400),
+    ]
+)
+def test_forms_without_a_complete_image_are_refused(
+    media_root, body, content_type, code
+):
+    """Test missing image fields and truncated forms leave no file."""
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(store_image(chunks(body), content_type))
+    assert error.value.status_code == code
+    assert os.listdir(media_root) == []
+
+
+def test_images_are_stored_once_with_a_thumbnail(media_root):
+    """Test identical uploads share one file and thumbnail."""
+    digest = upload(png())
+    assert upload(png()) == digest
+    with open(image_path(digest), "rb") as stored:
+        assert stored.read() == png()
+    assert os.path.exists(image_path(digest))
+    assert os.path.exists(image_path(digest, thumbnail=True))
+    assert sorted(os.listdir(media_root)) == [digest[:2]]
+    assert len(os.listdir(media_root / digest[:2])) == 2
+
+
+def test_non_images_are_unsupported(media_root):
+    """Test a file that is not an image is refused and removed."""
+    with pytest.raises(HTTPException) as error:
+        upload(b"not an image")
+    assert error.value.status_code == 415
+    assert all(not files for _, _, files in os.walk(media_root))
@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+"""Test cases for the bulk poll importer."""
+import json
+import pytest
+from sqlalchemy.orm import Session
+from api.v1.database_config import make_engine
+from api.v1.models import Change, Choice, Poll, User, new_uuid
+from api.v1.polls.importer import import_polls, read_csv, read_ndjson
+
+HEADER = (
+    "ref,title,poll_type,is_add_choices_active,is_voting_active,"
+    "choice_text,choice_image\n"
+)
+CSV = [
+    HEADER,
+    "a,Lunch,text,1,1,soup,\n",
+    "a,,,,,salad,\n",
+    "b,,text,0,0,tea,\n",
+    "b,Drinks,text,0,0,coffee,\n",
+    "c,Colours,paint,0,0,red,\n",
+]
+NDJSON = [
+    json.dumps({"ref": "a", "title": "Lunch", "poll_type": "text",
+                "choices": [{"text": "soup"}, {"text": "salad"}]}) + "\n",
+    "\n",
+    "{not json\n",
+    json.dumps({"ref": "b", "title": "x" * 151, "poll_type": "text"}) + "\n",
+    json.dumps({"ref": "a", "title": "Again", "poll_type": "text"}) + "\n",
+]
+
+
+def test_csv_groups_choices_by_ref():
+    """Test later rows of a ref only carry a choice."""
+    rows = list(read_csv(CSV[:3]))
+    assert [(line, ref, error) for line, ref, _, _, error in rows] == [
+        (2, "a", None), (3, "a", None)
+    ]
+    assert rows[0][2].title == "Lunch" and rows[1][2] is None
+    assert [choice.text for *_, choices, _ in rows for choice in choices] == [
+        "soup", "salad"
+    ]
+
+
+def test_csv_rejects_choices_of_a_rejected_poll():
+    """Test rows of a ref whose poll row failed are reported, not dropped."""
+    errors = {
+        line: error for line, _, _, _, error in read_csv(CSV) if error
+    }
+    assert sorted(errors) == [4, 5, 6]
+    assert "title" in errors[4]
+    assert errors[5] == "poll row rejected on line 4"
+    assert "poll_type" in errors[6]
+
+
+def test_csv_reports_missing_columns():
+    """Test a header without the expected columns rejects the file."""
+    [(line, _, _, _, error)] = read_csv(["ref,title\n", "a,Lunch\n"])
+    assert line == 1 and error.startswith("missing columns: ")
+
+
+def test_ndjson_validates_every_line():
+    """Test malformed and invalid lines are reported with their number."""
+    rows = list(read_ndjson(NDJSON))
+    assert [(line, ref) for line, ref, _, _, _ in rows] == [
+        (1, "a"), (3, None), (4, None), (5, "a")
+    ]
+    assert len(rows[0][3]) == 2
+    assert rows[1][4] and "title" in rows[2][4]
+
+
+@pytest.fixture
+def session(tmp_path):
+    """Provide a session on a fresh SQLite database with an owner."""
+    engine = make_engine(f"sqlite:///{tmp_path / 'import.db'}")
+    for model in (User, Poll, Choice, Change):
+        model.__table__.create(bind=engine)
+    with Session(engine) as session:
+        session.add(User(
+            uuid_pk=new_uuid(), username="owner", email="owner@example.com",
+            password="secret"
+        ))
+        session.commit()
+        yield session
+
+
+def test_import_loads_valid_polls(session):
+    """Test valid polls are imported and every rejected row reported."""
+    owner = session.query(User.uuid_pk).scalar()
+    report = import_polls(session, NDJSON, "ndjson", owner)
+    assert (report["polls"], report["choices"]) == (1, 2)
+    assert [error["line"] for error in report["errors"]] == [3, 4, 5]
+    assert report["errors"][-1]["error"] == "duplicate ref"
+    poll = session.query(Poll).one()
+    assert poll.title == "Lunch" and poll.created_by == owner
+    assert session.query(Change).count() == 3
@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+"""Test cases for the durable job queue."""
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy.orm import sessionmaker
+from api.v1.database_config import make_engine
+from api.v1.jobs.queue import backoff, claim, enqueue, finish, heartbeat
+from api.v1.models import Job
+
+
+@pytest.fixture
+def jobs(tmp_path, monkeypatch):
+    """Point the queue at a fresh SQLite database and return its sessions."""
+    engine = make_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Job.__table__.create(bind=engine)
+    make_session = sessionmaker(bind=engine)
+    monkeypatch.setattr("api.v1.jobs.queue.session_local", make_session)
+    monkeypatch.setattr("api.v1.jobs.queue.settings.JOB_BACKOFF_SECONDS", 10)
+    with make_session() as session:
+        enqueue(session, "first", {"poll_id": 1}, max_attempts=2)
+        enqueue(session, "later", delay=3600)
+        session.commit()
+    return make_session
+
+
+def load(make_session, job_id: int) -> Job:
+    """Return a job row."""
+    with make_session() as session:
+        return session.get(Job, job_id)
+
+
+def expire(make_session, job_id: int):
+    """Let the lease of a job run out."""
+    with make_session() as session:
+        session.get(Job, job_id).locked_until = (
+            datetime.now(timezone.utc) - timedelta(seconds=1)
+        )
+        session.commit()
+
+
+def test_claim_leases_due_jobs_once(jobs):
+    """Test only due jobs are claimed and a held lease is not claimed."""
+    leased = claim(10)
+    assert [(job["kind"], job["attempts"]) for job in leased] == [
+        ("first", 1)
+    ]
+    assert leased[0]["payload"] == {"poll_id": 1}
+    assert leased[0]["lease"]
+    assert claim(10) == []
+
+
+def test_expired_lease_moves_to_a_new_worker(jobs):
+    """Test a stale worker can neither renew nor finish a taken job."""
+    stale = claim(10)[0]
+    expire(jobs, stale["id"])
+    fresh = claim(10)[0]
+    assert fresh["id"] == stale["id"] and fresh["lease"] != stale["lease"]
+    assert not heartbeat(stale["id"], stale["lease"])
+    assert not finish(stale["id"], stale["lease"])
+    assert load(jobs, fresh["id"]).status == "running"
+    assert heartbeat(fresh["id"], fresh["lease"])
+    assert finish(fresh["id"], fresh["lease"])
+    assert load(jobs, fresh["id"]).status == "done"
+
+
+def test_failures_back_off_then_fail(jobs):
+    """Test a failed job is retried later until its attempts run out."""
+    leased = claim(10)[0]
+    assert finish(leased["id"], leased["lease"], "boom")
+    retried = load(jobs, leased["id"])
+    assert retried.status == "queued" and retried.last_error == "boom"
+    assert retried.run_at > datetime.now(timezone.utc)
+    with jobs() as session:
+        session.get(Job, leased["id"]).run_at = datetime.now(timezone.utc)
+        session.commit()
+    leased = claim(10)[0]
+    assert finish(leased["id"], leased["lease"], "boom again")
+    assert load(jobs, leased["id"]).status == "failed"
+
+
+def test_backoff_is_capped_and_jittered(jobs, monkeypatch):
+    """Test the retry delay doubles per attempt up to the maximum."""
+    monkeypatch.setattr(
+        "api.v1.jobs.queue.settings.JOB_BACKOFF_MAX_SECONDS", 30
+    )
+    assert 5 <= backoff(1) <= 10
+    assert 10 <= backoff(2) <= 20
+    assert 15 <= backoff(5) <= 30
@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+"""Test cases for adaptive concurrency limiting."""
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from api.v1.load_shedding import (
+    CRITICAL, LOW, NORMAL, AdaptiveLimit, LoadSheddingMiddleware,
+    priority_of
+)
+
+
+def test_routes_are_classified():
+    """Test vote casts outrank ordinary requests, which outrank lists."""
+    assert priority_of("POST", "/votes/create") == CRITICAL
+    assert priority_of("POST", "/votes/ballot") == CRITICAL
+    assert priority_of("GET", "/polls/7/results") == CRITICAL
+    assert priority_of("GET", "/polls/7") == NORMAL
+    assert priority_of("GET", "/polls/") == LOW
+    assert priority_of("GET", "/polls/7/export") == LOW
+
+
+def test_low_priority_is_shed_first():
+    """Test each class only uses its share of the limit."""
+    limit = AdaptiveLimit(10, 1, 100)
+    assert all(limit.admit(LOW) for _ in range(5))
+    assert not limit.admit(LOW)
+    assert all(limit.admit(NORMAL) for _ in range(3))
+    assert not limit.admit(NORMAL)
+    assert limit.admit(CRITICAL) and limit.admit(CRITICAL)
+    assert not limit.admit(CRITICAL)
+
+
+def test_limit_follows_latency():
+    """Test the limit grows at steady latency and shrinks as it rises."""
+    limit = AdaptiveLimit(10, 2, 100)
+    for _ in range(20):
+        limit.in_flight = int(limit.limit)
+        limit.release(0.01)
+    grown = limit.limit
+    assert grown > 10
+    for _ in range(20):
+        limit.in_flight = int(limit.limit)
+        limit.release(0.5)
+    assert limit.limit < grown / 2
+
+
+def test_saturated_requests_get_503_with_retry_after():
+    """Test a request over the limit fails fast."""
+    app = FastAPI()
+    limit = AdaptiveLimit(1, 1, 1)
+    app.add_middleware(LoadSheddingMiddleware, limit=limit)
+
+    @app.get("/polls/7")
+    async def poll():
+        return {"in_flight": limit.in_flight}
+
+    client = TestClient(app)
+    assert client.get("/polls/7").json() == {"in_flight": 1}
+    limit.in_flight = 1
+    response = client.get("/polls/7")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert response.json() == {"detail": "Server is overloaded"}
@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+"""Test cases for monthly vote partition bounds."""
+from datetime import datetime, timezone
+import pytest
+from api.v1.database_config import make_engine
+from api.v1.votes.partitions import (
+    ensure_partitions, expire_partitions, month_start, partition_name
+)
+
+
+def utc(year: int, month: int, day: int = 1, hour: int = 0) -> datetime:
+    """Return a UTC time."""
+    return datetime(year, month, day, hour, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize(
+    "moment, offset, start",
+    [
+        (utc(2024, 5, 17, 13), 0, utc(2024, 5)),
+        (utc(2024, 5, 1), 1, utc(2024, 6)),
+        (utc(2024, 12, 31, 23), 1, utc(2025, 1)),
+        (utc(2024, 11, 30), 14, utc(2026, 1)),
+        (utc(2024, 1, 15), -1, utc(2023, 12)),
+        (utc(2024, 3, 1), -15, utc(2022, 12)),
+    ]
+)
+def test_month_start(moment, offset, start):
+    """Test bounds land on month starts across year boundaries."""
+    assert month_start(moment, offset) == start
+
+
+def test_bounds_are_contiguous():
+    """Test each partition ends where the next one begins."""
+    start = utc(2024, 11)
+    bounds = [month_start(start, offset) for offset in range(4)]
+    assert [partition_name(bound) for bound in bounds] == [
+        "votes_2024_11", "votes_2024_12", "votes_2025_01", "votes_2025_02"
+    ]
+    assert all(
+        month_start(bound, 1) == following
+        for bound, following in zip(bounds, bounds[1:])
+    )
+
+
+def test_partition_names_sort_by_month():
+    """Test names compare like their months, as retention relies on."""
+    names = [partition_name(utc(year, month)) for year, month in (
+        (2023, 12), (2024, 2), (2024, 10)
+    )]
+    assert names == sorted(names)
+
+
+def test_other_databases_are_left_alone(tmp_path):
+    """Test maintenance is a no-op outside PostgreSQL."""
+    engine = make_engine(f"sqlite:///{tmp_path / 'partitions.db'}")
+    assert ensure_partitions(engine) == []
+    assert expire_partitions(engine, retention_months=1, drop=True) == []
@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+"""Test cases for the request profiling middleware."""
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from api.v1.database_config import make_engine
+from api.v1.profiling import profiler
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Provide a client of an app running one query per request."""
+    monkeypatch.setattr(profiler.settings, "PROFILE_SECRET_KEY", "secret")
+    monkeypatch.setattr(profiler.settings, "PROFILE_SAMPLE_RATE", 0.0)
+    monkeypatch.setattr(profiler.settings, "PROFILE_KEEP", 2)
+    monkeypatch.setattr(profiler.settings, "PROFILE_DIR", str(tmp_path))
+    engine = make_engine(f"sqlite:///{tmp_path / 'profiling.db'}")
+    app = FastAPI()
+    app.add_middleware(profiler.ProfilingMiddleware)
+
+    @app.get("/answer")
+    async def answer():
+        with engine.connect() as connection:
+            return connection.execute(text("SELECT 42")).scalar()
+
+    return TestClient(app)
+
+
+def test_tokens_must_be_signed_and_unexpired(monkeypatch):
+    """Test only fresh tokens signed with the secret are accepted."""
+    monkeypatch.setattr(profiler.settings, "PROFILE_SECRET_KEY", "secret")
+    token = profiler.profile_token(60)
+    assert profiler.valid_token(token)
+    assert not profiler.valid_token(profiler.profile_token(-60))
+    tampered = token[:-1] + ("1" if token.endswith("0") else "0")
+    assert not profiler.valid_token(tampered)
+    monkeypatch.setattr(profiler.settings, "PROFILE_SECRET_KEY", "")
+    assert not profiler.valid_token(token)
+
+
+def test_unsigned_requests_are_not_profiled(client):
+    """Test requests without a valid header run untouched."""
+    for headers in ({}, {"X-Profile": "1.bad"}):
+        response = client.get("/answer", headers=headers)
+        assert response.json() == 42
+        assert "x-profile-id" not in response.headers
+    assert profiler.list_profiles() == []
+
+
+def test_signed_requests_are_profiled_and_rotated(client):
+    """Test a signed request stores its SQL and the oldest are dropped."""
+    ids = [
+        client.get(
+            "/answer", headers={"X-Profile": profiler.profile_token()}
+        ).headers["x-profile-id"]
+        for _ in range(3)
+    ]
+    assert profiler.list_profiles() == ids[:0:-1]
+    with open(profiler.profile_path(ids[-1], "json")) as file:
+        report = json.load(file)
+    assert report["path"] == "/answer" and report["status"] == 200
+    assert [query["statement"] for query in report["queries"]] == [
+        "SELECT 42"
+    ]
@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+"""Test cases for soft deletion and chunked purging."""
+from datetime import datetime, timezone
+import time
+import pytest
+from sqlalchemy.orm import Session
+from api.v1.database_config import make_engine
+from api.v1.models import (
+    PARTITIONED, ArchivedVote, Ballot, Choice, Poll, TallySnapshot, User,
+    Vote, VoteEvent, VoteRollup, new_uuid
+)
+from api.v1.polls.export import votes_statement
+from api.v1.polls.purge import purge_poll_rows, soft_delete_polls
+
+pytestmark = pytest.mark.skipif(
+    PARTITIONED, reason="partitioned votes cannot be created on SQLite"
+)
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    """Provide a session on a fresh SQLite database with two polls."""
+    monkeypatch.setattr("api.v1.polls.purge.settings.PURGE_CHUNK_SIZE", 2)
+    monkeypatch.setattr("api.v1.polls.purge.settings.PURGE_PAUSE_SECONDS", 0)
+    engine = make_engine(f"sqlite:///{tmp_path / 'purge.db'}")
+    for model in (
+        User, Poll, Choice, Vote, Ballot, ArchivedVote, VoteEvent,
+        VoteRollup, TallySnapshot
+    ):
+        model.__table__.create(bind=engine)
+    with Session(engine) as session:
+        owner = new_uuid()
+        session.add(User(
+            uuid_pk=owner, username="owner", email="owner@example.com",
+            password="secret"
+        ))
+        for poll_id in (1, 2):
+            session.add(Poll(
+                id=poll_id, title="Lunch", poll_type="text", created_by=owner
+            ))
+            for _ in range(3):
+                choice = Choice(poll_id=poll_id, txt="soup", created_by=owner)
+                session.add(choice)
+                session.flush()
+                session.add(Vote(user=owner, choice_id=choice.id))
+        session.commit()
+        yield session
+
+
+def test_soft_deleted_polls_are_hidden(session):
+    """Test soft-deleted polls and choices only load when asked for."""
+    soft_delete_polls(session, [1], datetime.now(timezone.utc))
+    session.commit()
+    assert [poll.id for poll in session.query(Poll)] == [2]
+    assert session.query(Choice).count() == 3
+    assert session.query(Poll).execution_options(
+        include_deleted=True
+    ).count() == 2
+
+
+def test_unions_run_with_the_listener(session):
+    """Test compound selects such as the vote export still execute."""
+    assert len(session.execute(votes_statement(1)).all()) == 3
+
+
+def test_purge_removes_the_poll_in_chunks(session):
+    """Test purging deletes a soft-deleted poll's rows and no others."""
+    soft_delete_polls(session, [1], datetime.now(timezone.utc))
+    session.commit()
+    assert purge_poll_rows(session, 1, time.monotonic() + 60)
+    assert session.query(Poll).execution_options(
+        include_deleted=True
+    ).count() == 1
+    assert session.query(Choice).execution_options(
+        include_deleted=True
+    ).count() == 3
+    assert session.query(Vote).count() == 3
+
+
+def test_purge_stops_at_the_deadline(session):
+    """Test an expired budget leaves the rest for a continuation."""
+    soft_delete_polls(session, [1], datetime.now(timezone.utc))
+    session.commit()
+    assert not purge_poll_rows(session, 1, time.monotonic())
+    assert session.query(Vote).count() == 4
+    assert purge_poll_rows(session, 1, time.monotonic() + 60)
+    assert session.query(Vote).count() == 3
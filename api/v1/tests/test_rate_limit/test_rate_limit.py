@@ -0,0 +1,85 @@
+#!/usr/bin/python3
+"""Test cases for the token bucket rate limiter."""
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from jose import jwt
+from api.v1.rate_limit import RateLimit, TokenBucketLimiter
+from api.v1.settings import settings
+
+
+class FakeClock:
+    """Manually advanced clock."""
+
+    def __init__(self):
+        """Start the clock at zero."""
+        self.now = 0.0
+
+    def __call__(self):
+        """Return the current time."""
+        return self.now
+
+
+def test_burst_then_reject():
+    """Test a client is rejected once its burst is spent."""
+    limiter = TokenBucketLimiter(rate=1.0, burst=3, clock=FakeClock())
+    assert [limiter.acquire("a") for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("a") == 1.0
+
+
+def test_refill():
+    """Test tokens are refilled at the configured rate."""
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(rate=2.0, burst=1, clock=clock)
+    assert limiter.acquire("a") == 0
+    assert limiter.acquire("a") == 0.5
+    clock.now = 0.5
+    assert limiter.acquire("a") == 0
+
+
+def test_keys_are_independent():
+    """Test one client's usage does not affect another."""
+    limiter = TokenBucketLimiter(rate=1.0, burst=1, clock=FakeClock())
+    assert limiter.acquire("a") == 0
+    assert limiter.acquire("a") > 0
+    assert limiter.acquire("b") == 0
+
+
+def test_idle_buckets_are_evicted():
+    """Test memory stays bounded by evicting the least recently used."""
+    limiter = TokenBucketLimiter(
+        rate=1.0, burst=1, max_keys=2, clock=FakeClock()
+    )
+    limiter.acquire("a")
+    limiter.acquire("b")
+    limiter.acquire("a")
+    limiter.acquire("c")
+    assert list(limiter.buckets) == ["a", "c"]
+
+
+def bearer(user_id: str) -> dict:
+    """Return the Authorization header of a user's access token."""
+    token = jwt.encode(
+        {"uuid_pk": user_id}, settings.OAUTH2_SECRET_KEY,
+        algorithm=settings.ALGORITHM
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_route_dependency_rejects_with_retry_after():
+    """Test a limited route answers 429 with Retry-After per user."""
+    app = FastAPI()
+
+    @app.get("/limited", dependencies=[Depends(RateLimit(0.5, 1))])
+    async def limited():
+        return {"ok": True}
+
+    client = TestClient(app)
+    assert client.get("/limited", headers=bearer("a")).status_code == 200
+    response = client.get("/limited", headers=bearer("a"))
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
+    assert client.get("/limited", headers=bearer("b")).status_code == 200
+    assert client.get("/limited").status_code == 200
+    assert client.get(
+        "/limited", headers={"Authorization": "Bearer forged"}
+    ).status_code == 429
@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+"""Test cases for scheduled poll opening and closing."""
+import asyncio
+from datetime import datetime, timedelta, timezone
+import pytest
+from api.v1.models import Poll
+from api.v1.polls.scheduler import PollScheduler, sync_schedule
+
+NOW = datetime(2024, 5, 1, 12, tzinfo=timezone.utc)
+HOUR = timedelta(hours=1)
+
+
+@pytest.mark.parametrize(
+    "opens_at, closes_at, active, transition",
+    [
+        (NOW + HOUR, NOW + 2 * HOUR, False, NOW + HOUR),
+        (NOW - HOUR, NOW + HOUR, True, NOW + HOUR),
+        (NOW - 2 * HOUR, NOW - HOUR, False, None),
+        (None, NOW + HOUR, True, NOW + HOUR),
+    ]
+)
+def test_sync_schedule(opens_at, closes_at, active, transition):
+    """Test the voting flag and next transition follow the schedule."""
+    poll = Poll(
+        opens_at=opens_at, closes_at=closes_at, is_voting_active=True,
+        is_add_choices_active=True
+    )
+    sync_schedule(poll, NOW)
+    assert poll.is_voting_active is active
+    assert poll.next_transition_at == transition
+
+
+def test_heap_orders_transitions():
+    """Test the earliest transition is at the top of the heap."""
+    scheduler = PollScheduler()
+    scheduler.schedule(1, NOW + 2 * HOUR)
+    scheduler.schedule(2, NOW + HOUR)
+    scheduler.schedule(3, None)
+    assert [poll_id for _, poll_id in scheduler.heap] == [2, 1]
+    assert scheduler.wakeup.is_set()
+
+
+def test_run_applies_due_transitions_in_order(monkeypatch):
+    """Test recovered and newly scheduled transitions fire when due."""
+    now = datetime.now(timezone.utc)
+    applied = []
+
+    def apply_transition(poll_id, when):
+        applied.append(poll_id)
+        return None
+
+    monkeypatch.setattr(
+        "api.v1.polls.scheduler.pending_transitions",
+        lambda: [(2, now - timedelta(seconds=1)), (1, now - HOUR)]
+    )
+    monkeypatch.setattr(
+        "api.v1.polls.scheduler.apply_transition", apply_transition
+    )
+
+    async def scenario():
+        scheduler = PollScheduler()
+        task = asyncio.create_task(scheduler.run())
+        while len(applied) < 2:
+            await asyncio.sleep(0.01)
+        scheduler.schedule(3, datetime.now(timezone.utc))
+        while len(applied) < 3:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        return scheduler
+
+    scheduler = asyncio.run(asyncio.wait_for(scenario(), 5))
+    assert applied == [1, 2, 3]
+    assert scheduler.heap == []
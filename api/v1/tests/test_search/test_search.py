@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+"""Test cases for poll search on databases without text search."""
+import pytest
+from sqlalchemy.orm import Session
+from api.v1.database_config import make_engine
+from api.v1.models import Choice, Poll, User, new_uuid
+from api.v1.polls.search import escape_like, search_polls
+
+
+@pytest.fixture
+def session(tmp_path):
+    """Provide a session on a fresh SQLite database with some polls."""
+    engine = make_engine(f"sqlite:///{tmp_path / 'search.db'}")
+    for model in (User, Poll, Choice):
+        model.__table__.create(bind=engine)
+    with Session(engine) as session:
+        owner = new_uuid()
+        session.add(User(
+            uuid_pk=owner, username="owner", email="owner@example.com",
+            password="secret"
+        ))
+        for poll_id, title, choices in (
+            (1, "Best lunch spot", ["Pizza place", "Soup bar"]),
+            (2, "Lunch", ["Tacos"]),
+            (3, "Favourite pizza topping", ["Mushroom"]),
+            (4, "100% juice or 50_50?", ["Orange"]),
+        ):
+            session.add(Poll(
+                id=poll_id, title=title, poll_type="text", created_by=owner
+            ))
+            session.flush()
+            session.add_all(
+                Choice(poll_id=poll_id, txt=txt, created_by=owner)
+                for txt in choices
+            )
+        session.commit()
+        yield session
+
+
+def ids(results: list) -> list:
+    """Return the poll ids of search results in order."""
+    return [poll.id for poll, _ in results]
+
+
+def test_wildcards_are_escaped():
+    """Test LIKE wildcards in terms match literally."""
+    assert escape_like("50%_off\\") == "50\\%\\_off\\\\"
+
+
+def test_title_matches_rank_above_choice_matches(session):
+    """Test a term in the title outranks the same term in a choice."""
+    assert ids(search_polls(session, "pizza", 10, 0)) == [3, 1]
+
+
+def test_every_term_must_match(session):
+    """Test all terms are required, from the title or a choice."""
+    assert ids(search_polls(session, "lunch soup", 10, 0)) == [1]
+    assert ids(search_polls(session, "lunch sushi", 10, 0)) == []
+
+
+def test_prefix_prefers_short_titles(session):
+    """Test typeahead matches title starts, shortest title first."""
+    assert ids(search_polls(session, "lun", 10, 0, prefix=True)) == [2]
+    assert ids(search_polls(session, "l", 10, 0, prefix=True)) == [2]
+    assert ids(search_polls(session, "Fav", 10, 0, prefix=True)) == [3]
+
+
+def test_literal_percent_and_underscore(session):
+    """Test user wildcards do not widen the match."""
+    assert ids(search_polls(session, "100%", 10, 0, prefix=True)) == [4]
+    assert ids(search_polls(session, "1%", 10, 0, prefix=True)) == []
+    assert ids(search_polls(session, "50_50", 10, 0)) == [4]
+    assert ids(search_polls(session, "5__5", 10, 0)) == []
+
+
+def test_results_are_paged(session):
+    """Test limit and offset page through the ranked results."""
+    assert ids(search_polls(session, "pizza", 1, 1)) == [1]
@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+"""Test cases for the poll shards."""
+import uuid
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from api.v1.models import Choice, Poll, Vote
+from api.v1.settings import settings
+from api.v1.sharding import (
+    HashRing, create_shard_schema, move_poll, shard_metadata, shard_url
+)
+
+SHARD_COUNT = 3
+
+
+def test_ring_spreads_polls_evenly():
+    """Test every shard owns a fair share of the polls."""
+    ring = HashRing(range(4))
+    owners = [ring.shard_for(poll_id) for poll_id in range(20000)]
+    assert all(3500 < owners.count(shard) < 6500 for shard in range(4))
+
+
+def test_ring_is_stable():
+    """Test a poll always maps to the same shard."""
+    first, second = HashRing(range(4)), HashRing(range(4))
+    assert all(
+        first.shard_for(poll_id) == second.shard_for(poll_id)
+        for poll_id in range(1000)
+    )
+
+
+def test_adding_a_shard_moves_few_polls():
+    """Test a new shard only takes polls from the existing ones."""
+    before, after = HashRing(range(4)), HashRing(range(5))
+    moved = [
+        poll_id for poll_id in range(20000)
+        if before.shard_for(poll_id) != after.shard_for(poll_id)
+    ]
+    assert len(moved) < 20000 * 0.3
+    assert all(after.shard_for(poll_id) == 4 for poll_id in moved)
+
+
+def test_shard_tables_drop_global_foreign_keys():
+    """Test shard tables only reference other shard tables."""
+    metadata = shard_metadata()
+    targets = {
+        key.target_fullname.split(".")[0]
+        for table in metadata.tables.values()
+        for key in table.foreign_keys
+    }
+    assert targets == {"polls", "choices"}
+
+
+@pytest.fixture(scope="module")
+def shards():
+    """Fixture: Session factories of the local test shard databases."""
+    metadata = shard_metadata()
+    engines = [
+        create_engine(shard_url(f"{settings.DB_NAME}_shard_test_{index}"))
+        for index in range(SHARD_COUNT)
+    ]
+    try:
+        for index, shard_engine in enumerate(engines):
+            metadata.drop_all(bind=shard_engine)
+            create_shard_schema(shard_engine, index, metadata)
+    except OperationalError:
+        pytest.skip("shard test databases are not available")
+    yield [sessionmaker(bind=shard_engine) for shard_engine in engines]
+    for shard_engine in engines:
+        metadata.drop_all(bind=shard_engine)
+        shard_engine.dispose()
+
+
+def test_interleaved_ids_are_unique(shards):
+    """Test each shard hands out ids of its own residue class."""
+    owner = str(uuid.uuid4())
+    for index, make_session in enumerate(shards):
+        session = make_session()
+        session.add(Poll(
+            id=100 + index, title="Sharded poll", poll_type="text",
+            created_by=owner
+        ))
+        choices = [
+            Choice(
+                poll_id=100 + index, txt=f"choice {number}", image="",
+                created_by=owner
+            )
+            for number in range(3)
+        ]
+        session.add_all(choices)
+        session.commit()
+        assert all(
+            (choice.id - 1) % settings.SHARD_ID_STRIDE == index
+            for choice in choices
+        )
+        session.close()
+
+
+def test_move_poll_between_shards(shards):
+    """Test a poll and its votes end up on the target shard only."""
+    owner = str(uuid.uuid4())
+    source, target = shards[0](), shards[1]()
+    source.add(Poll(
+        id=500, title="Moving poll", poll_type="text", created_by=owner
+    ))
+    choice = Choice(poll_id=500, txt="yes", image="", created_by=owner)
+    source.add(choice)
+    source.commit()
+    choice_id = choice.id
+    source.add_all(
+        Vote(user=str(uuid.uuid4()), choice_id=choice_id) for _ in range(5)
+    )
+    source.commit()
+
+    assert move_poll(source, target, 500) == 7
+    assert move_poll(source, target, 500) == 0
+    assert source.query(Poll).filter(Poll.id == 500).first() is None
+    assert target.query(Vote).filter(Vote.choice_id == choice_id).count() == 5
+    source.close()
+    target.close()
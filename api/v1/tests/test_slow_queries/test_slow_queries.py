@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+"""Test cases for the slow query log."""
+import pytest
+from sqlalchemy import text
+from api.v1.database_config import make_engine
+from api.v1.slow_queries.slow_log import (
+    SlowQueryLog, current_scope, explain_prefix, parameters_shape
+)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """Provide a SQLite engine with one table."""
+    engine = make_engine(f"sqlite:///{tmp_path / 'slow.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE items (id INTEGER, name TEXT)"))
+    return engine
+
+
+def drain(log: SlowQueryLog):
+    """Wait for the queued EXPLAINs to finish."""
+    log.executor().submit(lambda: None).result()
+    log.shutdown()
+
+
+def test_parameters_are_reduced_to_their_shape():
+    """Test parameter values are replaced by their types."""
+    assert parameters_shape({"id": 1, "name": "x"}, False) == {
+        "id": "int", "name": "str"
+    }
+    assert parameters_shape([(1, "x"), (2, "y")], True) == {
+        "rows": 2, "row": ["int", "str"]
+    }
+
+
+@pytest.mark.parametrize(
+    "statement, prefix",
+    [
+        ("SELECT * FROM polls", "EXPLAIN (ANALYZE, BUFFERS) "),
+        ("  select id from polls", "EXPLAIN (ANALYZE, BUFFERS) "),
+        ("SELECT * FROM polls WHERE id = 1 FOR UPDATE", "EXPLAIN "),
+        ("SELECT * FROM jobs FOR UPDATE SKIP LOCKED", "EXPLAIN "),
+        ("SELECT * FROM polls FOR NO KEY UPDATE", "EXPLAIN "),
+        ("SELECT * FROM polls FOR SHARE OF polls", "EXPLAIN "),
+        ("SELECT nextval('polls_id_seq')", "EXPLAIN "),
+        ("UPDATE polls SET title = 'x'", None),
+    ]
+)
+def test_side_effects_are_never_analyzed(statement, prefix):
+    """Test locking and sequence SELECTs only get an estimated plan."""
+    assert explain_prefix("postgresql", statement) == prefix
+
+
+def test_slow_selects_are_recorded_with_route_and_plan(engine):
+    """Test a slow SELECT keeps its route and gets a query plan."""
+    log = SlowQueryLog(0, 10, 1.0, 1)
+    log.watch(engine)
+    token = current_scope.set({
+        "method": "GET", "path": "/items", "endpoint": drain
+    })
+    try:
+        with engine.connect() as connection:
+            connection.execute(
+                text("SELECT name FROM items WHERE id = :id"), {"id": 7}
+            )
+    finally:
+        current_scope.reset(token)
+    drain(log)
+    [record] = log.recent(10)
+    assert record["parameters"] == ["int"]
+    assert record["route"] == {
+        "method": "GET", "path": "/items", "endpoint": "drain"
+    }
+    assert "SCAN items" in record["plan"]
+
+
+def test_explains_are_rate_limited(engine):
+    """Test writes and statements over the EXPLAIN rate get no plan."""
+    log = SlowQueryLog(0, 10, 0.001, 1)
+    log.watch(engine)
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO items VALUES (1, 'a')"))
+        for _ in range(2):
+            connection.execute(text("SELECT name FROM items"))
+    drain(log)
+    plans = [record["plan"] for record in log.recent(10)]
+    assert len(plans) == 3
+    assert plans[0] is None and plans[1] is not None and plans[2] is None
@@ -0,0 +1,35 @@
+#!/usr/bin/python3
+"""Test cases for running on SQLite."""
+from datetime import datetime, timezone
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+from api.v1.database_config import make_engine
+from api.v1.dialects import epoch
+from api.v1.models import Job
+
+
+def test_connections_are_tuned(tmp_path):
+    """Test new connections use WAL and can compute exp()."""
+    engine = make_engine(f"sqlite:///{tmp_path / 'poll.db'}")
+    with engine.connect() as connection:
+        assert connection.scalar(text("PRAGMA journal_mode")) == "wal"
+        assert connection.scalar(text("PRAGMA foreign_keys")) == 1
+        assert connection.scalar(text("SELECT exp(0)")) == 1.0
+
+
+def test_timestamps_round_trip_as_utc(tmp_path):
+    """Test aware timestamps come back aware and comparable in SQL."""
+    engine = make_engine(f"sqlite:///{tmp_path / 'poll.db'}")
+    Job.__table__.create(bind=engine)
+    run_at = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    with Session(engine) as session:
+        session.add(Job(kind="test", payload={}, run_at=run_at))
+        session.commit()
+        session.expire_all()
+        job = session.query(Job).one()
+        assert job.run_at == run_at
+        assert job.run_at.tzinfo is not None
+        assert session.scalar(
+            select(epoch(Job.run_at))
+        ) == pytest.approx(run_at.timestamp(), abs=0.001)
@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+"""Test cases for the approval and ranked-choice tally engine."""
+import numpy as np
+from api.v1.votes.tally import (
+    approval_counts, ballot_matrix, instant_runoff, pack, unpack
+)
+
+CHOICES = [10, 20, 30]
+
+
+def test_ballots_pack_into_a_padded_matrix():
+    """Test ballots map to choice indexes, padding and unknown ids to k."""
+    assert unpack(pack([30, 10])) == [30, 10]
+    matrix = ballot_matrix(
+        [pack([30, 10]), pack([20]), pack([99, 10]), pack([])], CHOICES
+    )
+    assert matrix.tolist() == [[2, 0], [1, 3], [3, 0], [3, 3]]
+
+
+def test_approval_counts_every_listed_choice():
+    """Test each approved choice of a ballot is counted."""
+    matrix = ballot_matrix(
+        [pack([10, 20]), pack([20]), pack([20, 30])], CHOICES
+    )
+    assert approval_counts(matrix, 3).tolist() == [1, 3, 1]
+
+
+def test_runoff_transfers_eliminated_preferences():
+    """Test eliminated choices pass their ballots to the next preference."""
+    matrix = ballot_matrix([
+        pack([10, 20]), pack([20]), pack([30, 20]), pack([30, 10]),
+        pack([99, 10])
+    ], CHOICES)
+    result = instant_runoff(matrix, 3)
+    assert [
+        (runoff_round["counts"].tolist(), runoff_round["eliminated"])
+        for runoff_round in result["rounds"]
+    ] == [([2, 1, 2], 1), ([2, 0, 2], 2), ([3, 0, 0], None)]
+    assert result["winner"] == 0
+
+
+def test_runoff_of_an_outright_majority_and_no_ballots():
+    """Test a first-round majority wins and empty polls have no winner."""
+    matrix = ballot_matrix([pack([20])] * 2 + [pack([10])], CHOICES)
+    result = instant_runoff(matrix, 3)
+    assert result["winner"] == 1 and len(result["rounds"]) == 1
+    assert instant_runoff(ballot_matrix([], CHOICES), 3)["winner"] is None
+
+
+def test_runoff_matches_a_reference_count():
+    """Test the vectorized runoff agrees with a per-ballot recount."""
+    rng = np.random.default_rng(7)
+    k = 6
+    rankings = [
+        list(rng.permutation(k)[:rng.integers(1, k + 1)])
+        for _ in range(2000)
+    ]
+    result = instant_runoff(
+        ballot_matrix([pack(ranking) for ranking in rankings], range(k)), k
+    )
+    eliminated = set()
+    for runoff_round in result["rounds"]:
+        counts = [0] * k
+        for ranking in rankings:
+            standing = [c for c in ranking if c not in eliminated]
+            if standing:
+                counts[standing[0]] += 1
+        assert runoff_round["counts"].tolist() == counts
+        eliminated.add(runoff_round["eliminated"])
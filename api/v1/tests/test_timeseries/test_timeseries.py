@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+"""Test cases for the vote time series rollups."""
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy.orm import Session
+from api.v1.database_config import make_engine
+from api.v1.models import Poll, User, VoteRollup, new_uuid
+from api.v1.polls.timeseries import compact_shard, record_events, series
+
+NOW = datetime.now(timezone.utc).replace(second=30, microsecond=0)
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    """Provide a session on a fresh SQLite database with rollups."""
+    monkeypatch.setattr(
+        "api.v1.polls.timeseries.settings.ROLLUP_COMPACT_CHUNK_SIZE", 2
+    )
+    engine = make_engine(f"sqlite:///{tmp_path / 'timeseries.db'}")
+    for model in (User, Poll, VoteRollup):
+        model.__table__.create(bind=engine)
+    with Session(engine) as session:
+        owner = new_uuid()
+        session.add(User(
+            uuid_pk=owner, username="owner", email="owner@example.com",
+            password="secret"
+        ))
+        session.add(Poll(
+            id=1, title="Lunch", poll_type="text", created_by=owner
+        ))
+        session.flush()
+        record_events(session, [
+            {
+                "poll_id": 1, "choice_id": choice_id, "kind": kind,
+                "created_at": NOW - ago
+            }
+            for choice_id, kind, ago in (
+                (1, "cast", timedelta(days=9)),
+                (2, "cast", timedelta(days=9, seconds=10)),
+                (1, "cast", timedelta(hours=3)),
+                (1, "cast", timedelta(hours=3, seconds=10)),
+                (2, "cast", timedelta()),
+                (2, "retract", timedelta()),
+            )
+        ])
+        session.commit()
+        yield session
+
+
+def totals(session: Session, bucket: str) -> list:
+    """Return the (start, votes) of a poll's series."""
+    return [
+        (point["start"], point["votes"])
+        for point in series(session, 1, bucket)
+    ]
+
+
+def test_votes_are_counted_per_minute(session):
+    """Test casts land in minute buckets and coarser series add them up."""
+    assert [votes for _, votes in totals(session, "minute")] == [2, 2, 1]
+    assert sum(votes for _, votes in totals(session, "day")) == 5
+    assert series(session, 1, "minute")[-1]["choices"] == [
+        {"choice_id": 2, "votes": 1}
+    ]
+
+
+def test_compaction_folds_old_buckets(session):
+    """Test folding keeps coarse series and drops expired minutes."""
+    hours, days = totals(session, "hour"), totals(session, "day")
+    assert compact_shard(session) == 5
+    assert totals(session, "hour") == hours[1:]
+    assert totals(session, "day") == days
+    assert [votes for _, votes in totals(session, "minute")] == [1]
+    assert session.query(VoteRollup).filter(
+        VoteRollup.bucket == "day"
+    ).count() == 2
@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+"""Test cases for the trending polls engine."""
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from api.v1.database_config import make_engine
+from api.v1.models import PollTrending
+from api.v1.polls.trending import TrendingEngine, persist
+
+HOUR = 3600.0
+
+
+class Clock:
+    """Manually advanced clock."""
+
+    def __init__(self):
+        """Start at a fixed time."""
+        self.now = 1_700_000_000.0
+
+    def __call__(self) -> float:
+        """Return the current time."""
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    """Provide a manual clock."""
+    return Clock()
+
+
+def test_scores_halve_every_half_life(clock):
+    """Test a vote is worth half as much one half-life later."""
+    engine = TrendingEngine(HOUR, 10, clock)
+    engine.record(1)
+    clock.now += HOUR
+    [(poll_id, score)] = engine.trending(5)
+    assert poll_id == 1 and score == pytest.approx(0.5)
+    engine.record(2)
+    assert [poll_id for poll_id, _ in engine.trending(5)] == [2, 1]
+
+
+def test_top_k_keeps_the_hottest_in_order(clock):
+    """Test the candidate set evicts the coldest poll at capacity."""
+    engine = TrendingEngine(HOUR, 3, clock)
+    for poll_id, votes in ((1, 4), (2, 1), (3, 3), (4, 2)):
+        for _ in range(votes):
+            engine.record(poll_id)
+    assert [poll_id for poll_id, _ in engine.trending(10)] == [1, 3, 4]
+    assert [poll_id for poll_id, _ in engine.trending(2)] == [1, 3]
+    assert engine.trending(0) == []
+    for _ in range(4):
+        engine.record(4)
+    assert [poll_id for poll_id, _ in engine.trending(3)] == [4, 1, 3]
+    assert sorted(engine.top) == [1, 3, 4]
+
+
+def test_pending_increments_are_taken_once(clock):
+    """Test taking the pending increments resets them."""
+    engine = TrendingEngine(HOUR, 10, clock)
+    engine.record(1, count=2)
+    clock.now += HOUR
+    assert engine.take_pending() == {1: pytest.approx(1.0)}
+    assert engine.take_pending() == {}
+
+
+def test_failed_persist_keeps_the_increments(tmp_path):
+    """Test increments survive a persist that fails."""
+    engine = TrendingEngine(HOUR, 10)
+    engine.record(1, count=2)
+    missing = make_engine(f"sqlite:///{tmp_path / 'missing.db'}")
+    with Session(missing) as session, pytest.raises(OperationalError):
+        persist(session, engine)
+    assert engine.take_pending() == {1: pytest.approx(2.0, rel=1e-3)}
+
+
+def test_persist_flushes_the_increments(tmp_path):
+    """Test persisted increments are stored and no longer pending."""
+    engine = make_engine(f"sqlite:///{tmp_path / 'trending.db'}")
+    PollTrending.__table__.create(bind=engine)
+    trending = TrendingEngine(HOUR, 10)
+    trending.record(1, count=2)
+    with Session(engine) as session:
+        persist(session, trending)
+        [(poll_id, score)] = session.query(
+            PollTrending.poll_id, PollTrending.score
+        ).all()
+    assert poll_id == 1 and score == pytest.approx(2.0, rel=1e-3)
+    assert trending.take_pending() == {}
+    assert [poll_id for poll_id, _ in trending.trending(5)] == [1]
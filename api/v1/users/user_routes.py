@@ -1,17 +1,25 @@
 #!/usr/bin/python3
 """Users routes."""
 import base64
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import List
 from fastapi import APIRouter, HTTPException, Depends, status, Response
 from fastapi.responses import RedirectResponse
 from fastapi.encoders import jsonable_encoder
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from api.v1.cache.read_through import cache, choice_key, poll_key
+from api.v1.changes.feed import record_poll_deleted
 from api.v1.database_config import get_db
-from api.v1.models import Moderator, User
+from api.v1.jobs.queue import enqueue
+from api.v1.models import Moderator, Poll, User
+from api.v1.polls.documents import refresh_document
+from api.v1.polls.purge import soft_delete_polls
+from api.v1.rate_limit import login_rate_limit
 from api.v1.settings import settings
+from api.v1.sharding import get_all_dbs
 from .schemas import (
     ModeratorRes, UserSchema,
     ModeratorSchema, UserRes
@@ -90,9 +98,10 @@ async def update_user(
 async def delete_user(
     uuid_pk: str,
     session: Session = Depends(get_db),
+    shards: list = Depends(get_all_dbs),
     current_user: str = Depends(get_current_user)
 ):
-    """Delete user."""
+    """Delete user; their polls and votes are purged in the background."""
     user = session.query(
         User
     ).filter(User.uuid_pk == uuid_pk)
@@ -108,7 +117,26 @@ async def delete_user(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="access denied"
         )
-    user.delete()
+    now = datetime.now(timezone.utc)
+    for shard in shards:
+        poll_ids = shard.execute(
+            select(Poll.id).where(Poll.created_by == uuid_pk)
+        ).scalars().all()
+        if not poll_ids:
+            continue
+        choice_ids = [
+            choice_id for poll_id in poll_ids
+            for choice_id in record_poll_deleted(shard, poll_id)
+        ]
+        soft_delete_polls(shard, poll_ids, now)
+        for poll_id in poll_ids:
+            refresh_document(shard, poll_id)
+        shard.commit()
+        cache.invalidate(
+            *map(poll_key, poll_ids), *map(choice_key, choice_ids)
+        )
+    user.update({"deleted_at": now}, synchronize_session=False)
+    enqueue(session, "purge_user", {"user_id": uuid_pk})
     session.commit()
     return
 
@@ -140,7 +168,9 @@ async def create(
         ) from error
 
 
-@user_router.post("/login_token")
+@user_router.post(
+    "/login_token", dependencies=[Depends(login_rate_limit)]
+)
 def login_token(
     response: Response,
     credentials: OAuth2PasswordRequestForm = Depends(),
@@ -177,7 +207,9 @@ def login_token(
     )
 
 
-@user_router.post("/login_basic")
+@user_router.post(
+    "/login_basic", dependencies=[Depends(login_rate_limit)]
+)
 async def login_basic(
     auth: BasicAuth = Depends(basic_auth),
     session: Session = Depends(get_db)
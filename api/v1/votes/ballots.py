@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+"""Approval and ranked-choice ballots."""
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from api.v1.dialects import upsert
+from api.v1.models import Ballot, Choice
+from .tally import (
+    approval_counts, ballot_matrix, instant_runoff, pack, unpack
+)
+
+
+def counted_choices(choice_ids: list, method: str) -> list:
+    """Return the choices a ballot counts for, as count_ballots counts."""
+    return list(choice_ids) if method == "approval" else list(choice_ids[:1])
+
+
+def load_ballot(session: Session, poll_id: int, user: str) -> list:
+    """Return the choice ids of a user's ballot in a poll, if any."""
+    choices = session.execute(
+        select(Ballot.choices).where(
+            Ballot.poll_id == poll_id, Ballot.user == user
+        )
+    ).scalar()
+    return unpack(choices) if choices is not None else []
+
+
+def save_ballot(
+    session: Session, poll_id: int, user: str, choice_ids: list
+) -> Ballot:
+    """Store a user's ballot in a poll, replacing an earlier one."""
+    insert = upsert(session, Ballot).values(
+        poll_id=poll_id, user=user, choices=pack(choice_ids)
+    )
+    session.execute(insert.on_conflict_do_update(
+        index_elements=[Ballot.poll_id, Ballot.user],
+        set_={
+            "choices": insert.excluded.choices,
+            "created_at": insert.excluded.created_at
+        }
+    ))
+    return session.query(Ballot).filter(
+        Ballot.poll_id == poll_id, Ballot.user == user
+    ).one()
+
+
+def load_matrix(session: Session, poll_id: int) -> tuple:
+    """Return a poll's sorted choice ids and its ballot matrix."""
+    choice_ids = session.execute(
+        select(Choice.id).where(Choice.poll_id == poll_id).order_by(Choice.id)
+    ).scalars().all()
+    ballots = session.execute(
+        select(Ballot.choices).where(Ballot.poll_id == poll_id)
+    ).scalars().all()
+    return choice_ids, ballot_matrix(ballots, choice_ids)
+
+
+def count_ballots(session: Session, poll_id: int, method: str) -> list:
+    """Count approvals, or first preferences, per choice of a poll."""
+    choice_ids, matrix = load_matrix(session, poll_id)
+    if method == "approval":
+        counts = approval_counts(matrix, len(choice_ids))
+    else:
+        counts = approval_counts(matrix[:, :1], len(choice_ids))
+    return list(zip(choice_ids, counts.tolist()))
+
+
+def runoff(session: Session, poll_id: int) -> dict:
+    """Return the instant runoff rounds and winner of a ranked poll."""
+    choice_ids, matrix = load_matrix(session, poll_id)
+    result = instant_runoff(matrix, len(choice_ids))
+    return {
+        "winner": None if result["winner"] is None
+        else choice_ids[result["winner"]],
+        "rounds": [
+            {
+                "tallies": [
+                    {"choice_id": choice_id, "votes": votes}
+                    for choice_id, votes in zip(
+                        choice_ids, runoff_round["counts"].tolist()
+                    )
+                ],
+                "eliminated": None if runoff_round["eliminated"] is None
+                else choice_ids[runoff_round["eliminated"]]
+            }
+            for runoff_round in result["rounds"]
+        ]
+    }
@@ -0,0 +1,168 @@
+#!/usr/bin/python3
+"""Append-only vote event log with snapshot based tally rebuilds.
+
+Every cast and retracted vote is appended to vote_events, and counted
+into the polls' vote time series, in the same transaction as the vote
+itself, so the log never disagrees with the votes. Ballots are logged as
+casts of the choices they count for, and replacing a ballot retracts the
+choices it no longer counts for. Per-poll tally snapshots
+record the tally up to an event id, so a poll's results are its latest
+snapshot plus a replay of the events after it.
+
+Run as ``python -m api.v1.votes.events`` to snapshot every poll with new
+events.
+"""
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import case, func, insert, select
+from sqlalchemy.orm import Session
+from api.v1.models import Poll, TallySnapshot, VoteEvent
+from api.v1.polls.timeseries import record_events
+from api.v1.sharding import each_shard
+from api.v1.settings import settings
+
+
+def write_events(session: Session, events: list):
+    """Append vote events and their rollups to the session's transaction."""
+    if events:
+        session.execute(insert(VoteEvent), events)
+        record_events(session, events)
+
+
+def record(session: Session, kind: str, vote, poll_id: int):
+    """Append a cast or retract event for a flushed vote."""
+    write_events(session, [{
+        "poll_id": poll_id,
+        "choice_id": vote.choice_id,
+        "vote_id": vote.id,
+        "user": vote.user,
+        "kind": kind,
+        "created_at": datetime.now(timezone.utc)
+    }])
+
+
+def record_ballot(session: Session, ballot, before: list, after: list):
+    """Append the events turning a ballot's counted choices into after.
+
+    before holds the choices the replaced ballot counted for, if any.
+    """
+    now = datetime.now(timezone.utc)
+    write_events(session, [
+        {
+            "poll_id": ballot.poll_id,
+            "choice_id": choice_id,
+            "vote_id": ballot.id,
+            "user": ballot.user,
+            "kind": kind,
+            "created_at": now
+        }
+        for kind, choice_ids, others in (
+            ("retract", before, after), ("cast", after, before)
+        )
+        for choice_id in choice_ids if choice_id not in others
+    ])
+
+
+def latest_snapshot(session: Session, poll_id: int):
+    """Return the (last_event_id, tallies) of a poll's latest snapshot."""
+    snapshot = session.query(
+        TallySnapshot.last_event_id, TallySnapshot.tallies
+    ).filter(TallySnapshot.poll_id == poll_id).order_by(
+        TallySnapshot.last_event_id.desc()
+    ).first()
+    if not snapshot:
+        return 0, {}
+    return snapshot.last_event_id, {
+        int(choice_id): votes
+        for choice_id, votes in snapshot.tallies.items()
+    }
+
+
+def replay(
+    session: Session, poll_id: int, after: int, upto: int = None
+) -> dict:
+    """Return the net vote change per choice of events in (after, upto]."""
+    query = select(
+        VoteEvent.choice_id,
+        func.sum(case((VoteEvent.kind == "cast", 1), else_=-1))
+    ).where(VoteEvent.poll_id == poll_id, VoteEvent.id > after)
+    if upto is not None:
+        query = query.where(VoteEvent.id <= upto)
+    return dict(session.execute(query.group_by(VoteEvent.choice_id)).all())
+
+
+def merge(tallies: dict, changes: dict) -> dict:
+    """Apply per-choice changes to a tally."""
+    merged = dict(tallies)
+    for choice_id, change in changes.items():
+        merged[choice_id] = merged.get(choice_id, 0) + change
+    return merged
+
+
+def rebuild_tally(session: Session, poll_id: int):
+    """Return (snapshot event id, tallies) from a snapshot and its tail."""
+    last_event_id, tallies = latest_snapshot(session, poll_id)
+    return last_event_id, merge(
+        tallies, replay(session, poll_id, last_event_id)
+    )
+
+
+def take_snapshot(session: Session, poll_id: int) -> int:
+    """Snapshot a poll's tally up to its settled events.
+
+    Events recorded within TALLY_SNAPSHOT_LAG_SECONDS are left to the next
+    snapshot so that batches still being committed are never skipped.
+    Returns the snapshot's last event id, or None when nothing changed.
+    """
+    settled = datetime.now(timezone.utc) - timedelta(
+        seconds=settings.TALLY_SNAPSHOT_LAG_SECONDS
+    )
+    last_event_id, tallies = latest_snapshot(session, poll_id)
+    upto = session.query(func.max(VoteEvent.id)).filter(
+        VoteEvent.poll_id == poll_id,
+        VoteEvent.id > last_event_id,
+        VoteEvent.recorded_at < settled
+    ).scalar()
+    if upto is None:
+        return None
+    tallies = merge(tallies, replay(session, poll_id, last_event_id, upto))
+    session.add(TallySnapshot(
+        poll_id=poll_id, last_event_id=upto,
+        tallies={
+            str(choice_id): votes for choice_id, votes in tallies.items()
+        }
+    ))
+    session.commit()
+    return upto
+
+
+def snapshot_shard(session: Session) -> int:
+    """Snapshot the polls of a shard with events after their own snapshot.
+
+    Each poll is compared with its own latest snapshot, through the
+    (poll_id, id) index of the events and the primary key of the
+    snapshots, so a poll whose events were still settling when other polls
+    were snapshotted is picked up on a later run.
+    """
+    last_event_id = select(
+        func.coalesce(func.max(TallySnapshot.last_event_id), 0)
+    ).where(TallySnapshot.poll_id == Poll.id).correlate(Poll).scalar_subquery()
+    poll_ids = session.execute(
+        select(Poll.id).where(
+            select(VoteEvent.id).where(
+                VoteEvent.poll_id == Poll.id, VoteEvent.id > last_event_id
+            ).exists()
+        )
+    ).scalars().all()
+    return sum(
+        1 for poll_id in poll_ids
+        if take_snapshot(session, poll_id) is not None
+    )
+
+
+def snapshot_tallies() -> int:
+    """Snapshot the polls with new events on every shard."""
+    return sum(snapshot_shard(session) for session in each_shard())
+
+
+if __name__ == "__main__":
+    print(f"snapshotted {snapshot_tallies()} polls")
@@ -0,0 +1,122 @@
+#!/usr/bin/python3
+"""Monthly partition management for the votes table.
+
+Run as ``python -m api.v1.votes.partitions`` from cron to pre-create
+upcoming partitions and detach (or drop) the ones past retention.
+"""
+import argparse
+from datetime import datetime, timezone
+from sqlalchemy import text
+from api.v1.database_config import engine
+from api.v1.settings import settings
+
+PARENT = "votes"
+DEFAULT_PARTITION = f"{PARENT}_default"
+
+
+def month_start(moment: datetime, offset: int = 0) -> datetime:
+    """Return the first instant of the month ``offset`` months away."""
+    month = moment.year * 12 + moment.month - 1 + offset
+    return datetime(month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(start: datetime) -> str:
+    """Return the partition table name for the month starting at start."""
+    return f"{PARENT}_{start:%Y_%m}"
+
+
+def list_partitions(conn) -> list:
+    """Return the names of the partitions attached to the votes table."""
+    rows = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :parent ORDER BY c.relname"
+    ), {"parent": PARENT})
+    return [row[0] for row in rows]
+
+
+def ensure_partitions(bind=engine, months_ahead: int = None) -> list:
+    """Create the current month's partition and the next months_ahead."""
+    if bind.dialect.name != "postgresql":
+        return []
+    if months_ahead is None:
+        months_ahead = settings.VOTE_PARTITIONS_AHEAD
+    now = datetime.now(timezone.utc)
+    created = []
+    with bind.begin() as conn:
+        existing = set(list_partitions(conn))
+        if DEFAULT_PARTITION not in existing:
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} "
+                f"PARTITION OF {PARENT} DEFAULT"
+            ))
+        for offset in range(months_ahead + 1):
+            start = month_start(now, offset)
+            name = partition_name(start)
+            if name in existing:
+                continue
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT} "
+                f"FOR VALUES FROM ('{start.isoformat()}') "
+                f"TO ('{month_start(start, 1).isoformat()}')"
+            ))
+            created.append(name)
+    return created
+
+
+def expire_partitions(
+    bind=engine, retention_months: int = None, drop: bool = False
+) -> list:
+    """Detach partitions older than the retention window.
+
+    Detached tables are kept around for archiving unless drop is set.
+    A retention of 0 keeps every partition.
+    """
+    if bind.dialect.name != "postgresql":
+        return []
+    if retention_months is None:
+        retention_months = settings.VOTE_PARTITION_RETENTION_MONTHS
+    if retention_months <= 0:
+        return []
+    cutoff = partition_name(
+        month_start(datetime.now(timezone.utc), -retention_months)
+    )
+    expired = []
+    with bind.begin() as conn:
+        for name in list_partitions(conn):
+            if name == DEFAULT_PARTITION or name >= cutoff:
+                continue
+            conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+            if drop:
+                conn.execute(text(f"DROP TABLE {name}"))
+            expired.append(name)
+    return expired
+
+
+def main():
+    """Maintain vote partitions from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--ahead", type=int, default=settings.VOTE_PARTITIONS_AHEAD,
+        help="number of future monthly partitions to keep ready"
+    )
+    parser.add_argument(
+        "--retain", type=int,
+        default=settings.VOTE_PARTITION_RETENTION_MONTHS,
+        help="months of partitions to keep attached (0 keeps all)"
+    )
+    parser.add_argument(
+        "--drop", action="store_true",
+        help="drop expired partitions instead of only detaching them"
+    )
+    args = parser.parse_args()
+    for name in ensure_partitions(months_ahead=args.ahead):
+        print(f"created {name}")
+    expired = expire_partitions(retention_months=args.retain, drop=args.drop)
+    for name in expired:
+        print(f"{'dropped' if args.drop else 'detached'} {name}")
+
+
+if __name__ == "__main__":
+    main()
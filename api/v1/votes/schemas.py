@@ -2,8 +2,9 @@
 """Vote schemas."""
 from datetime import datetime
 from uuid import UUID
-from typing import Optional
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, conlist, validator
+from api.v1.polls.schemas import ChoiceTally
 
 
 class VoteSchema(BaseModel):
@@ -20,3 +21,39 @@ class VoteRes(BaseModel):
     user: UUID
     choice_id: int
     created_at: datetime
+
+
+class BallotSchema(BaseModel):
+    """Approval or ranked-choice ballot schema.
+
+    choices lists the approved choices, or the ranked choices in order of
+    preference.
+    """
+
+    poll_id: int
+    choices: conlist(int, min_items=1)
+
+    @validator("choices")
+    def distinct(cls, value):
+        """Reject a choice listed twice."""
+        if len(set(value)) != len(value):
+            raise ValueError("choices must be distinct")
+        return value
+
+
+class BallotRes(BaseModel):
+    """Ballot response schema."""
+
+    id: int
+    poll_id: int
+    user: UUID
+    choices: List[int]
+    created_at: datetime
+
+
+class TallyRes(BaseModel):
+    """Poll tally rebuilt from the vote event log."""
+
+    poll_id: int
+    snapshot_event_id: int
+    tallies: List[ChoiceTally]
@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+"""Vectorized tallies of approval and ranked-choice ballots.
+
+Ballots are loaded into an (n, width) matrix of choice indexes padded
+with the sentinel index k, one past the last choice, which also stands
+for choices deleted since the ballot was cast. Approval counts are one
+bincount over the matrix. Instant runoff keeps every ballot's current
+top choice and, after an elimination, recomputes it only for the ballots
+whose top choice was eliminated.
+"""
+import numpy as np
+
+BALLOT_DTYPE = np.dtype("<u4")
+
+
+def pack(choice_ids: list) -> bytes:
+    """Pack the choice ids of a ballot."""
+    return np.asarray(choice_ids, dtype=BALLOT_DTYPE).tobytes()
+
+
+def unpack(ballot: bytes) -> list:
+    """Unpack the choice ids of a ballot."""
+    return np.frombuffer(ballot, dtype=BALLOT_DTYPE).tolist()
+
+
+def ballot_matrix(ballots: list, choice_ids: list) -> np.ndarray:
+    """Return the matrix of choice indexes of packed ballots.
+
+    Column j holds each ballot's (j + 1)th choice as an index into the
+    sorted choice_ids, or len(choice_ids) when there is none.
+    """
+    k = len(choice_ids)
+    lengths = np.fromiter(
+        (len(ballot) // BALLOT_DTYPE.itemsize for ballot in ballots),
+        dtype=np.intp, count=len(ballots)
+    )
+    width = int(lengths.max()) if len(ballots) else 0
+    matrix = np.full((len(ballots), max(width, 1)), k, dtype=np.int32)
+    ids = np.frombuffer(b"".join(ballots), dtype=BALLOT_DTYPE)
+    if not ids.size or not k:
+        return matrix
+    known = np.asarray(sorted(choice_ids), dtype=np.int64)
+    indexes = np.minimum(np.searchsorted(known, ids), k - 1)
+    indexes[known[indexes] != ids] = k
+    rows = np.repeat(np.arange(len(ballots)), lengths)
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    matrix[rows, np.arange(ids.size) - starts] = indexes
+    return matrix
+
+
+def approval_counts(matrix: np.ndarray, k: int) -> np.ndarray:
+    """Count the ballots approving each of k choices."""
+    return np.bincount(matrix.ravel(), minlength=k + 1)[:k]
+
+
+def instant_runoff(matrix: np.ndarray, k: int) -> dict:
+    """Run an instant runoff over a ballot matrix of k choices.
+
+    Each round counts every ballot for its highest ranked choice still
+    standing. A choice with more than half of those ballots wins;
+    otherwise the choice with the fewest is eliminated, ties going to
+    the one with fewer first preferences and then to the later choice.
+    Returns the counts and the eliminated choice index of every round
+    and the winning index, or None when no ballot ranks a choice.
+    """
+    eliminated = np.zeros(k + 1, dtype=bool)
+    eliminated[k] = True
+    top = matrix[:, 0].copy()
+    rounds = []
+    first = None
+    while True:
+        stale = np.flatnonzero(eliminated[top])
+        if stale.size:
+            ranked = matrix[stale]
+            standing = ~eliminated[ranked]
+            best = standing.argmax(axis=1)
+            picked = ranked[np.arange(stale.size), best]
+            top[stale] = np.where(
+                standing[np.arange(stale.size), best], picked, k
+            )
+        counts = np.bincount(top, minlength=k + 1)[:k]
+        if first is None:
+            first = counts
+        standing = np.flatnonzero(~eliminated[:k])
+        active = int(counts.sum())
+        leader = standing[counts[standing].argmax()] if standing.size else 0
+        if not active or 2 * counts[leader] > active or standing.size <= 1:
+            rounds.append({"counts": counts, "eliminated": None})
+            return {
+                "rounds": rounds,
+                "winner": int(leader) if active else None
+            }
+        order = np.lexsort((-standing, first[standing], counts[standing]))
+        loser = int(standing[order[0]])
+        eliminated[loser] = True
+        rounds.append({"counts": counts, "eliminated": loser})
@@ -1,36 +1,91 @@
 #!/usr/bin/python3
 """Vote routes."""
-from fastapi import APIRouter, HTTPException, Response, status, Depends
+from datetime import datetime
+from typing import Optional
+from fastapi import (
+    APIRouter, HTTPException, Request, Response, status, Depends
+)
 from sqlalchemy.orm import Session
+from api.v1.bans.anomaly import detector
 from api.v1.database_config import get_db
 from api.v1.users.oauth import get_current_user
-from api.v1.models import Vote
-from .schemas import VoteRes, VoteSchema
+from api.v1.models import Choice, Poll, Vote
+from api.v1.polls.documents import document_refresher
+from api.v1.polls.trending import trending
+from api.v1.rate_limit import vote_rate_limit
+from api.v1.settings import settings
+from api.v1.sharding import get_all_dbs, get_vote_db, routed_session
+from api.v1.stats.reach import reach
+from . import events
+from .ballots import counted_choices, load_ballot, save_ballot
+from .schemas import BallotRes, BallotSchema, TallyRes, VoteRes, VoteSchema
+from .tally import unpack
 
 vote_router = APIRouter(prefix="/votes", tags=["votes"])
 
 
+def in_window(query, since: datetime = None, until: datetime = None):
+    """Bound a vote query by created_at so the planner prunes partitions."""
+    if since:
+        query = query.filter(Vote.created_at >= since)
+    if until:
+        query = query.filter(Vote.created_at < until)
+    return query
+
+
+def by_id(query, id_: int, created_at: datetime = None):
+    """Filter a vote query by id, pinned to one partition when possible."""
+    query = query.filter(Vote.id == id_)
+    if created_at:
+        query = query.filter(Vote.created_at == created_at)
+    return query
+
+
 @vote_router.get("/", response_model=VoteRes)
 async def get_votes(
-    session: Session = Depends(get_db),
+    since: Optional[datetime] = None, until: Optional[datetime] = None,
+    sessions: list = Depends(get_all_dbs),
     current_user: str = Depends(get_current_user)
 ):
-    """Retrieve a list of votes."""
+    """Retrieve a list of votes, optionally within a time window."""
     if current_user:
-        votes = session.query(Vote).all()
+        votes = [
+            vote for session in sessions
+            for vote in in_window(session.query(Vote), since, until).all()
+        ]
         if votes:
             return votes
         return {"message": "No votes were found"}
 
 
+@vote_router.get("/tally/{poll_id}", response_model=TallyRes)
+async def get_tally(
+    poll_id: int, session: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """Rebuild a poll's tally from its latest snapshot and the event log."""
+    if current_user:
+        with routed_session(Poll, poll_id, session) as shard:
+            snapshot_event_id, tallies = events.rebuild_tally(shard, poll_id)
+        return {
+            "poll_id": poll_id,
+            "snapshot_event_id": snapshot_event_id,
+            "tallies": [
+                {"choice_id": choice_id, "votes": votes}
+                for choice_id, votes in sorted(tallies.items())
+            ]
+        }
+
+
 @vote_router.get("/{id_}", response_model=VoteRes)
 async def get_vote(
-    id_: int, session: Session = Depends(get_db),
+    id_: int, created_at: Optional[datetime] = None,
+    session: Session = Depends(get_vote_db),
     current_user: str = Depends(get_current_user)
 ):
     """Retrieve a vote from the database."""
     if current_user:
-        vote = session.query(Vote).filter(Vote.id == id_).first()
+        vote = by_id(session.query(Vote), id_, created_at).first()
         if vote:
             return vote
         raise HTTPException(
@@ -41,11 +96,12 @@ async def get_vote(
 
 @vote_router.delete("/{id_}/update", response_model=VoteRes)
 async def delete_vote(
-    id_: int, session: Session = Depends(get_db),
+    id_: int, created_at: Optional[datetime] = None,
+    session: Session = Depends(get_vote_db),
     current_user: str = Depends(get_current_user)
 ):
     """Delete a vote."""
-    vote = session.query(Vote).filter(Vote.id == id_)
+    vote = by_id(session.query(Vote), id_, created_at)
     if not vote.first() and vote.first().user == current_user.uuid_pk:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -59,8 +115,26 @@ async def delete_vote(
         )
 
     if vote.first() and vote.first().user == current_user.uuid_pk:
+        retracted = vote.first()
+        # Retracting takes the same shared lock as voting, so a frozen
+        # tally never loses a vote it counted.
+        poll = session.query(Poll).join(Choice).filter(
+            Choice.id == retracted.choice_id
+        ).with_for_update(read=True, of=Poll).first()
+        if poll.finalized_at:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="poll has been finalized"
+            )
+        if not poll.is_voting_active:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="voting is closed"
+            )
+        events.record(session, "retract", retracted, poll.id)
         vote.delete()
         session.commit()
+        document_refresher.add(poll.id)
         return
 
     raise HTTPException(
@@ -69,23 +143,149 @@ async def delete_vote(
     )
 
 
-@vote_router.post("/create", response_model=VoteRes)
+@vote_router.post(
+    "/create", response_model=VoteRes,
+    dependencies=[Depends(vote_rate_limit)]
+)
 async def create_vote(
-    vote: VoteSchema, response: Response,
+    vote: VoteSchema, request: Request, response: Response,
     session: Session = Depends(get_db),
     current_user: str = Depends(get_current_user)
 ):
     """Create a new vote."""
     if current_user:
-        vote.user = current_user.uuid_pk
-        new_vote = Vote(**vote.dict())
-        session.add(new_vote)
-        session.commit()
-        session.refresh(new_vote)
-        if new_vote:
+        with routed_session(Choice, vote.choice_id, session) as shard:
+            # The shared lock makes finalization wait for this vote, so a
+            # vote is either in the frozen results or rejected.
+            poll = shard.query(Poll).join(Choice).filter(
+                Choice.id == vote.choice_id
+            ).with_for_update(read=True, of=Poll).first()
+            if not poll:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="choice not found"
+                )
+            if poll.finalized_at:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="poll has been finalized"
+                )
+            if not poll.is_voting_active:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="voting is closed"
+                )
+            if poll.voting_method != "single":
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="poll takes ballots"
+                )
+            sources = {
+                "user": current_user.uuid_pk,
+                "ip": request.client.host if request.client else None
+            }
+            if detector.check(poll.id, vote.choice_id, sources) == "throttle":
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="voting temporarily suspended",
+                    headers={
+                        "Retry-After": str(settings.ANOMALY_WINDOW_SECONDS)
+                    }
+                )
+            vote.user = current_user.uuid_pk
+            new_vote = Vote(**vote.dict())
+            shard.add(new_vote)
+            shard.flush()
+            events.record(shard, "cast", new_vote, poll.id)
+            shard.commit()
+            shard.refresh(new_vote)
+            if new_vote:
+                trending.record(poll.id, new_vote.created_at.timestamp())
+                reach.add(poll.id, poll.created_by, new_vote.user)
+                document_refresher.add(poll.id)
+                response.status_code = status.HTTP_201_CREATED
+                return new_vote
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="vote already exists"
+            )
+
+
+@vote_router.post(
+    "/ballot", response_model=BallotRes,
+    dependencies=[Depends(vote_rate_limit)]
+)
+async def cast_ballot(
+    ballot: BallotSchema, request: Request, response: Response,
+    session: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    """Cast or replace a ballot in an approval or ranked-choice poll."""
+    if current_user:
+        with routed_session(Poll, ballot.poll_id, session) as shard:
+            poll = shard.query(Poll).filter(
+                Poll.id == ballot.poll_id
+            ).with_for_update(read=True).first()
+            if not poll:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="poll not found"
+                )
+            if poll.finalized_at:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="poll has been finalized"
+                )
+            if not poll.is_voting_active:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="voting is closed"
+                )
+            if poll.voting_method == "single":
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="poll takes single votes"
+                )
+            known = shard.query(Choice.id).filter(
+                Choice.poll_id == poll.id, Choice.id.in_(ballot.choices)
+            ).count()
+            if known != len(ballot.choices):
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="choice not found in poll"
+                )
+            sources = {
+                "user": current_user.uuid_pk,
+                "ip": request.client.host if request.client else None
+            }
+            # Bursts are tracked against each ballot's first preference.
+            first = ballot.choices[0]
+            if detector.check(poll.id, first, sources) == "throttle":
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="voting temporarily suspended",
+                    headers={
+                        "Retry-After": str(settings.ANOMALY_WINDOW_SECONDS)
+                    }
+                )
+            replaced = load_ballot(shard, poll.id, current_user.uuid_pk)
+            saved = save_ballot(
+                shard, poll.id, current_user.uuid_pk, ballot.choices
+            )
+            events.record_ballot(
+                shard, saved,
+                counted_choices(replaced, poll.voting_method),
+                counted_choices(ballot.choices, poll.voting_method)
+            )
+            shard.commit()
+            trending.record(poll.id, saved.created_at.timestamp())
+            reach.add(poll.id, poll.created_by, saved.user)
+            document_refresher.add(poll.id)
             response.status_code = status.HTTP_201_CREATED
-            return new_vote
-        raise HTTPException(
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            detail="vote already exists"
-        )
+            return {
+                "id": saved.id,
+                "poll_id": saved.poll_id,
+                "user": saved.user,
+                "choices": unpack(saved.choices),
+                "created_at": saved.created_at
+            }